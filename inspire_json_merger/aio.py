@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Asyncio interface to the merge.
+
+Merges run in an executor, so that they don't block the event loop.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from .api import merge
+
+
+async def merge_async(root, head, update, executor=None):
+    """Same as :func:`inspire_json_merger.api.merge`, in ``executor``.
+
+    Args:
+        executor (:class:`concurrent.futures.Executor`): where to run the
+            merge, by default the default executor of the event loop.
+
+    Cancelling the call cancels the merge if it didn't start yet. Once
+    started, merges in a thread stop before merging their next list
+    element or comparing their next pair of list elements, while merges in
+    a process run to completion and their result is dropped.
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        merge_fn = functools.partial(merge, root, head, update)
+        return await loop.run_in_executor(executor, merge_fn)
+
+    cancelled = threading.Event()
+    merge_fn = functools.partial(merge, root, head, update,
+                                 cancelled=cancelled)
+    try:
+        return await loop.run_in_executor(executor, merge_fn)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+
+class AsyncMerger(object):
+    """Runs merges in an executor with at most ``max_in_flight`` at once.
+
+    Callers wait for a slot before their merge is handed to the executor,
+    which gives backpressure and keeps the executor queue short, so that
+    cancelled requests don't wait there.
+
+    Args:
+        executor (:class:`concurrent.futures.Executor`): where to run the
+            merges, by default the default executor of the event loop.
+
+        max_in_flight (int): maximum number of merges submitted to the
+            executor at once, by default twice the number of CPUs.
+    """
+
+    def __init__(self, executor=None, max_in_flight=None):
+        self.executor = executor
+        self.max_in_flight = max_in_flight or 2 * (os.cpu_count() or 1)
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._loop = loop
+        return self._semaphore
+
+    async def merge(self, root, head, update):
+        """Merge once a slot is free, see :func:`merge_async`."""
+        async with self._get_semaphore():
+            return await merge_async(root, head, update, self.executor)
+
+    async def _merge_and_release(self, semaphore, triple, failures=None):
+        try:
+            return await merge_async(*triple, executor=self.executor)
+        except Exception as e:
+            if failures is not None:
+                # Recorded before the slot is released, so that merge_batch
+                # sees it before reading the next triple.
+                failures.append(e)
+            raise
+        finally:
+            semaphore.release()
+
+    async def merge_batch(self, triples, return_exceptions=False):
+        """Merge an iterable of (root, head, update) triples.
+
+        Triples are only read once a slot is free, so the iterable can be
+        a lazy stream. If a merge fails, no more triples are read, the other
+        merges are cancelled and waited for and the exception is raised,
+        unless ``return_exceptions`` is set.
+
+        Returns:
+            list: the results of the merges, in the order of the triples.
+        """
+        semaphore = self._get_semaphore()
+        loop = asyncio.get_running_loop()
+        failures = None if return_exceptions else []
+        tasks = []
+        try:
+            triples = iter(triples)
+            while True:
+                await semaphore.acquire()
+                if failures:
+                    semaphore.release()
+                    raise failures[0]
+                try:
+                    triple = next(triples)
+                except StopIteration:
+                    semaphore.release()
+                    break
+                tasks.append(loop.create_task(
+                    self._merge_and_release(semaphore, triple, failures)))
+            return await asyncio.gather(*tasks,
+                                        return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Wait for them, so that none is left pending.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+async def merge_batch_async(triples, executor=None, max_in_flight=None,
+                            return_exceptions=False):
+    """Merge an iterable of triples, see :meth:`AsyncMerger.merge_batch`."""
+    merger = AsyncMerger(executor, max_in_flight)
+    return await merger.merge_batch(triples, return_exceptions)
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Entry points for merging INSPIRE records."""
+
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import time
+
+from json_merger.config import DictMergerOps, UnifierOps
+from json_merger.errors import MergeError
+from json_merger.list_unify import ListUnifier
+from json_merger.merger import Merger
+from json_merger.utils import get_dotted_key_path
+
+from . import codec
+from .cache import NormalizationCache
+from .cancellation import MergeCancelled
+from .comparators import EqualityComparator, bind_comparators
+from .instrumentation import FieldTimer
+from .merger_config_arxiv2arxiv import (
+    COMPARATORS,
+    FIELD_MERGE_OPS,
+    LIST_MERGE_OPS
+)
+from .tokens import TokenTable
+from .unifiers import ONE_SIDED_OPS, TrivialListUnifier, needs_matching
+
+
+class ArxivToArxivMerger(Merger):
+    """Merger preconfigured with the arXiv to arXiv rules.
+
+    Besides the members filled in by :class:`json_merger.merger.Merger`, a
+    merge populates ``normalization_stats`` and ``token_stats`` with the hits
+    and misses of the per-merge normalization cache and author name token
+    table, which are released when the merge ends, and ``fast_path_hits``
+    with the number of lists unified without any matching (``trivial``) or
+    by hashing their elements (``hashed``). ``author_budget_exhausted`` tells
+    whether some authors were matched with the cheap fallback strategy.
+    Instrumented merges also populate ``field_report`` (see
+    :class:`~inspire_json_merger.instrumentation.FieldTimer`), and
+    :func:`merge` sets ``memory_report`` when profiling the memory (see
+    :class:`~inspire_json_merger.memory.MemoryProfiler`).
+
+    Args:
+        bloom_prefilter (:class:`~inspire_json_merger.bloom.BloomPrefilter`):
+            Optional prefilter skipping the comparison of list elements
+            that can't match, keeping its own stats.
+
+        author_budget (:class:`~inspire_json_merger.budget.AuthorMatchBudget`):
+            Optional limits on the author matching work, keeping count of
+            the merges exhausting them.
+
+        instrument (bool): Whether to time the merge of each field and
+            count the calls of its comparators.
+
+        comparator_counters
+            (:class:`~inspire_json_merger.counters.ComparatorCounters`):
+            Optional counters of the comparator calls, by configured path.
+
+        cancelled (:class:`threading.Event`): Optional event that, once set,
+            makes the merge raise
+            :class:`~inspire_json_merger.cancellation.MergeCancelled` before
+            merging the next list element or comparing the next pair of
+            list elements.
+    """
+
+    def __init__(self, root, head, update, bloom_prefilter=None,
+                 author_budget=None, instrument=False,
+                 comparator_counters=None, cancelled=None):
+        self.normalization_cache = NormalizationCache()
+        self.normalization_stats = None
+        self.token_table = TokenTable()
+        self.token_stats = None
+        self.bloom_prefilter = bloom_prefilter
+        self.fast_path_hits = {'trivial': 0, 'hashed': 0}
+        self.author_budget_tracker = None
+        if author_budget is not None:
+            self.author_budget_tracker = author_budget.new_tracker()
+        self.author_budget_exhausted = False
+        self.field_timer = None
+        self.comparator_counters = comparator_counters
+        if instrument:
+            self.field_timer = FieldTimer()
+            # Counted per merge for the field report, and added to
+            # comparator_counters once the merge ends.
+            comparator_counters = self.field_timer.comparator_counters
+        super(ArxivToArxivMerger, self).__init__(
+            root, head, update,
+            DictMergerOps.FALLBACK_KEEP_UPDATE,  # Most common operation
+            UnifierOps.KEEP_ONLY_UPDATE_ENTITIES,
+            comparators=bind_comparators(COMPARATORS,
+                                         self.normalization_cache,
+                                         self.token_table,
+                                         bloom_prefilter,
+                                         self.author_budget_tracker,
+                                         comparator_counters,
+                                         cancelled),
+            list_merge_ops=LIST_MERGE_OPS,
+            list_dict_ops=FIELD_MERGE_OPS
+        )
+        self.field_report = None
+        self.memory_report = None
+        if cancelled is not None:
+            self._check_cancellation(cancelled)
+        if self.field_timer is not None:
+            self.field_timer.instrument(self)
+
+    def _check_cancellation(self, cancelled):
+        recursive_merge = self._recursive_merge
+
+        def cancellable_recursive_merge(root, head, update, key_path=()):
+            if cancelled.is_set():
+                raise MergeCancelled()
+            return recursive_merge(root, head, update, key_path)
+
+        self._recursive_merge = cancellable_recursive_merge
+
+    def merge(self):
+        start = time.perf_counter()
+        try:
+            super(ArxivToArxivMerger, self).merge()
+        finally:
+            if self.field_timer is not None:
+                self.field_timer.total_time = time.perf_counter() - start
+                self.field_report = self.field_timer.report
+                if self.comparator_counters is not None:
+                    self.comparator_counters.add(
+                        self.field_timer.comparator_counters)
+            self.normalization_stats = self.normalization_cache.stats
+            self.normalization_cache.clear()
+            self.token_stats = self.token_table.stats
+            self.token_table.clear()
+            if self.author_budget_tracker is not None:
+                self.author_budget_exhausted = \
+                    self.author_budget_tracker.exhausted
+
+    def _unify_lists(self, root, head, update, key_path):
+        dotted_key_path = get_dotted_key_path(key_path, True)
+        operation = self.list_merge_ops.get(dotted_key_path,
+                                            self.default_list_merge_op)
+        if operation not in ONE_SIDED_OPS:
+            return super(ArxivToArxivMerger, self)._unify_lists(
+                root, head, update, key_path)
+
+        if not needs_matching(root, head, update, operation):
+            self.fast_path_hits['trivial'] += 1
+            list_unifier = TrivialListUnifier(root, head, update, operation)
+        elif dotted_key_path not in self.comparators:
+            self.fast_path_hits['hashed'] += 1
+            list_unifier = ListUnifier(root, head, update, operation,
+                                       EqualityComparator)
+        else:
+            return super(ArxivToArxivMerger, self)._unify_lists(
+                root, head, update, key_path)
+
+        try:
+            list_unifier.unify()
+        except MergeError as e:
+            self.conflicts.extend(c.with_prefix(key_path) for c in e.content)
+
+        return list_unifier
+
+
+def get_conflicts(merger):
+    """Serialize the conflicts of a merger as JSON compatible lists."""
+    return [codec.loads(c.to_json()) for c in merger.conflicts]
+
+
+def _phase(memory_profiler, name):
+    if memory_profiler is None:
+        return contextlib.contextmanager(lambda: (yield))()
+    return memory_profiler.phase(name)
+
+
+def merge(root, head, update, metrics=None, capture=None,
+          memory_profiler=None, cancelled=None, instrument=False,
+          bloom_prefilter=None, author_budget=None,
+          comparator_counters=None):
+    """Merge ``update`` into ``head`` using ``root`` as common ancestor.
+
+    Args:
+        metrics (:class:`~inspire_json_merger.metrics.MergeMetrics`):
+            Optional metrics observing the merge.
+
+        capture (:class:`~inspire_json_merger.capture.SlowMergeCapture`):
+            Optional capture of the merge if it is slow.
+
+        memory_profiler (:class:`~inspire_json_merger.memory.MemoryProfiler`):
+            Optional profiler of the memory used by the merge, whose
+            ``report`` is also handed to the metrics.
+
+        cancelled (:class:`threading.Event`): Optional event cancelling the
+            merge once set.
+
+        instrument (bool): Whether to also return the time spent merging
+            each field (see
+            :class:`~inspire_json_merger.instrumentation.FieldTimer`).
+
+        bloom_prefilter (:class:`~inspire_json_merger.bloom.BloomPrefilter`):
+            Optional prefilter skipping the comparison of list elements
+            that can't match, keeping its own stats.
+
+        author_budget (:class:`~inspire_json_merger.budget.AuthorMatchBudget`):
+            Optional limits on the author matching work, keeping count of
+            the merges exhausting them.
+
+        comparator_counters
+            (:class:`~inspire_json_merger.counters.ComparatorCounters`):
+            Optional counters of the comparator calls, by configured path.
+
+    Returns:
+        tuple: the merged record and the list of conflicts, or ``None`` if
+        the merge didn't raise any, followed by the field report if
+        ``instrument`` is set and by whether the authors not matched yet
+        were matched with the cheap fallback strategy if ``author_budget``
+        is given.
+
+    Raises:
+        MergeCancelled: if ``cancelled`` was set during the merge.
+    """
+    merger = None
+    conflicts = None
+    start = time.perf_counter()
+    try:
+        if memory_profiler is not None:
+            memory_profiler.start()
+        with _phase(memory_profiler, 'input_copy'):
+            merger = ArxivToArxivMerger(
+                root, head, update,
+                instrument=instrument or (capture is not None and
+                                          capture.instrument),
+                cancelled=cancelled, bloom_prefilter=bloom_prefilter,
+                author_budget=author_budget,
+                comparator_counters=comparator_counters)
+        if memory_profiler is not None:
+            memory_profiler.instrument(merger)
+        start = time.perf_counter()
+        with _phase(memory_profiler, 'output_assembly'):
+            merger.merge()
+    except MergeError:
+        with _phase(memory_profiler, 'conflict_export'):
+            conflicts = get_conflicts(merger)
+    finally:
+        elapsed = time.perf_counter() - start
+        if memory_profiler is not None:
+            memory_report = memory_profiler.stop()
+        # Nothing else to observe if the merger could not be built.
+        if merger is not None:
+            if memory_profiler is not None:
+                merger.memory_report = memory_report
+            if metrics is not None:
+                metrics.observe(merger, elapsed)
+            if capture is not None:
+                capture.capture(root, head, update, merger, elapsed)
+
+    result = (merger.merged_root, conflicts)
+    if instrument:
+        result += (merger.field_report,)
+    if author_budget is not None:
+        result += (merger.author_budget_exhausted,)
+    return result
+
+
+def merge_from_store(control_number, head, update, store, source=None,
+                     **kwargs):
+    """Merge ``update`` into ``head`` with the root kept in a store.
+
+    Once merged, whether it raised conflicts or not, ``update`` is stored as
+    the root of the next merge from the same source.
+
+    Args:
+        store (:class:`~inspire_json_merger.store.RootStore`): where the
+            roots are kept.
+
+        source (str): the source of ``update``, by default its
+            ``acquisition_source.source``.
+
+        kwargs: the other arguments of :func:`merge`.
+
+    Returns:
+        tuple: the same as :func:`merge`.
+    """
+    if source is None:
+        try:
+            source = update['acquisition_source']['source']
+        except KeyError:
+            raise ValueError('The update has no acquisition_source.source, '
+                             'the source has to be given')
+    root = store.get(control_number, source) or {}
+    result = merge(root, head, update, **kwargs)
+    store.put(control_number, source, update)
+    return result
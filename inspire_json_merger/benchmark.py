@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Benchmarks of the arXiv to arXiv merge.
+
+Run with ``python -m inspire_json_merger.benchmark --output results.json``
+from the root of the repository (the fixtures are read from
+``tests/fixtures``).
+
+With ``--save-baseline`` the results are stored as the baseline, and with
+``--compare`` the run fails if the median latency or the peak memory of a
+scenario regressed compared to the baseline. Latencies are divided by the
+duration of a calibration loop run on the same machine, so that baselines
+recorded on a machine can be compared with runs on another one.
+
+With ``--codec-share`` the share of JSON parsing and dumping (see
+:mod:`~inspire_json_merger.codec`) in the time of a merge is measured too,
+with every available codec.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import fnmatch
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from json_merger.config import DictMergerOps, UnifierOps
+from json_merger.errors import MergeError
+from json_merger.merger import Merger
+
+from . import codec
+from .api import merge
+from .merger_config_arxiv2arxiv import (
+    COMPARATORS,
+    FIELD_MERGE_OPS,
+    LIST_MERGE_OPS
+)
+from .synthetic import generate_triple
+
+SCALED_AUTHORS = (10, 100, 1000, 5000)
+SCALED_REFERENCES = (100, 1000, 10000)
+DEFAULT_BASELINE = 'benchmarks/baseline.json'
+# Settings a run must share with the baseline it is compared with.
+COMPARED_SETTINGS = ('engine', 'repeat', 'time_limit')
+
+
+def json_merger_merge(root, head, update):
+    """The arXiv to arXiv merge done by a plain json-merger ``Merger``."""
+    merger = Merger(
+        root, head, update,
+        DictMergerOps.FALLBACK_KEEP_UPDATE,
+        UnifierOps.KEEP_ONLY_UPDATE_ENTITIES,
+        comparators=COMPARATORS,
+        list_merge_ops=LIST_MERGE_OPS,
+        list_dict_ops=FIELD_MERGE_OPS
+    )
+    conflicts = None
+    try:
+        merger.merge()
+    except MergeError as e:
+        conflicts = [json.loads(c.to_json()) for c in e.content]
+    return merger.merged_root, conflicts
+
+
+ENGINES = {
+    'arxiv2arxiv': merge,
+    'json-merger': json_merger_merge,
+}
+
+
+def load_fixture(fixtures_dir, name):
+    triple = []
+    for version in ('root', 'head', 'update'):
+        path = os.path.join(fixtures_dir, name, version + '.json')
+        with open(path, 'rb') as f:
+            triple.append(codec.loads(f.read()))
+    return tuple(triple)
+
+
+def iter_scenarios(fixtures_dir):
+    """Yield the (name, factory) of every scenario.
+
+    The factories build the (root, head, update) triple of the scenario, so
+    big synthetic records are only generated if they are run.
+    """
+    for name in sorted(os.listdir(fixtures_dir)):
+        triple = load_fixture(fixtures_dir, name)
+        yield 'fixture:' + name, lambda triple=triple: triple
+
+        fields = sorted(set().union(*triple))
+        for field in fields:
+            yield 'field:{}:{}'.format(name, field), lambda field=field, \
+                triple=triple: tuple(
+                    dict((k, v) for k, v in version.items() if k == field)
+                    for version in triple)
+
+    for num_authors in SCALED_AUTHORS:
+        yield 'authors:{}'.format(num_authors), \
+            lambda num_authors=num_authors: generate_triple(
+                num_authors=num_authors)
+    for num_references in SCALED_REFERENCES:
+        yield 'references:{}'.format(num_references), \
+            lambda num_references=num_references: generate_triple(
+                num_authors=10, num_references=num_references)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non empty list of values."""
+    ordered = sorted(values)
+    rank = max(int(math.ceil(pct * len(ordered) / 100.0)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class GCMonitor(object):
+    """Context manager measuring the garbage collector pauses."""
+
+    def __init__(self):
+        self.pauses = []
+        self._started = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.pauses.append(time.perf_counter() - self._started)
+            self._started = None
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self)
+
+
+def measure(merge_fn, triple, repeat=5, time_limit=30.0):
+    """Time ``merge_fn`` on a triple.
+
+    Runs at most ``repeat`` times, stopping early once ``time_limit``
+    seconds have been spent, then once more under ``tracemalloc`` for the
+    peak memory.
+    """
+    root, head, update = triple
+    latencies = []
+    with GCMonitor() as gc_monitor:
+        while len(latencies) < repeat and sum(latencies) < time_limit:
+            start = time.perf_counter()
+            merge_fn(root, head, update)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        merge_fn(root, head, update)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        'runs': len(latencies),
+        'throughput': len(latencies) / total if total else None,
+        'latency': {
+            'mean': total / len(latencies),
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies),
+        },
+        'peak_memory': peak_memory,
+        'gc': {
+            'collections': len(gc_monitor.pauses),
+            'pause_total': sum(gc_monitor.pauses),
+            'pause_max': max(gc_monitor.pauses or [0.0]),
+        },
+    }
+
+
+def measure_codec_share(json_codec, triple, repeat=5):
+    """Time parsing a triple and dumping its merge against merging it.
+
+    Returns:
+        dict: the median time spent parsing, merging and dumping, and the
+        share of parsing and dumping in their sum.
+    """
+    data = [json_codec.dumpb(version) for version in triple]
+    timings = {'parse': [], 'merge': [], 'dump': []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        root, head, update = [json_codec.loads(version) for version in data]
+        parsed = time.perf_counter()
+        merged, conflicts = merge(root, head, update)
+        merged_at = time.perf_counter()
+        json_codec.dumpb({'merged': merged, 'conflicts': conflicts})
+        dumped = time.perf_counter()
+        timings['parse'].append(parsed - start)
+        timings['merge'].append(merged_at - parsed)
+        timings['dump'].append(dumped - merged_at)
+    result = dict((phase, percentile(values, 50))
+                  for phase, values in timings.items())
+    result['share'] = (result['parse'] + result['dump']) / \
+        sum(result.values())
+    return result
+
+
+def calibrate(rounds=5):
+    """Time a fixed workload made of the same kind of operations as a merge.
+
+    Returns:
+        float: the fastest of ``rounds`` runs, in seconds.
+    """
+    record = generate_triple(num_authors=50, num_references=50)[0]
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(20):
+            copied = copy.deepcopy(record)
+            json.loads(json.dumps(copied, sort_keys=True))
+            sorted(author['full_name'].lower()
+                   for author in copied['authors'])
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def compare_results(baseline, results, tolerance=0.2, memory_tolerance=0.1):
+    """Compare the scenarios run in both ``baseline`` and ``results``.
+
+    Median latencies are compared relative to the calibration time of each
+    run, peak memory is compared as is.
+
+    Returns:
+        list: messages describing the regressions beyond the tolerances.
+    """
+    base_calibration = baseline['meta']['calibration']
+    calibration = results['meta']['calibration']
+    regressions = []
+    for name, result in sorted(results['scenarios'].items()):
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        ratio = ((result['latency']['p50'] / calibration) /
+                 (base['latency']['p50'] / base_calibration))
+        if ratio > 1 + tolerance:
+            regressions.append(
+                '{}: normalized median latency is {:.0%} of the '
+                'baseline'.format(name, ratio))
+        memory_ratio = result['peak_memory'] / max(base['peak_memory'], 1)
+        if memory_ratio > 1 + memory_tolerance:
+            regressions.append(
+                '{}: peak memory is {:.0%} of the baseline'.format(
+                    name, memory_ratio))
+    return regressions
+
+
+def settings_mismatches(baseline, settings):
+    """Describe the :data:`COMPARED_SETTINGS` differing from the baseline.
+
+    Args:
+        baseline (dict): results stored as baseline.
+
+        settings (dict): the settings of the run.
+    """
+    meta = baseline.get('meta', {})
+    return ['{}: {!r} in the baseline, {!r} in this run'.format(
+        name, meta.get(name), settings[name])
+        for name in COMPARED_SETTINGS if meta.get(name) != settings[name]]
+
+
+def run_benchmarks(engine='arxiv2arxiv', fixtures_dir='tests/fixtures',
+                   select=None, repeat=5, time_limit=30.0, log=None,
+                   codec_share=False):
+    """Run the scenarios matching one of the ``select`` patterns (or all)."""
+    merge_fn = ENGINES[engine]
+    results = {
+        'meta': {
+            'engine': engine,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'repeat': repeat,
+            'time_limit': time_limit,
+            'calibration': calibrate(),
+        },
+        'scenarios': {},
+    }
+    for name, make_triple in iter_scenarios(fixtures_dir):
+        if select and not any(fnmatch.fnmatchcase(name, pattern)
+                              for pattern in select):
+            continue
+        result = measure(merge_fn, make_triple(), repeat, time_limit)
+        results['scenarios'][name] = result
+        if codec_share:
+            result['codec'] = dict(
+                (codec_name, measure_codec_share(codec_class(),
+                                                 make_triple(), repeat))
+                for codec_name, codec_class in codec.CODECS.items())
+        if log is not None:
+            print('{:<45} p50 {:10.4f}s  peak {:8.1f} KiB'.format(
+                name, result['latency']['p50'],
+                result['peak_memory'] / 1024.0), file=log)
+            for codec_name, share in sorted(result.get('codec', {}).items()):
+                print('    {:<8} parse {:8.4f}s  dump {:8.4f}s  '
+                      'share {:5.1%}'.format(codec_name, share['parse'],
+                                             share['dump'], share['share']),
+                      file=log)
+    return results
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--engine', choices=sorted(ENGINES),
+                        default='arxiv2arxiv')
+    parser.add_argument('--fixtures-dir', default='tests/fixtures')
+    parser.add_argument('--select', action='append',
+                        help='only run the scenarios matching this glob '
+                             'pattern (e.g. "authors:*")')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--time-limit', type=float, default=30.0,
+                        help='seconds after which a scenario stops '
+                             'repeating')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        metavar='PATH',
+                        help='store the results as baseline (default: '
+                             '%(const)s)')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE,
+                        metavar='PATH',
+                        help='fail on regressions compared to the baseline '
+                             '(default: %(const)s)')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase of the normalized '
+                             'median latency')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1,
+                        help='allowed relative increase of the peak memory')
+    parser.add_argument('--codec-share', action='store_true',
+                        help='also measure the share of JSON parsing and '
+                             'dumping with every available codec')
+    return parser
+
+
+def _dump(results, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (IOError, ValueError) as e:
+            print('error: cannot read the baseline {}: {}'.format(
+                args.compare, e), file=sys.stderr)
+            sys.exit(2)
+        mismatches = settings_mismatches(baseline, {
+            'engine': args.engine,
+            'repeat': args.repeat,
+            'time_limit': args.time_limit,
+        })
+        if mismatches:
+            print('error: the baseline was recorded with other settings',
+                  file=sys.stderr)
+            for mismatch in mismatches:
+                print('  ' + mismatch, file=sys.stderr)
+            sys.exit(2)
+    results = run_benchmarks(args.engine, args.fixtures_dir, args.select,
+                             args.repeat, args.time_limit, log=sys.stderr,
+                             codec_share=args.codec_share)
+    _dump(results, args.output)
+    if args.save_baseline:
+        _dump(results, args.save_baseline)
+    if baseline is not None:
+        regressions = compare_results(baseline, results, args.tolerance,
+                                      args.memory_tolerance)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Bloom filter prefiltering of list entity matching."""
+
+from __future__ import absolute_import, division, print_function
+
+import math
+
+
+def freeze(value):
+    """Hashable version of a JSON value, equal iff the values are equal."""
+    if isinstance(value, dict):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class BloomFilter(object):
+    """Bloom filter over hashable keys.
+
+    Membership tests can have false positives (with a probability close to
+    ``error_rate`` when at most ``capacity`` keys are added) but never false
+    negatives.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        capacity = max(capacity, 1)
+        self.num_bits = max(int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(
+            self.num_bits / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: h1 + i * h2 gives k independent enough positions.
+        h1 = hash(key)
+        h2 = hash((h1, key)) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        for pos in self._positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class BloomPrefilter(object):
+    """Configuration and stats of the Bloom filter prefilter.
+
+    For the list fields in ``fields`` compared with a primary key comparator,
+    the normalized primary keys of one of the lists are put in a Bloom filter
+    and the elements of the other list whose keys are certainly not in it are
+    not compared at all. The stats accumulate over all the merges using the
+    same instance.
+    """
+
+    #: High cardinality lists in which most items have no counterpart.
+    default_fields = ('dois', 'keywords', 'references', 'report_numbers')
+
+    def __init__(self, fields=None, error_rate=0.01):
+        self.fields = frozenset(
+            self.default_fields if fields is None else fields)
+        self.error_rate = error_rate
+        self.comparisons = 0
+        self.skipped = 0
+
+    @property
+    def stats(self):
+        """Dict with the performed and ``skipped`` element comparisons."""
+        total = self.comparisons + self.skipped
+        return {
+            'comparisons': self.comparisons,
+            'skipped': self.skipped,
+            'skipped_fraction': self.skipped / total if total else 0.0,
+        }
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Budget for the author matching of a merge."""
+
+from __future__ import absolute_import, division, print_function
+
+import time
+
+from json_merger.contrib.inspirehep.match import (
+    BipartiteConnectedComponents,
+    _match_munkres,
+)
+
+
+class BudgetExhausted(Exception):
+    """The author matching budget of a merge is exhausted."""
+
+
+class AuthorMatchBudget(object):
+    """Limits on the author matching work of each merge.
+
+    A merge whose author matching needs more than ``max_comparisons``
+    distance evaluations or ``max_seconds`` seconds falls back to a cheap
+    deterministic matching for the authors not matched yet. The time is
+    checked between the steps of the matching (see
+    :func:`budgeted_distance_function_match`). The instance keeps
+    count of the merges using it and of how many exhausted the budget.
+    """
+
+    def __init__(self, max_comparisons=None, max_seconds=None):
+        self.max_comparisons = max_comparisons
+        self.max_seconds = max_seconds
+        self.merges = 0
+        self.exhausted = 0
+
+    def new_tracker(self):
+        """Start tracking the spending of a new merge."""
+        self.merges += 1
+        return BudgetTracker(self)
+
+    @property
+    def stats(self):
+        """Dict with the number of merges and of exhausted budgets."""
+        return {
+            'merges': self.merges,
+            'exhausted': self.exhausted,
+            'hit_rate': self.exhausted / self.merges if self.merges else 0.0,
+        }
+
+
+class BudgetTracker(object):
+    """Spending of an :class:`AuthorMatchBudget` by a single merge."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.comparisons = 0
+        self.exhausted = False
+        self.deadline = None
+
+    def spend(self):
+        """Account for a distance evaluation.
+
+        Raises:
+            BudgetExhausted: if the budget doesn't allow it.
+        """
+        self.comparisons += 1
+        self.check()
+
+    def check(self):
+        """Check that the budget isn't exhausted.
+
+        The time budget starts with the first check.
+
+        Raises:
+            BudgetExhausted: if it is.
+        """
+        if self.exhausted:
+            raise BudgetExhausted()
+        if self.deadline is None and self.budget.max_seconds is not None:
+            self.deadline = time.time() + self.budget.max_seconds
+        max_comparisons = self.budget.max_comparisons
+        if ((max_comparisons is not None and
+                self.comparisons > max_comparisons) or
+                (self.deadline is not None and time.time() > self.deadline)):
+            self.exhausted = True
+            self.budget.exhausted += 1
+            raise BudgetExhausted()
+
+
+class BudgetedDistance(object):
+    """Distance function spending from a :class:`BudgetTracker`."""
+
+    def __init__(self, distance_function, tracker):
+        self.distance_function = distance_function
+        self.tracker = tracker
+
+    def __call__(self, obj1, obj2):
+        self.tracker.spend()
+        return self.distance_function(obj1, obj2)
+
+
+def budgeted_distance_function_match(l1, l2, threshold, distance_function,
+                                     norm_functions, fallback_norm_functions,
+                                     tracker):
+    """``distance_function_match`` of json-merger, within a budget.
+
+    The matching is the same as the one of
+    :func:`json_merger.contrib.inspirehep.match.distance_function_match`,
+    but ``tracker`` is checked before each normalization, before building
+    the distance matrix and before each assignment. Once it is exhausted,
+    the matches already found are kept and the elements left are matched
+    by :func:`match_by_normalizers` with ``fallback_norm_functions``.
+
+    Returns:
+        list: pairs of matching indices from l1 and l2.
+    """
+    matches = []
+    # Like json-merger, iterate over the elements left in the order of a
+    # set of their positions, so that Munkres breaks ties the same way.
+    l1_left = list(range(len(l1)))
+    l2_left = list(range(len(l2)))
+    try:
+        for norm_fn in norm_functions:
+            buckets_l1 = _group_all_indices_by(l1, l1_left, norm_fn, tracker)
+            buckets_l2 = _group_all_indices_by(l2, l2_left, norm_fn, tracker)
+            l1_only = set(range(len(l1_left)))
+            l2_only = set(range(len(l2_left)))
+            for normed, l1_positions in buckets_l1.items():
+                l2_positions = buckets_l2.get(normed, [])
+                if len(l1_positions) != 1 or len(l2_positions) != 1:
+                    continue
+                l1_idx = l1_left[l1_positions[0]]
+                l2_idx = l2_left[l2_positions[0]]
+                if distance_function(l1[l1_idx], l2[l2_idx]) > threshold:
+                    continue
+                l1_only.remove(l1_positions[0])
+                l2_only.remove(l2_positions[0])
+                matches.append((l1_idx, l2_idx))
+            l1_left = [l1_left[pos] for pos in l1_only]
+            l2_left = [l2_left[pos] for pos in l2_only]
+
+        tracker.check()
+        dist_matrix = [[distance_function(l1[l1_idx], l2[l2_idx])
+                        for l2_idx in l2_left] for l1_idx in l1_left]
+        components = BipartiteConnectedComponents()
+        for l1_pos in range(len(l1_left)):
+            for l2_pos in range(len(l2_left)):
+                if dist_matrix[l1_pos][l2_pos] <= threshold:
+                    components.add_edge(l1_pos, l2_pos)
+
+        for l1_positions, l2_positions in \
+                components.get_connected_components():
+            tracker.check()
+            part_dist_matrix = [[dist_matrix[l1_pos][l2_pos]
+                                 for l2_pos in l2_positions]
+                                for l1_pos in l1_positions]
+            matches.extend(_match_munkres(
+                [l1_left[pos] for pos in l1_positions],
+                [l2_left[pos] for pos in l2_positions],
+                part_dist_matrix, threshold))
+    except BudgetExhausted:
+        matched_l1 = set(l1_idx for l1_idx, _ in matches)
+        matched_l2 = set(l2_idx for _, l2_idx in matches)
+        l1_left = [idx for idx in range(len(l1)) if idx not in matched_l1]
+        l2_left = [idx for idx in range(len(l2)) if idx not in matched_l2]
+        matches.extend(
+            (l1_left[l1_pos], l2_left[l2_pos])
+            for l1_pos, l2_pos in match_by_normalizers(
+                [l1[idx] for idx in l1_left], [l2[idx] for idx in l2_left],
+                fallback_norm_functions))
+    return matches
+
+
+def _group_all_indices_by(lst, indices, fn, tracker):
+    buckets = {}
+    for pos, idx in enumerate(indices):
+        tracker.check()
+        buckets.setdefault(fn(lst[idx]), []).append(pos)
+    return buckets
+
+
+def match_by_normalizers(l1, l2, norm_functions):
+    """Cheap deterministic matching of two lists.
+
+    For each normalization function in turn, elements of the two lists are
+    matched if they are the only ones of their lists with the same
+    normalized value. Elements normalized to an empty value (e.g. ``None``)
+    are never matched.
+
+    Returns:
+        list: pairs of matching indices from l1 and l2.
+    """
+    matches = []
+    l1_left = list(range(len(l1)))
+    l2_left = list(range(len(l2)))
+    for norm_fn in norm_functions:
+        buckets_l1 = _group_indices_by(l1, l1_left, norm_fn)
+        buckets_l2 = _group_indices_by(l2, l2_left, norm_fn)
+        matched_l1 = set()
+        matched_l2 = set()
+        for normed, l1_indices in buckets_l1.items():
+            l2_indices = buckets_l2.get(normed, [])
+            if len(l1_indices) != 1 or len(l2_indices) != 1:
+                continue
+            matches.append((l1_indices[0], l2_indices[0]))
+            matched_l1.add(l1_indices[0])
+            matched_l2.add(l2_indices[0])
+        l1_left = [idx for idx in l1_left if idx not in matched_l1]
+        l2_left = [idx for idx in l2_left if idx not in matched_l2]
+    return matches
+
+
+def _group_indices_by(lst, indices, fn):
+    buckets = {}
+    for idx in indices:
+        key = fn(lst[idx])
+        if key:
+            buckets.setdefault(key, []).append(idx)
+    return buckets
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Caches that live for the duration of a single merge."""
+
+from __future__ import absolute_import, division, print_function
+
+
+class NormalizationCache(object):
+    """Memoizes normalization results for the duration of a single merge.
+
+    A three-way merge aligns root with head, root with update and head with
+    update, so every list element is normalized at least twice. The cache is
+    keyed by the identity of the normalizer and of the element, so each
+    element gets normalized exactly once per normalizer for the whole merge.
+
+    The cache keeps a reference to every element it has seen (identities are
+    only unique among live objects), so it has to be cleared when the merge
+    ends.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, normalizer, obj):
+        """Return ``normalizer(obj)``, computing it only the first time."""
+        key = (id(normalizer), id(obj))
+        entry = self._values.get(key)
+        if entry is not None and entry[0] is obj:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = normalizer(obj)
+        self._values[key] = (obj, value)
+        return value
+
+    @property
+    def stats(self):
+        """Dict with the number of saved (``hits``) and computed
+        (``misses``) normalizations."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._values),
+        }
+
+    def clear(self):
+        """Release all the cached values and the elements they refer to."""
+        self._values.clear()
+
+
+class CachedNormalizer(object):
+    """Callable that routes a normalization function through a cache."""
+
+    def __init__(self, normalizer, cache):
+        self.normalizer = normalizer
+        self.cache = cache
+
+    def __call__(self, obj):
+        return self.cache.normalize(self.normalizer, obj)
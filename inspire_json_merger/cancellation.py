@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Cancellation of merges in progress.
+
+A merge is cancelled by setting a :class:`threading.Event`, which the merge
+checks before merging each list element and while matching list elements,
+before each comparison.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+
+class MergeCancelled(Exception):
+    """The merge was cancelled before it completed."""
+
+
+def check_cancelled(cancelled):
+    """Raise :class:`MergeCancelled` if the ``cancelled`` event is set."""
+    if cancelled.is_set():
+        raise MergeCancelled()
+
+
+class CancellableDistance(object):
+    """Distance function checking a cancellation event before each call."""
+
+    def __init__(self, distance_function, cancelled):
+        self.distance_function = distance_function
+        self.cancelled = cancelled
+
+    def __call__(self, obj1, obj2):
+        check_cancelled(self.cancelled)
+        return self.distance_function(obj1, obj2)
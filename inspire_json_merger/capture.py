@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Capture of slow merges for offline reproduction."""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import hashlib
+import inspect
+import os
+import tempfile
+import threading
+import time
+
+import json_merger
+
+from . import codec, merger_config_arxiv2arxiv
+
+_config_version = None
+
+
+def get_config_version():
+    """Identify the merge configuration and the json-merger release."""
+    global _config_version
+    if _config_version is None:
+        source = inspect.getsource(merger_config_arxiv2arxiv)
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        _config_version = '%s+json-merger-%s' % (digest[:12],
+                                                 json_merger.__version__)
+    return _config_version
+
+
+def load_capture(path):
+    """Load a capture written by :class:`SlowMergeCapture`."""
+    with open(path, 'rb') as f:
+        return codec.loads(f.read())
+
+
+class SlowMergeCapture(object):
+    """Writes the inputs of slow merges to ``directory``.
+
+    Every merge lasting at least ``threshold`` seconds is written to a JSON
+    file with its root, head and update, the configuration version, its
+    duration, the per-field timings (see
+    :class:`~inspire_json_merger.instrumentation.FieldTimer`) and its
+    number of conflicts. At most ``max_captures`` merges are written every
+    ``period`` seconds, and no more once the captures in the directory
+    weigh ``max_bytes``. Skipped captures are counted in ``dropped``.
+
+    Args:
+        directory (str): where to write the captures.
+
+        threshold (float): seconds after which a merge is slow.
+
+        max_captures (int): captures allowed every ``period`` seconds.
+
+        period (float): the rate limiting period in seconds.
+
+        max_bytes (int): total size allowed for the captures.
+    """
+
+    #: Whether merges have to be instrumented to report per-field timings.
+    instrument = True
+
+    def __init__(self, directory, threshold=1.0, max_captures=10,
+                 period=3600.0, max_bytes=100 * 1024 * 1024):
+        self.directory = directory
+        self.threshold = threshold
+        self.max_captures = max_captures
+        self.period = period
+        self.max_bytes = max_bytes
+        self.captured = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._recent_captures = collections.deque()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory) if name.endswith('.json'))
+
+    def _rate_limited(self, now):
+        while (self._recent_captures and
+               self._recent_captures[0] <= now - self.period):
+            self._recent_captures.popleft()
+        return len(self._recent_captures) >= self.max_captures
+
+    def capture(self, root, head, update, merger, elapsed):
+        """Write the merge down if it was slow.
+
+        Args:
+            merger (:class:`~inspire_json_merger.api.ArxivToArxivMerger`):
+                the merger, once its ``merge`` returned or raised.
+
+            elapsed (float): duration of the merge.
+
+        Returns:
+            str: the path of the capture, or ``None`` if the merge wasn't
+            captured.
+        """
+        if elapsed < self.threshold:
+            return None
+
+        now = time.time()
+        with self._lock:
+            if self._rate_limited(now):
+                self.dropped += 1
+                return None
+            data = codec.dumpb({
+                'root': root,
+                'head': head,
+                'update': update,
+                'config_version': get_config_version(),
+                'captured_at': now,
+                'elapsed': elapsed,
+                'timings': merger.field_report,
+                'conflicts': len(merger.conflicts),
+            }, sort_keys=True)
+            if self._size + len(data) > self.max_bytes:
+                self.dropped += 1
+                return None
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            path = os.path.join(self.directory, 'merge-%s-%s.json' % (
+                time.strftime('%Y%m%dT%H%M%S', time.gmtime(now)),
+                os.path.basename(tmp_path)[:-len('.tmp')]))
+            os.replace(tmp_path, path)
+            self._size += len(data)
+            self._recent_captures.append(now)
+            self.captured += 1
+            return path
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Checkpoints of long runs of the merge pipeline.
+
+A checkpoint records the position of the next line to read in the input
+and the position of the end of the last line written in the output, once
+the output has been flushed to disk. A run restarted with the same
+checkpoint truncates the output there and reads the input from there, so
+that no line is merged twice or lost.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import tempfile
+
+
+class Checkpoint(object):
+    """Checkpoint file of a run.
+
+    Args:
+        path (str): the checkpoint file, written atomically.
+
+        interval (int): the number of lines written between checkpoints.
+    """
+
+    def __init__(self, path, interval=1000):
+        self.path = path
+        self.interval = interval
+        self.saved = 0
+
+    def load(self):
+        """The last state saved, or ``None`` if there is no checkpoint."""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except IOError:
+            return None
+
+    def save(self, state):
+        """Durably replace the checkpoint with a new state."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        if hasattr(os, 'O_DIRECTORY'):
+            # Make the rename itself durable.
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.saved += 1
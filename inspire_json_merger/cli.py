@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Command line interface of the merger.
+
+Run it with ``python -m inspire_json_merger``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import signal
+import sys
+import time
+
+from json_merger.errors import MergeError
+
+from . import codec
+from .api import ArxivToArxivMerger
+from .benchmark import load_fixture
+from .capture import get_config_version, load_capture
+from .checkpoint import Checkpoint
+from .daemon import DEFAULT_SOCKET, MergeDaemon
+from .dump import DumpReader
+from .pipeline import MergePipeline
+from .profiling import format_groups, group_stats, profile_merge
+
+
+def load_triple(path, fixtures_dir='tests/fixtures'):
+    """Load a (root, head, update) triple.
+
+    Args:
+        path (str): a directory with ``root.json``, ``head.json`` and
+            ``update.json``, a JSON file with ``root``, ``head`` and
+            ``update`` keys (like captures), or the name of a fixture.
+    """
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            data = codec.loads(f.read())
+        return data['root'], data['head'], data['update']
+    if os.path.isdir(path):
+        # Without a trailing slash, whose basename is empty.
+        path = os.path.normpath(path)
+        return load_fixture(os.path.dirname(path), os.path.basename(path))
+    return load_fixture(fixtures_dir, path)
+
+
+def replay(args):
+    """Re-run a captured merge under the profiler."""
+    capture = load_capture(args.capture)
+    if capture['config_version'] != get_config_version():
+        print('warning: captured with configuration %s, running %s' % (
+            capture['config_version'], get_config_version()),
+            file=sys.stderr)
+
+    profiler = cProfile.Profile()
+    for run in range(args.repeat):
+        merger = ArxivToArxivMerger(capture['root'], capture['head'],
+                                    capture['update'])
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            merger.merge()
+        except MergeError:
+            pass
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        print('run %d: %.3fs, %d conflicts (captured: %.3fs, %d conflicts)'
+              % (run + 1, elapsed, len(merger.conflicts),
+                 capture['elapsed'], capture['conflicts']))
+
+    stats = pstats.Stats(profiler, stream=sys.stdout)
+    stats.sort_stats(args.sort).print_stats(args.limit)
+    if args.output:
+        profiler.dump_stats(args.output)
+
+
+def profile(args):
+    """Profile the merge of a triple."""
+    triple = load_triple(args.input, args.fixtures_dir)
+    stats, sampler = profile_merge(triple, args.repeat, args.interval)
+    print(format_groups(group_stats(stats), stats.total_tt, args.top))
+    with open(args.collapsed, 'w') as f:
+        for line in sampler.collapsed():
+            print(line, file=f)
+    print('\n%d stacks sampled, written to %s' % (
+        sum(sampler.samples.values()), args.collapsed))
+    if args.output:
+        stats.dump_stats(args.output)
+
+
+def daemon(args):
+    """Serve merges over a Unix domain socket."""
+    server = MergeDaemon(args.socket, args.workers)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('serving merges on %s' % args.socket, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def shard_spec(value):
+    """Parse a ``K/N`` shard specification."""
+    try:
+        shard, num_shards = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected K/N, got %r' % value)
+    if not 0 <= shard < num_shards:
+        raise argparse.ArgumentTypeError('expected 0 <= K < N')
+    return shard, num_shards
+
+
+def batch(args):
+    """Merge a file of triples."""
+    line_range = None
+    if args.shard is not None:
+        shard, num_shards = args.shard
+        with DumpReader(args.input) as reader:
+            line_range = reader.shards(num_shards)[shard]
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval)
+    pipeline = MergePipeline(args.input, args.output, args.workers,
+                             not args.unordered, args.queue_size,
+                             args.max_in_flight,
+                             shared_memory=args.shared_memory,
+                             shard=line_range, checkpoint=checkpoint,
+                             window=args.window)
+    stats = pipeline.run()
+    json.dump(stats, sys.stderr, indent=2, sort_keys=True)
+    print(file=sys.stderr)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='python -m inspire_json_merger')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    replay_parser = subparsers.add_parser(
+        'replay', help='re-run a captured slow merge under the profiler')
+    replay_parser.add_argument('capture', help='the capture file')
+    replay_parser.add_argument('--repeat', type=int, default=1)
+    replay_parser.add_argument('--sort', default='cumulative',
+                               help='pstats sort key (default: '
+                                    '%(default)s)')
+    replay_parser.add_argument('--limit', type=int, default=30,
+                               help='number of functions to show')
+    replay_parser.add_argument('--output',
+                               help='also dump the profile to this file')
+    replay_parser.set_defaults(func=replay)
+
+    profile_parser = subparsers.add_parser(
+        'profile', help='profile the merge of a triple')
+    profile_parser.add_argument(
+        'input', help='a fixture name, a directory with root.json, '
+                      'head.json and update.json or a JSON file with root, '
+                      'head and update (like captures)')
+    profile_parser.add_argument('--fixtures-dir', default='tests/fixtures')
+    profile_parser.add_argument('--repeat', type=int, default=5)
+    profile_parser.add_argument('--top', type=int, default=20,
+                                help='number of groups to show')
+    profile_parser.add_argument('--interval', type=float, default=0.001,
+                                help='seconds between two stack samples')
+    profile_parser.add_argument('--collapsed', default='profile.folded',
+                                help='where to write the collapsed stacks '
+                                     '(default: %(default)s)')
+    profile_parser.add_argument('--output',
+                                help='also dump the cProfile stats to this '
+                                     'file')
+    profile_parser.set_defaults(func=profile)
+
+    daemon_parser = subparsers.add_parser(
+        'daemon', help='serve merges over a Unix domain socket')
+    daemon_parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                               help='path of the socket (default: '
+                                    '%(default)s)')
+    daemon_parser.add_argument('--workers', type=int,
+                               help='number of worker processes (default: '
+                                    'the number of CPUs)')
+    daemon_parser.set_defaults(func=daemon)
+
+    batch_parser = subparsers.add_parser(
+        'batch', help='merge a JSONL file of root, head and update triples')
+    batch_parser.add_argument('input', help='the triples, optionally '
+                                            'compressed (.gz or .zst)')
+    batch_parser.add_argument('output', help='where to write the results, '
+                                             'optionally compressed')
+    batch_parser.add_argument('--workers', type=int,
+                              help='number of worker processes (default: '
+                                   'the number of CPUs)')
+    batch_parser.add_argument('--unordered', action='store_true',
+                              help="don't keep the order of the input")
+    batch_parser.add_argument('--queue-size', type=int, default=1000,
+                              help='parsed triples waiting to be merged')
+    batch_parser.add_argument('--max-in-flight', type=int,
+                              help='triples being merged or waiting to be '
+                                   'written (default: twice the workers)')
+    batch_parser.add_argument('--window', type=int,
+                              help='parsed triples handed to the workers '
+                                   'at once, the most expensive first '
+                                   '(default and maximum: --max-in-flight)')
+    batch_parser.add_argument('--shared-memory', action='store_true',
+                              help='pass the triples to the workers through '
+                                   'shared memory')
+    batch_parser.add_argument('--shard', type=shard_spec, metavar='K/N',
+                              help='only merge the K-th of N shards of '
+                                   'about the same size of an uncompressed '
+                                   'input')
+    batch_parser.add_argument('--checkpoint', metavar='PATH',
+                              help='save the progress there, and resume '
+                                   'from it if it exists (needs an '
+                                   'uncompressed output)')
+    batch_parser.add_argument('--checkpoint-interval', type=int,
+                              default=1000,
+                              help='lines written between checkpoints')
+    batch_parser.set_defaults(func=batch)
+
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
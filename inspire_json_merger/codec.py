@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""JSON codec used wherever records are parsed or dumped.
+
+The codec uses `orjson <https://github.com/ijl/orjson>`_ when it is
+installed and the standard :mod:`json` module otherwise. Both write
+compact JSON with non-ASCII characters as they are, so that the output
+doesn't depend on the backend. orjson writes floats smaller than 1e-4
+without an exponent (``0.000025`` rather than ``2.5e-05``) and non-finite
+floats as ``null``, which records, coming from JSON, don't have. Whatever
+orjson refuses (keys that aren't strings, integers over 64 bits, lone
+surrogates, ``NaN`` literals) is handed to :mod:`json`, so the errors are
+the ones of :mod:`json` too.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONCodec(object):
+    """Codec using the :mod:`json` module."""
+
+    name = 'json'
+
+    def loads(self, data):
+        """Parse JSON from a string or UTF-8 bytes."""
+        return json.loads(data)
+
+    def dumps(self, obj, sort_keys=False):
+        """Dump an object to a JSON string."""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'),
+                          sort_keys=sort_keys)
+
+    def dumpb(self, obj, sort_keys=False):
+        """Dump an object to UTF-8 encoded JSON."""
+        return self.dumps(obj, sort_keys).encode('utf-8')
+
+
+class OrjsonCodec(JSONCodec):
+    """Codec using orjson, falling back to :mod:`json`."""
+
+    name = 'orjson'
+
+    def loads(self, data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super(OrjsonCodec, self).loads(data)
+
+    def dumps(self, obj, sort_keys=False):
+        return self.dumpb(obj, sort_keys).decode('utf-8')
+
+    def dumpb(self, obj, sort_keys=False):
+        try:
+            return orjson.dumps(
+                obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        except TypeError:
+            return super(OrjsonCodec, self).dumps(
+                obj, sort_keys).encode('utf-8')
+
+
+CODECS = {'json': JSONCodec}
+if orjson is not None:
+    CODECS['orjson'] = OrjsonCodec
+
+_codec = OrjsonCodec() if orjson is not None else JSONCodec()
+
+
+def get_codec():
+    """The codec in use."""
+    return _codec
+
+
+def set_codec(name):
+    """Use another codec of :data:`CODECS`."""
+    global _codec
+    _codec = CODECS[name]()
+
+
+def loads(data):
+    """Parse JSON from a string or UTF-8 bytes with the codec in use."""
+    return _codec.loads(data)
+
+
+def dumps(obj, sort_keys=False):
+    """Dump an object to a JSON string with the codec in use."""
+    return _codec.dumps(obj, sort_keys)
+
+
+def dumpb(obj, sort_keys=False):
+    """Dump an object to UTF-8 encoded JSON with the codec in use."""
+    return _codec.dumpb(obj, sort_keys)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Per-merge specializations of the configured comparators.
+
+json-merger instantiates a comparator class for every pair of lists it
+aligns, so per-merge state (like the normalization cache) is handed to the
+comparators by deriving a new class from each configured one.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.comparator import DefaultComparator, PrimaryKeyComparator
+from json_merger.contrib.inspirehep.comparators import (
+        DistanceFunctionComparator
+)
+from json_merger.nothing import NOTHING
+from json_merger.utils import get_obj_at_key_path
+
+from .bloom import BloomFilter, freeze
+from .budget import BudgetedDistance, budgeted_distance_function_match
+from .cache import CachedNormalizer
+from .cancellation import CancellableDistance, check_cancelled
+from .counters import CountingDistance
+from .tokens import with_interned_tokens
+
+
+def _get_class_attr(cls, name):
+    """Get a class attribute without binding it to the class."""
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return vars(klass)[name]
+    raise AttributeError(name)
+
+
+class EqualityComparator(DefaultComparator):
+    """``DefaultComparator`` matching hashable elements through a dict.
+
+    Lists without a configured comparator are mostly lists of strings, for
+    which looking elements up by hash avoids comparing every pair.
+    """
+
+    def process_lists(self):
+        index = {}
+        unhashable = []
+        for l2_idx, obj2 in enumerate(self.l2):
+            try:
+                index.setdefault(obj2, []).append(l2_idx)
+            except TypeError:
+                unhashable.append(l2_idx)
+
+        for l1_idx, obj1 in enumerate(self.l1):
+            try:
+                candidates = index.get(obj1, ())
+            except TypeError:
+                candidates = unhashable
+            for l2_idx in candidates:
+                if self.equal(obj1, self.l2[l2_idx]):
+                    self.matches.add((l1_idx, l2_idx))
+
+
+class FieldNormalizer(object):
+    """Callable returning the normalized value of a primary key field."""
+
+    def __init__(self, field, normalization_function=None):
+        self.field = field
+        self.key_path = tuple(k for k in field.split('.') if k)
+        self.normalization_function = normalization_function
+
+    def __call__(self, obj):
+        value = get_obj_at_key_path(obj, self.key_path, NOTHING)
+        if value is NOTHING or self.normalization_function is None:
+            return value
+        return self.normalization_function(value)
+
+
+class CachedPrimaryKeyComparatorMixin(object):
+    """Looks up the normalized primary keys in the per-merge cache."""
+
+    normalization_cache = None
+    field_normalizers = {}
+
+    def _have_field_equal(self, obj1, obj2, field):
+        normalizer = self.field_normalizers[field]
+        o1 = self.normalization_cache.normalize(normalizer, obj1)
+        o2 = self.normalization_cache.normalize(normalizer, obj2)
+        if o1 is NOTHING or o2 is NOTHING:
+            return False
+        return o1 == o2
+
+
+class BudgetedDistanceComparatorMixin(object):
+    """Falls back to cheap matching when the matching budget is exhausted.
+
+    The authors not matched yet are then matched only by the
+    ``fallback_norm_functions`` of the comparator (or all its
+    ``norm_functions`` if it has none).
+    """
+
+    budget_tracker = None
+
+    def process_lists(self):
+        self.matches = set(budgeted_distance_function_match(
+            self.l1, self.l2, self.threshold,
+            self.__class__.__dict__['distance_function'],
+            self.norm_functions, self.fallback_norm_functions,
+            self.budget_tracker))
+
+
+class BloomPrefilterComparatorMixin(object):
+    """Doesn't compare elements of ``l1`` whose keys are not in ``l2``.
+
+    Two elements are equal only if they are fully equal or have one of the
+    primary key field sets equal, so an element with at least one complete
+    primary key can only match elements sharing one of its keys.
+    """
+
+    bloom_prefilter = None
+
+    def _primary_keys(self, obj):
+        """Hashable normalized primary keys of ``obj``.
+
+        Returns ``None`` if ``obj`` has no complete primary key, and raises
+        ``TypeError`` if a normalized value can't be hashed.
+        """
+        keys = []
+        for idx, field_set in enumerate(self.primary_key_fields):
+            if not isinstance(field_set, list):
+                field_set = [field_set]
+            values = [self.normalization_cache.normalize(
+                self.field_normalizers[field], obj) for field in field_set]
+            if any(value is NOTHING for value in values):
+                continue
+            key = (idx, freeze(values))
+            hash(key)
+            keys.append(key)
+        return keys or None
+
+    def process_lists(self):
+        if not self.l1 or not self.l2:
+            return
+        prefilter = self.bloom_prefilter
+        bloom = BloomFilter(len(self.l2) * len(self.primary_key_fields),
+                            prefilter.error_rate)
+        try:
+            for obj2 in self.l2:
+                for key in self._primary_keys(obj2) or ():
+                    bloom.add(key)
+        except TypeError:
+            prefilter.comparisons += len(self.l1) * len(self.l2)
+            return super(BloomPrefilterComparatorMixin, self).process_lists()
+
+        for l1_idx, obj1 in enumerate(self.l1):
+            try:
+                keys = self._primary_keys(obj1)
+            except TypeError:
+                keys = None
+            if keys is not None and not any(key in bloom for key in keys):
+                prefilter.skipped += len(self.l2)
+                continue
+            prefilter.comparisons += len(self.l2)
+            for l2_idx, obj2 in enumerate(self.l2):
+                if self.equal(obj1, obj2):
+                    self.matches.add((l1_idx, l2_idx))
+
+
+class CancellableComparatorMixin(object):
+    """Checks a cancellation event before each ``equal`` call."""
+
+    cancelled = None
+
+    def equal(self, obj1, obj2):
+        check_cancelled(self.cancelled)
+        return super(CancellableComparatorMixin, self).equal(obj1, obj2)
+
+
+class CountingComparatorMixin(object):
+    """Counts the ``equal`` calls and the normalizations of a comparator.
+
+    Normalizations are split between the computed ones and the ones found
+    in the normalization cache.
+    """
+
+    comparator_counters = None
+
+    def equal(self, obj1, obj2):
+        self.comparator_counters.equal_calls += 1
+        return super(CountingComparatorMixin, self).equal(obj1, obj2)
+
+    def process_lists(self):
+        cache = self.normalization_cache
+        hits, misses = cache.hits, cache.misses
+        try:
+            return super(CountingComparatorMixin, self).process_lists()
+        finally:
+            counters = self.comparator_counters
+            counters.cache_hits += cache.hits - hits
+            counters.normalizations += cache.misses - misses
+
+
+def _get_distance_threshold(comparator_cls):
+    # The configuration spells it ``threhsold``, which is not what
+    # DistanceFunctionComparator matches against, but what it means.
+    return getattr(comparator_cls, 'threhsold', comparator_cls.threshold)
+
+
+def _iter_primary_key_fields(primary_key_fields):
+    for field_set in primary_key_fields:
+        if not isinstance(field_set, list):
+            field_set = [field_set]
+        for field in field_set:
+            yield field
+
+
+def bind_comparator(comparator_cls, cache, token_table,
+                    bloom_prefilter=None, budget_tracker=None, counters=None,
+                    cancelled=None):
+    """Derive a comparator class that normalizes through ``cache``.
+
+    Author names are tokenized through ``token_table``, primary key
+    comparators skip hopeless comparisons if a
+    :class:`~inspire_json_merger.bloom.BloomPrefilter` is given and distance
+    function comparators spend from ``budget_tracker`` if given. Calls are
+    counted in ``counters`` (a
+    :class:`~inspire_json_merger.counters.PathCounters`) if given, and
+    comparisons raise
+    :class:`~inspire_json_merger.cancellation.MergeCancelled` once the
+    ``cancelled`` event is set, if given. Comparators that don't normalize
+    anything are returned unchanged.
+    """
+    if issubclass(comparator_cls, DistanceFunctionComparator):
+        distance_function = with_interned_tokens(
+            _get_class_attr(comparator_cls, 'distance_function'), token_table)
+        if counters is not None:
+            distance_function = CountingDistance(distance_function, counters)
+        if cancelled is not None:
+            distance_function = CancellableDistance(distance_function,
+                                                    cancelled)
+        norm_functions = comparator_cls.norm_functions
+        cached_norm_functions = dict(
+            (id(fn), CachedNormalizer(with_interned_tokens(fn, token_table),
+                                      cache))
+            for fn in norm_functions
+        )
+        bases = (comparator_cls,)
+        attrs = {
+            'normalization_cache': cache,
+            # DistanceFunctionComparator looks the distance function up in
+            # the class __dict__, so it has to be copied over.
+            'distance_function': distance_function,
+            'norm_functions': [cached_norm_functions[id(fn)]
+                               for fn in norm_functions],
+        }
+        if budget_tracker is not None:
+            fallback_norm_functions = getattr(
+                comparator_cls, 'fallback_norm_functions', norm_functions)
+            bases = (BudgetedDistanceComparatorMixin,) + bases
+            attrs['budget_tracker'] = budget_tracker
+            attrs['distance_function'] = BudgetedDistance(distance_function,
+                                                          budget_tracker)
+            attrs['fallback_norm_functions'] = [
+                cached_norm_functions.get(id(fn)) or CachedNormalizer(
+                    with_interned_tokens(fn, token_table), cache)
+                for fn in fallback_norm_functions
+            ]
+    elif issubclass(comparator_cls, PrimaryKeyComparator):
+        bases = (CachedPrimaryKeyComparatorMixin, comparator_cls)
+        normalization_functions = comparator_cls.normalization_functions
+        attrs = {
+            'normalization_cache': cache,
+            'field_normalizers': dict(
+                (field, FieldNormalizer(field,
+                                        normalization_functions.get(field)))
+                for field in _iter_primary_key_fields(
+                    comparator_cls.primary_key_fields)
+            ),
+        }
+        if bloom_prefilter is not None:
+            bases = (BloomPrefilterComparatorMixin,) + bases
+            attrs['bloom_prefilter'] = bloom_prefilter
+        if cancelled is not None:
+            bases = (CancellableComparatorMixin,) + bases
+            attrs['cancelled'] = cancelled
+    else:
+        return comparator_cls
+
+    if counters is not None:
+        bases = (CountingComparatorMixin,) + bases
+        attrs['comparator_counters'] = counters
+
+    return type(comparator_cls.__name__, bases, attrs)
+
+
+def bind_comparators(comparators, cache, token_table, bloom_prefilter=None,
+                     budget_tracker=None, comparator_counters=None,
+                     cancelled=None):
+    """Apply :func:`bind_comparator` to a ``COMPARATORS`` like dict.
+
+    The Bloom filter prefilter is only used for the fields it is configured
+    for, and ``comparator_counters`` (a
+    :class:`~inspire_json_merger.counters.ComparatorCounters`) keeps
+    separate counters for each path.
+    """
+    bound = {}
+    for path, comparator_cls in comparators.items():
+        prefilter = None
+        if bloom_prefilter is not None and path in bloom_prefilter.fields:
+            prefilter = bloom_prefilter
+        counters = None
+        if comparator_counters is not None:
+            threshold = None
+            if issubclass(comparator_cls, DistanceFunctionComparator):
+                threshold = _get_distance_threshold(comparator_cls)
+            counters = comparator_counters.for_path(path, threshold)
+        bound[path] = bind_comparator(comparator_cls, cache, token_table,
+                                      prefilter, budget_tracker, counters,
+                                      cancelled)
+    return bound
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Call counters of the comparators."""
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+
+
+class PathCounters(object):
+    """Call counters of the comparators of a configured path.
+
+    Distances are counted in a histogram whose buckets are multiples of
+    ``distance_threshold``, i.e. a distance falls in the bucket of bound
+    ``1.0`` if it is at most the threshold but more than ``0.75`` times it.
+    """
+
+    #: Upper bounds of the distance histogram buckets, relative to the
+    #: threshold. One last bucket counts the distances above all of them.
+    histogram_bounds = (0.0, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+
+    def __init__(self, distance_threshold=None):
+        self.equal_calls = 0
+        self.normalizations = 0
+        self.cache_hits = 0
+        self.distance_evaluations = 0
+        self.distance_threshold = distance_threshold
+        self.distance_histogram = [0] * (len(self.histogram_bounds) + 1)
+
+    def add_distance(self, distance):
+        self.distance_evaluations += 1
+        if self.distance_threshold:
+            relative = distance / self.distance_threshold
+        else:
+            relative = 0.0 if distance <= 0 else float('inf')
+        self.distance_histogram[
+            bisect.bisect_left(self.histogram_bounds, relative)] += 1
+
+    def add(self, other):
+        """Add the counts of other counters of the same path."""
+        self.equal_calls += other.equal_calls
+        self.normalizations += other.normalizations
+        self.cache_hits += other.cache_hits
+        self.distance_evaluations += other.distance_evaluations
+        self.distance_histogram = [
+            count + other_count for count, other_count
+            in zip(self.distance_histogram, other.distance_histogram)]
+
+    @property
+    def stats(self):
+        stats = {
+            'equal_calls': self.equal_calls,
+            'normalizations': self.normalizations,
+            'cache_hits': self.cache_hits,
+            'distance_evaluations': self.distance_evaluations,
+        }
+        if self.distance_threshold is not None:
+            labels = ['<=%g' % bound for bound in self.histogram_bounds]
+            labels.append('>%g' % self.histogram_bounds[-1])
+            stats['distance_threshold'] = self.distance_threshold
+            stats['distance_histogram'] = dict(
+                zip(labels, self.distance_histogram))
+        return stats
+
+
+class ComparatorCounters(object):
+    """Call counters of the comparators of merges, by configured path.
+
+    The same instance can be passed to several merges to aggregate their
+    counts.
+    """
+
+    def __init__(self):
+        self.paths = {}
+
+    def for_path(self, path, distance_threshold=None):
+        counters = self.paths.get(path)
+        if counters is None:
+            counters = self.paths[path] = PathCounters(distance_threshold)
+        return counters
+
+    def add(self, other):
+        """Add the counts of another instance, path by path."""
+        for path, counters in other.paths.items():
+            self.for_path(path, counters.distance_threshold).add(counters)
+
+    @property
+    def stats(self):
+        return dict((path, counters.stats)
+                    for path, counters in self.paths.items())
+
+
+class CountingDistance(object):
+    """Distance function adding the distances it computes to counters."""
+
+    def __init__(self, distance_function, counters):
+        self.distance_function = distance_function
+        self.counters = counters
+
+    def __call__(self, obj1, obj2):
+        distance = self.distance_function(obj1, obj2)
+        self.counters.add_distance(distance)
+        return distance
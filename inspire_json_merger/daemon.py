@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Merge daemon serving merges over a Unix domain socket.
+
+Importing the merger and its dependencies takes seconds, which short-lived
+tasks don't want to pay for every merge. The daemon imports them once and
+serves merges from a pool of warmed up worker processes. Start it with::
+
+    python -m inspire_json_merger daemon --socket /run/merger.sock
+
+Messages are JSON objects encoded in UTF-8 and prefixed by their length
+as a 4 bytes big-endian unsigned integer. A request holds the ``root``,
+``head`` and ``update`` to merge, and the response holds the ``merged``
+record and its ``conflicts``, or an ``error`` message.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import api, codec
+from .synthetic import generate_triple
+
+
+
+def _default_socket():
+    """A socket path in the runtime directory of the user, or in the
+    temporary directory with the user id in its name."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'inspire-json-merger.sock')
+    return os.path.join(tempfile.gettempdir(),
+                        'inspire-json-merger-%d.sock' % os.getuid())
+
+
+DEFAULT_SOCKET = _default_socket()
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+_HEADER = struct.Struct('>I')
+
+
+class DaemonError(Exception):
+    """The daemon couldn't merge a request."""
+
+
+def send_message(sock, obj):
+    data = codec.dumpb(obj)
+    if len(data) > MAX_MESSAGE_SIZE:
+        raise DaemonError('Message of %d bytes is too big' % len(data))
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise DaemonError('Connection closed in the middle of a message')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """Receive a message, or ``None`` if the connection was closed."""
+    header = sock.recv(_HEADER.size)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        header += _recv_exactly(sock, _HEADER.size - len(header))
+    size, = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise DaemonError('Message of %d bytes is too big' % size)
+    return codec.loads(_recv_exactly(sock, size))
+
+
+def warm_up():
+    """Run a merge, so that everything lazily set up is ready."""
+    api.merge(*generate_triple(num_authors=2, num_references=2))
+
+
+def merge_request(request):
+    merged, conflicts = api.merge(request['root'], request['head'],
+                                  request['update'])
+    return {'merged': merged, 'conflicts': conflicts}
+
+
+class _MergeRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (DaemonError, ValueError) as e:
+                send_message(self.request, {'error': str(e)})
+                return
+            if request is None:
+                return
+            try:
+                response = self.server.merge(request)
+            except Exception as e:
+                response = {'error': '%s: %s' % (type(e).__name__, e)}
+            try:
+                send_message(self.request, response)
+            except DaemonError as e:
+                # The response is too big, nothing of it was sent.
+                send_message(self.request, {'error': str(e)})
+
+
+def _remove_stale_socket(socket_path):
+    """Remove the socket left by a daemon that is not running anymore."""
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise DaemonError('%s exists and is not a socket' % socket_path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        sock.close()
+    raise DaemonError('A daemon is already serving on %s' % socket_path)
+
+
+class MergeDaemon(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+    """Serves merges on ``socket_path`` with ``workers`` processes.
+
+    Each connection is handled by a thread, which can send any number of
+    requests and waits for each response before sending the next one.
+
+    The workers are started and warmed up before serving. If one of them
+    dies, the pool is replaced and the requests it was merging are retried
+    once in the new pool. Only the user running the daemon can connect to
+    its socket.
+
+    Raises:
+        DaemonError: if another daemon serves on ``socket_path``, or if
+            something else than a socket is there.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, workers=None):
+        _remove_stale_socket(socket_path)
+        self.workers = workers or os.cpu_count() or 1
+        self._executor_lock = threading.Lock()
+        self.executor = self._start_executor()
+        self.restarts = 0
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_path,
+                                                   _MergeRequestHandler)
+        except BaseException:
+            self.executor.shutdown()
+            raise
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        os.chmod(self.server_address, 0o600)
+
+    def _start_executor(self):
+        executor = ProcessPoolExecutor(self.workers, initializer=warm_up)
+        # Workers are only started when tasks are submitted, submitting one
+        # task per worker starts them all.
+        for future in [executor.submit(os.getpid)
+                       for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _replace_executor(self, broken):
+        with self._executor_lock:
+            if self.executor is broken:
+                broken.shutdown(wait=False)
+                self.executor = self._start_executor()
+                self.restarts += 1
+            return self.executor
+
+    def merge(self, request):
+        """Merge a request in a worker.
+
+        Raises:
+            BrokenProcessPool: if a worker died while merging the request
+                in the new pool too.
+        """
+        executor = self.executor
+        try:
+            return executor.submit(merge_request, request).result()
+        except BrokenProcessPool:
+            executor = self._replace_executor(executor)
+        try:
+            return executor.submit(merge_request, request).result()
+        except BrokenProcessPool:
+            # Most likely this request kills the workers, the next ones
+            # get a new pool.
+            self._replace_executor(executor)
+            raise
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        with self._executor_lock:
+            self.executor.shutdown()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class MergeClient(object):
+    """Client of a :class:`MergeDaemon`, keeping its connection open.
+
+    Instances are not thread safe, threads should have their own client.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+
+    def _connect(self):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            self._sock.connect(self.socket_path)
+        return self._sock
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def merge(self, root, head, update):
+        """Same as :func:`inspire_json_merger.api.merge`, done by the daemon.
+
+        Raises:
+            DaemonError: if the daemon couldn't do the merge.
+        """
+        sock = self._connect()
+        try:
+            send_message(sock, {'root': root, 'head': head,
+                                'update': update})
+            response = recv_message(sock)
+        except Exception:
+            self.close()
+            raise
+        if response is None:
+            self.close()
+            raise DaemonError('The daemon closed the connection')
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response['merged'], response['conflicts']
+
+
+_local = threading.local()
+
+
+def merge(root, head, update, socket_path=DEFAULT_SOCKET):
+    """Merge through the daemon on ``socket_path``.
+
+    Each thread keeps a connection open to the daemon.
+    """
+    clients = _local.__dict__.setdefault('clients', {})
+    client = clients.get(socket_path)
+    if client is None:
+        client = clients[socket_path] = MergeClient(socket_path)
+    return client.merge(root, head, update)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Differential testing of the merge against the plain json-merger one.
+
+Every engine (the arXiv to arXiv merge with each of its optional features)
+has to give the same merged record and conflicts as a plain json-merger
+``Merger`` with the same configuration. Run with::
+
+    python -m inspire_json_merger.differential --synthetic 500
+
+to check the fixtures and random synthetic triples. Mismatching triples
+are shrunk to a minimal reproducer, written to ``--output-dir``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import threading
+
+from json_merger.errors import MergeError
+
+from .api import ArxivToArxivMerger, get_conflicts, merge
+from .benchmark import json_merger_merge, load_fixture
+from .bloom import BloomPrefilter
+from .budget import AuthorMatchBudget
+from .counters import ComparatorCounters
+from .merger_config_arxiv2arxiv import COMPARATORS
+from .synthetic import generate_triple
+
+
+def _engine(**factories):
+    """Merge with an :class:`ArxivToArxivMerger` built with the results of
+    ``factories`` as keyword arguments."""
+    def merge_fn(root, head, update):
+        kwargs = dict((name, factory())
+                      for name, factory in factories.items())
+        merger = ArxivToArxivMerger(root, head, update, **kwargs)
+        conflicts = None
+        try:
+            merger.merge()
+        except MergeError:
+            conflicts = get_conflicts(merger)
+        return merger.merged_root, conflicts
+    return merge_fn
+
+
+reference_merge = json_merger_merge
+
+ENGINES = {
+    'arxiv2arxiv': merge,
+    'bloom_prefilter': _engine(bloom_prefilter=BloomPrefilter),
+    # A high error rate checks that false positives are harmless.
+    'bloom_prefilter_all_fields': _engine(
+        bloom_prefilter=lambda: BloomPrefilter(fields=list(COMPARATORS),
+                                               error_rate=0.3)),
+    'instrumented': _engine(instrument=lambda: True),
+    'comparator_counters': _engine(comparator_counters=ComparatorCounters),
+    # Without limits, the budgeted author matching has to match like the
+    # json-merger one.
+    'author_budget': _engine(author_budget=AuthorMatchBudget),
+    # Checks for cancellation while merging, never set.
+    'cancellable': _engine(cancelled=threading.Event),
+}
+
+
+def find_mismatches(triple, expected=None, engines=None):
+    """Names of the engines not giving the reference result for a triple.
+
+    Args:
+        expected (tuple): the reference merged record and conflicts, if
+            already computed.
+
+        engines (dict): the engines to check, by default all of them.
+    """
+    if expected is None:
+        expected = reference_merge(*triple)
+    engines = ENGINES if engines is None else engines
+    return sorted(name for name, merge_fn in engines.items()
+                  if merge_fn(*triple) != expected)
+
+
+def _iter_containers(obj, path=()):
+    """Yield the path of every list and dict in ``obj``."""
+    if isinstance(obj, (dict, list)):
+        yield path
+        items = obj.items() if isinstance(obj, dict) else enumerate(obj)
+        for key, value in items:
+            for sub_path in _iter_containers(value, path + (key,)):
+                yield sub_path
+
+
+def _get(obj, path):
+    for key in path:
+        obj = obj[key]
+    return obj
+
+
+def _iter_reductions(triple):
+    """Yield smaller variants of a triple, the biggest reductions first."""
+    for field in sorted(set().union(*triple)):
+        yield tuple(dict((k, v) for k, v in version.items() if k != field)
+                    for version in triple)
+
+    for idx, version in enumerate(triple):
+        for path in _iter_containers(version):
+            container = _get(version, path)
+            if isinstance(container, dict):
+                keys = sorted(container)
+                chunks = [[key] for key in keys]
+            else:
+                keys = list(range(len(container)))
+                # Try dropping halves of long lists before single elements.
+                half = len(keys) // 2
+                chunks = ([keys[:half], keys[half:]] if half > 1 else [])
+                chunks.extend([key] for key in keys)
+            for chunk in chunks:
+                reduced = copy.deepcopy(version)
+                target = _get(reduced, path)
+                for key in sorted(chunk, reverse=True):
+                    del target[key]
+                yield triple[:idx] + (reduced,) + triple[idx + 1:]
+
+
+def shrink(triple, fails):
+    """Greedily reduce a triple while ``fails(triple)`` holds."""
+    reduced = True
+    while reduced:
+        reduced = False
+        for candidate in _iter_reductions(triple):
+            if fails(candidate):
+                triple = candidate
+                reduced = True
+                break
+    return triple
+
+
+def iter_cases(fixtures_dir=None, num_synthetic=100, seed=0):
+    """Yield the (name, triple) of the fixtures and of synthetic triples of
+    random sizes and edit rates."""
+    if fixtures_dir:
+        for name in sorted(os.listdir(fixtures_dir)):
+            yield 'fixture:' + name, load_fixture(fixtures_dir, name)
+
+    rng = random.Random(seed)
+    for idx in range(num_synthetic):
+        num_authors = rng.randint(0, 30)
+        num_references = rng.randint(0, 20)
+        edit_rate = rng.choice((0.0, 0.1, 0.3, 0.6))
+        triple_seed = rng.randrange(2 ** 32)
+        yield ('synthetic:%d' % idx, generate_triple(
+            num_authors=num_authors, num_references=num_references,
+            edit_rate=edit_rate, recid=idx, seed=triple_seed))
+
+
+def run_differential(cases, engines=None, log=None):
+    """Check every case, shrinking the mismatching ones.
+
+    Returns:
+        list: dicts with the ``case`` name, the mismatching ``engines`` and
+        the shrunk triple (``reproducer``) of every mismatching case.
+    """
+    failures = []
+    for name, triple in cases:
+        mismatches = find_mismatches(triple, engines=engines)
+        if not mismatches:
+            continue
+        if log:
+            print('%s: %s differ, shrinking' % (name, ', '.join(mismatches)),
+                  file=log)
+        mismatching_engines = dict(
+            (engine, (engines or ENGINES)[engine]) for engine in mismatches)
+        reproducer = shrink(triple, lambda candidate: bool(find_mismatches(
+            candidate, engines=mismatching_engines)))
+        failures.append({
+            'case': name,
+            'engines': mismatches,
+            'reproducer': dict(zip(('root', 'head', 'update'), reproducer)),
+        })
+    return failures
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m inspire_json_merger.differential',
+        description='Check that every merge engine gives the same results '
+                    'as the plain json-merger one.')
+    parser.add_argument('--fixtures-dir', default='tests/fixtures')
+    parser.add_argument('--synthetic', type=int, default=100,
+                        help='number of random synthetic triples')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', action='append', choices=sorted(ENGINES),
+                        help='only check these engines')
+    parser.add_argument('--output-dir', default='differential',
+                        help='where to write the reproducers')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    engines = None
+    if args.engine:
+        engines = dict((name, ENGINES[name]) for name in args.engine)
+    failures = run_differential(
+        iter_cases(args.fixtures_dir, args.synthetic, args.seed), engines,
+        log=sys.stderr)
+    if not failures:
+        return
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    for failure in failures:
+        path = os.path.join(args.output_dir,
+                            failure['case'].replace(':', '-') + '.json')
+        with open(path, 'w') as f:
+            json.dump(failure, f, indent=2, sort_keys=True)
+        print('%s: reproducer written to %s' % (failure['case'], path),
+              file=sys.stderr)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
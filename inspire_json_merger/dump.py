@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Random access to the lines of big dump files of triples.
+
+The dump, an uncompressed JSONL file like the input of
+:class:`~inspire_json_merger.pipeline.MergePipeline`, is memory mapped, and
+the offsets of its lines are indexed once in a sidecar file (the path of
+the dump with an ``.idx`` suffix), itself memory mapped. Any line can then
+be read without going through the ones before it, so that a dump can be
+merged from the middle, or split in shards of about the same size merged by
+different processes::
+
+    python -m inspire_json_merger batch dump.jsonl part-0.jsonl --shard 0/4
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+
+from . import codec
+
+INDEX_SUFFIX = '.idx'
+
+# Magic, size and modification time of the dump, number of lines.
+_INDEX_HEADER = struct.Struct('=8sQQQ')
+_INDEX_MAGIC = b'IJMIDX01'
+
+
+def _dump_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(path, index_path=None):
+    """Index the offsets of the lines of a dump.
+
+    The index holds the offset of every line followed by the size of the
+    dump, and is written atomically.
+
+    Returns:
+        int: the number of lines.
+    """
+    index_path = index_path or path + INDEX_SUFFIX
+    size, mtime = _dump_signature(path)
+    offsets = array.array('Q', [0])
+    if size:
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = data.find(b'\n')
+            while position != -1:
+                offsets.append(position + 1)
+                position = data.find(b'\n', position + 1)
+    if offsets[-1] != size:
+        offsets.append(size)
+    num_lines = len(offsets) - 1
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, size, mtime, num_lines))
+            offsets.tofile(f)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return num_lines
+
+
+class DumpReader(object):
+    """Memory mapped dump file with an index of its lines.
+
+    Lines are numbered from 0 like in the output of the pipeline, blank
+    lines included. The index is built if it is missing or if the dump
+    changed since it was built.
+
+    Args:
+        path (str): the dump.
+
+        index_path (str): the index, by default next to the dump.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        if not self._index_is_fresh():
+            build_index(path, self.index_path)
+        self._data = self._map(path)
+        self._index = self._map(self.index_path)
+        self._offsets = memoryview(self._index)[
+            _INDEX_HEADER.size:].cast('Q')
+
+    def _index_is_fresh(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                header = f.read(_INDEX_HEADER.size)
+        except IOError:
+            return False
+        if len(header) < _INDEX_HEADER.size:
+            return False
+        magic, size, mtime, _ = _INDEX_HEADER.unpack(header)
+        return magic == _INDEX_MAGIC and \
+            (size, mtime) == _dump_signature(self.path)
+
+    @staticmethod
+    def _map(path):
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._offsets.release()
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    @property
+    def size(self):
+        """Size of the dump, in bytes."""
+        return self._offsets[-1]
+
+    def offset(self, index):
+        """Offset of a line, or the size of the dump for ``len(self)``."""
+        return self._offsets[index]
+
+    def line(self, index):
+        """The bytes of a line, with its newline."""
+        if not 0 <= index < len(self):
+            raise IndexError('Line %d is out of range' % index)
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+    def __getitem__(self, index):
+        """The triple of a line, or ``None`` for a blank line."""
+        line = self.line(index)
+        if not line.strip():
+            return None
+        return codec.loads(line)
+
+    def iter_lines(self, start=0, stop=None):
+        """Yield the index and the bytes of the non blank lines of a range."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            line = self.line(index)
+            if line.strip():
+                yield index, line
+
+    def shards(self, num_shards):
+        """Split the lines in ranges of about the same number of bytes.
+
+        Returns:
+            list: the ``(start, stop)`` line ranges, in order.
+        """
+        bounds = [0]
+        for shard in range(1, num_shards):
+            bounds.append(max(bisect.bisect_left(
+                self._offsets, self.size * shard // num_shards, 0,
+                len(self)), bounds[-1]))
+        bounds.append(len(self))
+        return list(zip(bounds, bounds[1:]))
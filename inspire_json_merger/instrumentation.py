@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Per-field instrumentation of merges."""
+
+from __future__ import absolute_import, division, print_function
+
+import time
+
+from json_merger.utils import get_dotted_key_path
+
+from .counters import ComparatorCounters
+from .unifiers import TrivialListUnifier
+
+
+def _is_top_level(key_path):
+    """Whether a key path doesn't go through any list element."""
+    return not any(isinstance(key, int) for key in key_path)
+
+
+class FieldTimer(object):
+    """Records timings and list sizes per field of a merger.
+
+    :meth:`instrument` replaces the list unification and recursive merge
+    methods of a merger instance with timed versions, so merges that are not
+    instrumented don't pay anything.
+
+    The report has, for every configured path (e.g.
+    ``references.reference.authors``), the time spent unifying its lists and
+    merging their elements (which includes the time spent in the nested
+    paths), the number of comparators built (``comparators_built``, one per
+    pair of lists matched), the total and maximum sizes of the root, head
+    and update lists and, for the paths with a configured comparator, the
+    calls made by their comparators (``comparator_calls``, counted in
+    :attr:`comparator_counters` by the comparators of the merger, see
+    :class:`~inspire_json_merger.counters.PathCounters`). The time of each
+    top level field adds up its lists that are not nested in other lists.
+    """
+
+    def __init__(self):
+        self.paths = {}
+        self.fields = {}
+        self.root_merge_time = 0.0
+        self.total_time = None
+        self.comparator_counters = ComparatorCounters()
+
+    def _path_stats(self, key_path):
+        path = get_dotted_key_path(key_path, True)
+        stats = self.paths.get(path)
+        if stats is None:
+            stats = self.paths[path] = {
+                'unify_calls': 0,
+                'unify_time': 0.0,
+                'merge_calls': 0,
+                'merge_time': 0.0,
+                'comparators_built': 0,
+                'list_sizes': {
+                    'root': {'total': 0, 'max': 0},
+                    'head': {'total': 0, 'max': 0},
+                    'update': {'total': 0, 'max': 0},
+                },
+            }
+        return stats
+
+    def _add_field_time(self, key_path, elapsed):
+        if _is_top_level(key_path):
+            field = key_path[0]
+            self.fields[field] = self.fields.get(field, 0.0) + elapsed
+
+    def instrument(self, merger):
+        unify_lists = merger._unify_lists
+        recursive_merge = merger._recursive_merge
+        merge_objects = merger._merge_objects
+
+        def timed_unify_lists(root, head, update, key_path):
+            start = time.perf_counter()
+            unifier = unify_lists(root, head, update, key_path)
+            elapsed = time.perf_counter() - start
+
+            stats = self._path_stats(key_path)
+            stats['unify_calls'] += 1
+            stats['unify_time'] += elapsed
+            if not isinstance(unifier, TrivialListUnifier):
+                # One per pair of root, head and update.
+                stats['comparators_built'] += 3
+            for name, lst in (('root', root), ('head', head),
+                              ('update', update)):
+                sizes = stats['list_sizes'][name]
+                sizes['total'] += len(lst)
+                sizes['max'] = max(sizes['max'], len(lst))
+            self._add_field_time(key_path, elapsed)
+            return unifier
+
+        def timed_recursive_merge(root, head, update, key_path=()):
+            if not key_path:
+                return recursive_merge(root, head, update, key_path)
+            start = time.perf_counter()
+            merged = recursive_merge(root, head, update, key_path)
+            elapsed = time.perf_counter() - start
+
+            # The key path ends with the index of the merged list element.
+            stats = self._path_stats(key_path)
+            stats['merge_calls'] += 1
+            stats['merge_time'] += elapsed
+            self._add_field_time(key_path[:-1], elapsed)
+            return merged
+
+        def timed_merge_objects(root, head, update, key_path):
+            if key_path:
+                return merge_objects(root, head, update, key_path)
+            start = time.perf_counter()
+            merged = merge_objects(root, head, update, key_path)
+            self.root_merge_time += time.perf_counter() - start
+            return merged
+
+        merger._unify_lists = timed_unify_lists
+        merger._recursive_merge = timed_recursive_merge
+        merger._merge_objects = timed_merge_objects
+
+    @property
+    def report(self):
+        counters = self.comparator_counters.paths
+        paths = dict(
+            (path, dict(stats, comparator_calls=counters[path].stats
+                        if path in counters else None))
+            for path, stats in self.paths.items())
+        return {
+            'total_time': self.total_time,
+            'root_merge_time': self.root_merge_time,
+            'fields': dict(self.fields),
+            'paths': paths,
+        }
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Memory profiling of merges with tracemalloc."""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import contextlib
+import inspect
+import os
+import tracemalloc
+
+from json_merger.list_unify import ListUnifier
+from json_merger.merger import Merger
+
+from .cache import NormalizationCache
+from .unifiers import TrivialListUnifier
+
+PHASES = ('input_copy', 'normalization', 'matching', 'output_assembly',
+          'conflict_export')
+
+
+def _source_range(obj):
+    lines, first = inspect.getsourcelines(obj)
+    return (os.path.abspath(inspect.getsourcefile(obj)), first,
+            first + len(lines) - 1)
+
+
+def _get_phase_markers():
+    """The code whose allocations belong to a phase, innermost first."""
+    return [
+        ('normalization', _source_range(NormalizationCache.normalize)),
+        ('matching', _source_range(ListUnifier)),
+        ('matching', _source_range(TrivialListUnifier)),
+        ('input_copy', _source_range(Merger.__init__)),
+    ]
+
+
+class MemoryProfiler(object):
+    """Reports the memory allocated by each phase of a merge.
+
+    For each phase, the report has the peak of the memory traced while in
+    that phase (relative to the start of the merge) and the sites
+    allocating most of the memory of the phase that is still allocated
+    when the matching ends (or, for the conflict export, when the merge
+    ends). The phases are the copy of the inputs made by the merger, the
+    normalization of the list elements, the matching of the lists, the
+    assembly of the merged record and the export of the conflicts.
+
+    Tracing memory slows the merge down a lot, so it is meant for
+    investigating merges, not for production traffic.
+
+    Args:
+        top (int): number of allocation sites to report per phase.
+
+        frames (int): number of frames stored by tracemalloc, which have to
+            be enough to see which phase allocated the memory.
+    """
+
+    def __init__(self, top=10, frames=64):
+        self.top = top
+        self.frames = frames
+        self.report = None
+        self._markers = _get_phase_markers()
+        self._started_tracing = False
+        self._stack = []
+
+    def start(self):
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        self._peaks = dict.fromkeys(PHASES, 0)
+        self._stack = []
+        self._merge_snapshot = None
+        self.report = None
+
+    def _switch(self):
+        """Account the peak since the last switch to the current phase."""
+        if self._stack:
+            phase = self._stack[-1]
+            peak = tracemalloc.get_traced_memory()[1] - self._baseline
+            self._peaks[phase] = max(self._peaks[phase], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._switch()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, contextlib.__file__),
+        ])
+
+    def instrument(self, merger):
+        """Track the phases of an
+        :class:`~inspire_json_merger.api.ArxivToArxivMerger`."""
+        unify_lists = merger._unify_lists
+        cache = merger.normalization_cache
+        normalize = cache.normalize
+        clear = cache.clear
+
+        def profiled_unify_lists(root, head, update, key_path):
+            with self.phase('matching'):
+                return unify_lists(root, head, update, key_path)
+
+        def profiled_normalize(normalizer, obj):
+            with self.phase('normalization'):
+                return normalize(normalizer, obj)
+
+        def profiled_clear():
+            # The cache is cleared when the merge ends, which is when most
+            # of the memory is still allocated.
+            self._merge_snapshot = self._take_snapshot()
+            clear()
+
+        merger._unify_lists = profiled_unify_lists
+        cache.normalize = profiled_normalize
+        cache.clear = profiled_clear
+
+    def _classify(self, traceback):
+        for frame in reversed(traceback):
+            filename = os.path.abspath(frame.filename)
+            for phase, (marker_file, first, last) in self._markers:
+                if filename == marker_file and first <= frame.lineno <= last:
+                    return phase
+        return 'output_assembly'
+
+    def _top_sites(self, sizes):
+        return [
+            {'site': '%s:%d' % site, 'size': size, 'count': count}
+            for site, (size, count) in sorted(
+                sizes.items(), key=lambda item: -item[1][0])[:self.top]
+        ]
+
+    def stop(self):
+        """Stop tracing and build the report."""
+        final_snapshot = self._take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        sites = dict((phase, collections.defaultdict(lambda: [0, 0]))
+                     for phase in PHASES)
+        if self._merge_snapshot is not None:
+            for trace in self._merge_snapshot.traces:
+                frame = trace.traceback[-1]
+                phase_sites = sites[self._classify(trace.traceback)]
+                phase_sites[(frame.filename, frame.lineno)][0] += trace.size
+                phase_sites[(frame.filename, frame.lineno)][1] += 1
+            for stat in final_snapshot.compare_to(self._merge_snapshot,
+                                                  'lineno'):
+                if stat.size_diff > 0:
+                    frame = stat.traceback[-1]
+                    sites['conflict_export'][(frame.filename, frame.lineno)] \
+                        = [stat.size_diff, stat.count_diff]
+
+        self.report = {
+            'peak': max(self._peaks.values()),
+            'phases': dict(
+                (phase, {
+                    'peak': self._peaks[phase],
+                    'top_sites': self._top_sites(sites[phase]),
+                })
+                for phase in PHASES
+            ),
+        }
+        return self.report
@@ -78,6 +78,8 @@ class AuthorComparator(DistanceFunctionComparator):
             AuthorNameNormalizer(author_tokenize, 1),
             AuthorNameNormalizer(author_tokenize, 1, True)
     ]
+    # Cheap matching used when the author matching budget is exhausted.
+    fallback_norm_functions = norm_functions[:3]
 
 
 def get_pk_comparator(primary_key_fields, normalization_functions=None):
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Metrics of the merges of a worker."""
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import collections
+import os
+import tempfile
+import threading
+import time
+
+from json_merger.utils import get_dotted_key_path
+
+
+def _escape_label_value(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape_label_value(str(value)))
+        for name, value in sorted(labels.items()))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MergeMetrics(object):
+    """Metrics of the merges observed by :meth:`observe`.
+
+    Keeps a histogram of the merge latencies, the merge rate over the last
+    ``rate_window`` seconds, the conflicts by type and field path and the
+    counters of the caches, fast paths and author matching budget of the
+    merges, and the memory peaks of the merges profiled with a
+    :class:`~inspire_json_merger.memory.MemoryProfiler`. They can be
+    exported in the Prometheus text format (see :meth:`to_prometheus` and
+    :class:`PrometheusFileExporter`) or handed to the ``exporters``,
+    callables receiving the metrics after every merge.
+
+    Args:
+        exporters (list): callables called with the instance after every
+            observed merge.
+
+        rate_window (float): seconds over which the merge rate is computed.
+
+        namespace (str): prefix of the exported metric names.
+    """
+
+    #: Upper bounds in seconds of the latency histogram buckets.
+    latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                       5.0, 10.0, 30.0)
+
+    def __init__(self, exporters=None, rate_window=60.0,
+                 namespace='inspire_json_merger'):
+        self.exporters = list(exporters or [])
+        self.rate_window = rate_window
+        self.namespace = namespace
+        self._lock = threading.Lock()
+
+        self.merges = 0
+        self.merges_with_conflicts = 0
+        self.latency_sum = 0.0
+        self.latency_counts = [0] * (len(self.latency_buckets) + 1)
+        self.conflicts = collections.Counter()
+        self.normalization_cache = collections.Counter()
+        self.token_table = collections.Counter()
+        self.fast_paths = collections.Counter()
+        self.author_budget_exhausted = 0
+        self.memory_peaks = {}
+        self.max_memory_peaks = {}
+        self._recent_merges = collections.deque()
+
+    def observe(self, merger, elapsed):
+        """Account for a merge done by ``merger`` in ``elapsed`` seconds.
+
+        Args:
+            merger (:class:`~inspire_json_merger.api.ArxivToArxivMerger`):
+                the merger, once its ``merge`` returned or raised.
+
+            elapsed (float): duration of the merge.
+        """
+        now = time.time()
+        with self._lock:
+            self.merges += 1
+            self.latency_sum += elapsed
+            self.latency_counts[
+                bisect.bisect_left(self.latency_buckets, elapsed)] += 1
+            self._recent_merges.append(now)
+            self._expire_recent_merges(now)
+
+            if merger.conflicts:
+                self.merges_with_conflicts += 1
+            for conflict in merger.conflicts:
+                path = get_dotted_key_path(conflict.path, True)
+                self.conflicts[(conflict.conflict_type, path)] += 1
+
+            if merger.normalization_stats:
+                self.normalization_cache['hit'] += \
+                    merger.normalization_stats['hits']
+                self.normalization_cache['miss'] += \
+                    merger.normalization_stats['misses']
+            if merger.token_stats:
+                self.token_table['hit'] += merger.token_stats['hits']
+                self.token_table['miss'] += merger.token_stats['misses']
+            self.fast_paths.update(merger.fast_path_hits)
+            if merger.author_budget_exhausted:
+                self.author_budget_exhausted += 1
+            if merger.memory_report:
+                for phase, report in merger.memory_report['phases'].items():
+                    self.memory_peaks[phase] = report['peak']
+                    self.max_memory_peaks[phase] = max(
+                        self.max_memory_peaks.get(phase, 0), report['peak'])
+
+        for exporter in self.exporters:
+            exporter(self)
+
+    def _expire_recent_merges(self, now):
+        while (self._recent_merges and
+               self._recent_merges[0] < now - self.rate_window):
+            self._recent_merges.popleft()
+
+    @property
+    def merges_per_second(self):
+        """Merge rate over the last ``rate_window`` seconds."""
+        with self._lock:
+            self._expire_recent_merges(time.time())
+            return len(self._recent_merges) / self.rate_window
+
+    @property
+    def stats(self):
+        """Dict with the current value of every metric."""
+        merges_per_second = self.merges_per_second
+        with self._lock:
+            return {
+                'merges': self.merges,
+                'merges_with_conflicts': self.merges_with_conflicts,
+                'merges_per_second': merges_per_second,
+                'latency': {
+                    'sum': self.latency_sum,
+                    'buckets': dict(zip(
+                        self.latency_buckets + (float('inf'),),
+                        self.latency_counts)),
+                },
+                'conflicts': dict(
+                    ('%s:%s' % key, count)
+                    for key, count in self.conflicts.items()),
+                'normalization_cache': dict(self.normalization_cache),
+                'token_table': dict(self.token_table),
+                'fast_paths': dict(self.fast_paths),
+                'author_budget_exhausted': self.author_budget_exhausted,
+                'memory_peaks': dict(self.memory_peaks),
+                'max_memory_peaks': dict(self.max_memory_peaks),
+            }
+
+    def _samples(self):
+        """Yield the ``(name, type, help, samples)`` of every metric."""
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.latency_buckets + (float('inf'),),
+                                self.latency_counts):
+            cumulative += count
+            buckets.append(('_bucket', {'le': _format_value(bound)},
+                            cumulative))
+        buckets.append(('_sum', {}, self.latency_sum))
+        buckets.append(('_count', {}, self.merges))
+        yield ('merge_duration_seconds', 'histogram', 'Duration of merges.',
+               buckets)
+
+        yield ('merges_total', 'counter', 'Number of merges.',
+               [('', {}, self.merges)])
+        yield ('merges_with_conflicts_total', 'counter',
+               'Number of merges raising conflicts.',
+               [('', {}, self.merges_with_conflicts)])
+        yield ('merges_per_second', 'gauge',
+               'Merge rate over the last %g seconds.' % self.rate_window,
+               [('', {}, len(self._recent_merges) / self.rate_window)])
+        yield ('conflicts_total', 'counter',
+               'Number of conflicts by type and field path.',
+               [('', {'type': conflict_type, 'path': path}, count)
+                for (conflict_type, path), count
+                in sorted(self.conflicts.items())])
+        yield ('normalization_cache_total', 'counter',
+               'Lookups in the per-merge normalization cache.',
+               [('', {'result': result}, count)
+                for result, count in sorted(self.normalization_cache.items())])
+        yield ('token_table_total', 'counter',
+               'Lookups in the per-merge author name token table.',
+               [('', {'result': result}, count)
+                for result, count in sorted(self.token_table.items())])
+        yield ('fast_path_total', 'counter',
+               'Lists unified without pairwise matching.',
+               [('', {'kind': kind}, count)
+                for kind, count in sorted(self.fast_paths.items())])
+        yield ('author_budget_exhausted_total', 'counter',
+               'Merges whose author matching budget was exhausted.',
+               [('', {}, self.author_budget_exhausted)])
+        yield ('memory_peak_bytes', 'gauge',
+               'Peak traced memory by phase of the last profiled merge.',
+               [('', {'phase': phase}, peak)
+                for phase, peak in sorted(self.memory_peaks.items())])
+        yield ('memory_max_peak_bytes', 'gauge',
+               'Highest peak traced memory by phase of the profiled merges.',
+               [('', {'phase': phase}, peak)
+                for phase, peak in sorted(self.max_memory_peaks.items())])
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            self._expire_recent_merges(time.time())
+            for name, metric_type, help_text, samples in self._samples():
+                name = '%s_%s' % (self.namespace, name)
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s %s' % (name, metric_type))
+                for suffix, labels, value in samples:
+                    lines.append('%s%s%s %s' % (name, suffix,
+                                                _format_labels(labels),
+                                                _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Atomically write the metrics in the Prometheus text format.
+
+        The file can be collected by the textfile collector of the node
+        exporter, or served by any sidecar, also running as other users.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            # mkstemp creates the file readable only by its owner.
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class PrometheusFileExporter(object):
+    """Exporter writing the metrics to a file at most every ``interval``.
+
+    Args:
+        path (str): the file to write.
+
+        interval (float): minimum number of seconds between two writes.
+    """
+
+    def __init__(self, path, interval=10.0):
+        self.path = path
+        self.interval = interval
+        self._last_write = None
+
+    def __call__(self, metrics):
+        now = time.time()
+        if self._last_write is not None and \
+                now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        metrics.write_prometheus(self.path)
@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Streaming pipeline merging big files of triples.
+
+A reader stage parses the input, a pool of workers merges the triples and a
+writer stage writes the results, in the order of the input or as soon as
+they are ready. Stages are connected by bounded queues, so that memory
+stays flat however big the input is. Among the triples waiting to be
+merged, the most expensive ones (see
+:func:`~inspire_json_merger.scheduler.estimate_cost`) are merged first.
+
+The input is a JSONL file (optionally compressed with gzip or, if the
+``zstandard`` package is installed, zstd) with one ``{"root": ...,
+"head": ..., "update": ...}`` object per line. Every output line has the
+``index`` of the input line and either the ``merged`` record and its
+``conflicts`` or an ``error``, if the line could not be parsed or merged. A range of the lines of an uncompressed
+input can be merged alone (see :mod:`~inspire_json_merger.dump`), and runs
+writing an uncompressed output can be resumed from a checkpoint (see
+:mod:`~inspire_json_merger.checkpoint`).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import gzip
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from . import codec, shm
+from .dump import DumpReader
+from .api import merge
+from .scheduler import estimate_cost
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_END = object()
+
+
+def is_compressed(path):
+    return path.endswith(('.gz', '.zst'))
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 'b')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read and write '
+                               'zstd compressed files')
+        raw = open(path, mode + 'b')
+        if mode == 'r':
+            return io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(raw))
+        return zstandard.ZstdCompressor().stream_writer(raw)
+    return open(path, mode + 'b')
+
+
+def _skip(f, size):
+    if f.seekable():
+        f.seek(size)
+        return
+    while size:
+        chunk = f.read(min(size, 1024 * 1024))
+        if not chunk:
+            break
+        size -= len(chunk)
+
+
+def open_input(path):
+    """Open a possibly compressed file for reading bytes."""
+    return _open(path, 'r')
+
+
+def open_output(path):
+    """Open a possibly compressed file for writing bytes."""
+    return _open(path, 'w')
+
+
+def merge_triple(triple):
+    """Merge a triple, also returning the duration of the merge."""
+    start = time.perf_counter()
+    merged, conflicts = merge(triple['root'], triple['head'],
+                              triple['update'])
+    return time.perf_counter() - start, merged, conflicts
+
+
+class StageStats(object):
+    """Items processed and time spent by a stage."""
+
+    def __init__(self, parallelism=1):
+        self.parallelism = parallelism
+        self.items = 0
+        self.busy_time = 0.0
+
+    def stats(self, wall_time):
+        return {
+            'items': self.items,
+            'busy_time': self.busy_time,
+            'throughput': self.items / self.busy_time * self.parallelism
+            if self.busy_time else 0.0,
+            # Close to 1 for the stage slowing the pipeline down.
+            'utilization': self.busy_time / (wall_time * self.parallelism)
+            if wall_time else 0.0,
+        }
+
+
+class MonitoredQueue(queue.Queue):
+    """Queue keeping track of its maximum depth."""
+
+    def __init__(self, maxsize=0):
+        queue.Queue.__init__(self, maxsize)
+        self.max_depth = 0
+
+    def _put(self, item):
+        queue.Queue._put(self, item)
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+    @property
+    def stats(self):
+        return {
+            'depth': self.qsize(),
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+        }
+
+
+class MergePipeline(object):
+    """Merges the triples of ``input_path`` into ``output_path``.
+
+    Args:
+        workers (int): number of merging processes, by default the number
+            of CPUs.
+
+        ordered (bool): whether the results are written in the order of the
+            input.
+
+        queue_size (int): maximum number of parsed triples waiting to be
+            merged.
+
+        max_in_flight (int): maximum number of triples being merged or
+            waiting to be written, by default twice the number of workers.
+
+        window (int): maximum number of parsed triples handed to the
+            workers at once, the most expensive first, by default
+            ``max_in_flight`` (which it can't exceed). With 1, they are
+            handed over in the order of the input.
+
+        cost_function: callable estimating the cost of merging a triple.
+
+        executor (:class:`concurrent.futures.Executor`): where to merge the
+            triples (with ``workers`` workers), instead of a new pool of
+            processes.
+
+        shared_memory (bool): whether to pass the triples to the workers,
+            and the results back, through shared memory (see
+            :mod:`~inspire_json_merger.shm`) rather than pickling them
+            through a pipe, which is cheaper for big records.
+
+        shard (tuple): the ``(start, stop)`` range of the lines to merge,
+            read through a :class:`~inspire_json_merger.dump.DumpReader`,
+            instead of the whole input.
+
+        checkpoint (:class:`~inspire_json_merger.checkpoint.Checkpoint`):
+            where to save the progress of the run, which resumes from it if
+            it was already saved. Needs an ordered run and an uncompressed
+            output.
+    """
+
+    def __init__(self, input_path, output_path, workers=None, ordered=True,
+                 queue_size=1000, max_in_flight=None, executor=None,
+                 shared_memory=False, shard=None, checkpoint=None,
+                 window=None, cost_function=estimate_cost):
+        if checkpoint is not None and (not ordered or
+                                       is_compressed(output_path)):
+            raise ValueError('Checkpoints need an ordered run and an '
+                             'uncompressed output')
+        self.input_path = input_path
+        self.shard = shard
+        self.checkpoint = checkpoint
+        # The saved state of the run resumed.
+        self._resumed = None
+        self.output_path = output_path
+        self.ordered = ordered
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self._own_executor = executor is None
+        if executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        # The ordered writer waits for the first triple of a window while
+        # the ones submitted before it hold their slot, so a window bigger
+        # than max_in_flight could block the pipeline.
+        self.window = window or self.max_in_flight
+        if self.window > self.max_in_flight:
+            raise ValueError('The window can not be bigger than '
+                             'max_in_flight')
+        self.cost_function = cost_function
+        self.shared_memory = shared_memory
+        # Segments holding the triples being merged, by input index.
+        self._segments = {}
+
+        self.parsed = MonitoredQueue(queue_size)
+        self.merged = MonitoredQueue()
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        self._stop = threading.Event()
+        self._errors = []
+        self.reader_stats = StageStats()
+        self.merge_stats = StageStats(self.workers)
+        self.writer_stats = StageStats()
+        self.merge_errors = 0
+        self.wall_time = None
+
+    def _put(self, q, item):
+        """Put an item in a queue, unless the pipeline is stopping."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _run_stage(self, stage):
+        try:
+            stage()
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _iter_lines(self):
+        """Yield the index, the offset of the end and the bytes of lines."""
+        resumed = self._resumed
+        if self.shard is None:
+            index, offset = 0, 0
+            if resumed is not None:
+                index, offset = resumed['line'], resumed['input_offset']
+            with open_input(self.input_path) as f:
+                _skip(f, offset)
+                for index, line in enumerate(f, index):
+                    offset += len(line)
+                    yield index, offset, line
+        else:
+            start, stop = self.shard
+            if resumed is not None:
+                start = resumed['line']
+            with DumpReader(self.input_path) as reader:
+                for index, line in reader.iter_lines(start, stop):
+                    yield index, reader.offset(index + 1), line
+
+    def _read(self):
+        stats = self.reader_stats
+        lines = self._iter_lines()
+        try:
+            start = time.perf_counter()
+            for index, offset, line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    triple = codec.loads(line)
+                except ValueError as e:
+                    # Written as the error of this line, like the ones of
+                    # the merges.
+                    triple = e
+                stats.items += 1
+                stats.busy_time += time.perf_counter() - start
+                if not self._put(self.parsed, (index, offset, triple)):
+                    return
+                start = time.perf_counter()
+        finally:
+            lines.close()
+        self._put(self.parsed, _END)
+
+    def _submit(self, index, triple):
+        if isinstance(triple, Exception):
+            future = Future()
+            future.set_exception(triple)
+            return future
+        if not self.shared_memory:
+            return self.executor.submit(merge_triple, triple)
+        segment, handle = shm.put(triple)
+        self._segments[index] = segment
+        return self.executor.submit(shm.call_shared, merge_triple, handle)
+
+    def _result(self, index, future):
+        if not self.shared_memory:
+            return future.result()
+        try:
+            handle = future.result()
+        finally:
+            # Lines that could not be parsed have no segment.
+            segment = self._segments.pop(index, None)
+            if segment is not None:
+                shm.free(segment)
+        return shm.get(handle, unlink=True)
+
+    def _free_segments(self):
+        for segment in self._segments.values():
+            shm.free(segment)
+        self._segments.clear()
+        # Results merged but never written.
+        for index, _, future in list(self.merged.queue):
+            if (index is not _END and future.done() and
+                    not future.cancelled() and future.exception() is None):
+                shm.get(future.result(), unlink=True)
+
+    def _acquire_slot(self):
+        """Wait for a slot in flight, unless the pipeline is stopping."""
+        while not self._in_flight.acquire(timeout=0.1):
+            if self._stop.is_set():
+                return False
+        return True
+
+    def _next_window(self):
+        """Up to ``window`` parsed items, only waiting for the first one.
+
+        Returns:
+            tuple: the items and whether the input ended.
+        """
+        items = []
+        item = self._get(self.parsed)
+        while item is not _END:
+            items.append(item)
+            if len(items) == self.window:
+                break
+            try:
+                item = self.parsed.get_nowait()
+            except queue.Empty:
+                break
+        return items, item is _END
+
+    def _cost(self, triple):
+        if isinstance(triple, Exception):
+            return 0
+        return self.cost_function(triple)
+
+    def _dispatch(self):
+        submitted = 0
+        ended = False
+        while not ended:
+            window, ended = self._next_window()
+            # Idle workers take the next triple, so starting with the most
+            # expensive ones keeps them from ending up alone on a worker
+            # while the others have nothing left to do.
+            window.sort(key=lambda item: -self._cost(item[2]))
+            futures = []
+            for index, offset, triple in window:
+                if not self._acquire_slot():
+                    break
+                future = self._submit(index, triple)
+                submitted += 1
+                if self.ordered:
+                    futures.append((index, offset, future))
+                else:
+                    future.add_done_callback(
+                        lambda future, index=index, offset=offset:
+                        self.merged.put((index, offset, future)))
+            # The ordered writer takes them in the order of the input.
+            futures.sort(key=lambda item: item[0])
+            for item in futures:
+                self.merged.put(item)
+            if self._stop.is_set():
+                return
+        self.merged.put((_END, None, submitted))
+
+    def _open_output(self):
+        if self._resumed is None:
+            return open_output(self.output_path)
+        output_offset = self._resumed['output_offset']
+        f = open(self.output_path, 'r+b')
+        if os.fstat(f.fileno()).st_size < output_offset:
+            f.close()
+            raise ValueError('%s is shorter than in the checkpoint' %
+                             self.output_path)
+        f.truncate(output_offset)
+        f.seek(output_offset)
+        return f
+
+    def _save_checkpoint(self, f, index, offset):
+        f.flush()
+        os.fsync(f.fileno())
+        self.checkpoint.save({
+            'input_path': self.input_path,
+            'output_path': self.output_path,
+            'shard': self.shard and list(self.shard),
+            'line': index + 1,
+            'input_offset': offset,
+            'output_offset': f.tell(),
+        })
+
+    def _resume(self):
+        state = self.checkpoint.load()
+        if state is None:
+            return
+        if (state['input_path'], state['output_path'], state['shard']) != \
+                (self.input_path, self.output_path,
+                 self.shard and list(self.shard)):
+            raise ValueError('%s is the checkpoint of another run' %
+                             self.checkpoint.path)
+        self._resumed = state
+
+    def _write(self):
+        stats = self.writer_stats
+        written = 0
+        total = None
+        last_line = None
+        with self._open_output() as f:
+            while total is None or written < total:
+                item = self._get(self.merged)
+                if item is _END:
+                    return
+                index, offset, future = item
+                if index is _END:
+                    total = future
+                    continue
+                try:
+                    elapsed, merged, conflicts = self._result(index, future)
+                except Exception as e:
+                    self.merge_errors += 1
+                    result = {'index': index,
+                              'error': '%s: %s' % (type(e).__name__, e)}
+                else:
+                    self.merge_stats.items += 1
+                    self.merge_stats.busy_time += elapsed
+                    result = {'index': index, 'merged': merged,
+                              'conflicts': conflicts}
+                self._in_flight.release()
+                start = time.perf_counter()
+                f.write(codec.dumpb(result) + b'\n')
+                stats.items += 1
+                stats.busy_time += time.perf_counter() - start
+                written += 1
+                last_line = index, offset
+                if self.checkpoint is not None and \
+                        written % self.checkpoint.interval == 0:
+                    self._save_checkpoint(f, *last_line)
+            if self.checkpoint is not None and last_line is not None:
+                self._save_checkpoint(f, *last_line)
+
+    def run(self):
+        """Run the pipeline until the whole input is merged.
+
+        Returns:
+            dict: the :attr:`stats` of the run.
+        """
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._run_stage, args=(stage,))
+                   for stage in (self._read, self._dispatch, self._write)]
+        try:
+            if self.checkpoint is not None:
+                self._resume()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            if self._own_executor:
+                self.executor.shutdown(cancel_futures=True)
+            if self.shared_memory:
+                self._free_segments()
+            self.wall_time = time.perf_counter() - start
+        if self._errors:
+            raise self._errors[0]
+        return self.stats
+
+    @property
+    def stats(self):
+        """Throughput of the stages and depth of the queues."""
+        wall_time = self.wall_time or 0.0
+        return {
+            'wall_time': wall_time,
+            'merge_errors': self.merge_errors,
+            'resumed_from': self._resumed and self._resumed['line'],
+            'checkpoints': self.checkpoint and self.checkpoint.saved,
+            'reader': self.reader_stats.stats(wall_time),
+            'merge': self.merge_stats.stats(wall_time),
+            'writer': self.writer_stats.stats(wall_time),
+            'queues': {
+                'parsed': self.parsed.stats,
+                'merged': self.merged.stats,
+            },
+        }
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Profiling of the arXiv to arXiv merge.
+
+Merges are profiled with cProfile, and the time is grouped by the callables
+of the configuration (e.g. ``author_tokenize`` or ``NewIDNormalizer``),
+with the rest grouped by module. A sampling profiler collects the stacks of
+the merging thread in the collapsed format read by flame graph tools.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import cProfile
+import inspect
+import os
+import pstats
+import sys
+import threading
+
+import json_merger
+from json_merger.comparator import PrimaryKeyComparator
+from json_merger.contrib.inspirehep.author_util import (
+    AuthorNameDistanceCalculator,
+    AuthorNameNormalizer,
+)
+
+from . import merger_config_arxiv2arxiv
+from .api import merge
+from .comparators import (
+    BloomPrefilterComparatorMixin,
+    CachedPrimaryKeyComparatorMixin,
+)
+
+PK_COMPARATORS_GROUP = 'get_pk_comparator comparators'
+
+
+def _source_range(obj):
+    lines, first = inspect.getsourcelines(obj)
+    return (os.path.abspath(inspect.getsourcefile(obj)), first,
+            first + len(lines) - 1)
+
+
+def _get_callable_groups():
+    """The source ranges of the callables reported on their own."""
+    groups = []
+    config_file = os.path.abspath(
+        inspect.getsourcefile(merger_config_arxiv2arxiv))
+    for name, obj in vars(merger_config_arxiv2arxiv).items():
+        if ((inspect.isfunction(obj) or inspect.isclass(obj)) and
+                os.path.abspath(inspect.getsourcefile(obj)) == config_file):
+            groups.append((name, _source_range(obj)))
+    for cls in (AuthorNameDistanceCalculator, AuthorNameNormalizer):
+        groups.append((cls.__name__, _source_range(cls)))
+    # The classes built by get_pk_comparator only hold configuration, the
+    # comparing happens in their bases.
+    for cls in (PrimaryKeyComparator, CachedPrimaryKeyComparatorMixin,
+                BloomPrefilterComparatorMixin):
+        groups.append((PK_COMPARATORS_GROUP, _source_range(cls)))
+    return groups
+
+
+class FunctionGrouper(object):
+    """Maps the functions of a profile to the group they are reported in."""
+
+    package_dirs = (
+        ('json_merger', os.path.dirname(os.path.abspath(
+            json_merger.__file__))),
+        ('inspire_json_merger', os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    def __init__(self):
+        self.callable_groups = _get_callable_groups()
+
+    def __call__(self, func):
+        filename, lineno, name = func
+        if name == 'scan_author_string_for_phrases':
+            return name
+        if filename == '~':
+            return '<builtins>'
+        filename = os.path.abspath(filename)
+        for group, (group_file, first, last) in self.callable_groups:
+            if filename == group_file and first <= lineno <= last:
+                return group
+        for package, directory in self.package_dirs:
+            if filename.startswith(directory + os.sep):
+                module = os.path.relpath(filename, directory)[:-len('.py')]
+                return '.'.join([package] + module.split(os.sep))
+        # Other installed packages by distribution, the standard library by
+        # module.
+        parts = filename.split(os.sep)
+        for packages_dir in ('site-packages', 'dist-packages'):
+            if packages_dir in parts:
+                index = len(parts) - 1 - parts[::-1].index(packages_dir)
+                if index + 1 < len(parts):
+                    return parts[index + 1].split('.')[0]
+        return os.path.splitext(os.path.basename(filename))[0]
+
+
+def group_stats(stats, grouper=None):
+    """Aggregate a :class:`pstats.Stats` by group.
+
+    Returns:
+        list: dicts with the ``group`` name, its number of ``calls``, the
+        time spent in the functions of the group (``self_time``) and in
+        them and what they called (``inclusive_time``, not counting calls
+        within the group twice), ordered by decreasing ``self_time``.
+    """
+    grouper = grouper or FunctionGrouper()
+    groups = {}
+    func_groups = dict((func, grouper(func)) for func in stats.stats)
+    for func, (_, calls, self_time, _, callers) in stats.stats.items():
+        group = func_groups[func]
+        row = groups.setdefault(group, {
+            'group': group,
+            'calls': 0,
+            'self_time': 0.0,
+            'inclusive_time': 0.0,
+        })
+        row['calls'] += calls
+        row['self_time'] += self_time
+        for caller, caller_stats in callers.items():
+            if func_groups.get(caller) != group:
+                row['inclusive_time'] += caller_stats[3]
+        if not callers:
+            row['inclusive_time'] += stats.stats[func][3]
+    return sorted(groups.values(), key=lambda row: -row['self_time'])
+
+
+def _frame_label(frame):
+    return '%s:%s' % (frame.f_globals.get('__name__', '?'),
+                      frame.f_code.co_name)
+
+
+class StackSampler(object):
+    """Samples the stack of a thread every ``interval`` seconds.
+
+    Use it as a context manager around the code to profile, which has to
+    run in the thread that created the sampler.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.thread_id = threading.current_thread().ident
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        # The sampling thread has to get the GIL back quickly enough.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def collapsed(self):
+        """The samples in the collapsed stack format, one stack per line."""
+        return ['%s %d' % (';'.join(stack), count)
+                for stack, count in sorted(self.samples.items())]
+
+
+def profile_merge(triple, repeat=5, sample_interval=0.001):
+    """Profile ``repeat`` merges of a triple with both profilers.
+
+    The profilers are run one after the other, so that the sampled stacks
+    are not slowed down by cProfile.
+
+    Returns:
+        tuple: the :class:`pstats.Stats` of the cProfile runs and the
+        :class:`StackSampler` of the sampled runs.
+    """
+    profiler = cProfile.Profile()
+    for _ in range(repeat):
+        profiler.runcall(merge, *triple)
+    stats = pstats.Stats(profiler)
+
+    with StackSampler(sample_interval) as sampler:
+        for _ in range(repeat):
+            merge(*triple)
+    return stats, sampler
+
+
+def format_groups(rows, total_time, top=20):
+    """Render the first ``top`` rows of :func:`group_stats` as a table."""
+    lines = ['%-45s %10s %10s %7s %10s' % ('group', 'calls', 'self (s)',
+                                          'self %', 'incl. (s)')]
+    for row in rows[:top]:
+        lines.append('%-45s %10d %10.3f %6.1f%% %10.3f' % (
+            row['group'], row['calls'], row['self_time'],
+            100.0 * row['self_time'] / total_time if total_time else 0.0,
+            row['inclusive_time']))
+    return '\n'.join(lines)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Replay of logged merges to measure throughput.
+
+The log is a JSONL file with one ``{"root": ..., "head": ..., "update":
+...}`` object per line. Run with::
+
+    python -m inspire_json_merger.replay merges.jsonl --workers 1 4 8
+
+With ``--check-determinism`` every worker count is run ``--runs`` times,
+each run in a new interpreter with its own ``PYTHONHASHSEED`` so that the
+iteration order of sets and dicts of strings changes between runs, and the
+command fails if any merged record or conflict list differs between them.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import codec
+from .api import merge
+from .benchmark import percentile
+
+
+def read_log(path):
+    """The non empty lines of a log of merges."""
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+def merge_line(line):
+    """Merge the triple of a log line.
+
+    Returns:
+        tuple: the duration of the merge and a digest of its result.
+    """
+    triple = codec.loads(line)
+    start = time.perf_counter()
+    merged, conflicts = merge(triple['root'], triple['head'],
+                              triple['update'])
+    elapsed = time.perf_counter() - start
+    if conflicts is not None:
+        # json-merger collects the conflicts in a set, their order depends
+        # on the hash seed.
+        conflicts = sorted(conflicts, key=lambda conflict: codec.dumps(
+            conflict, sort_keys=True))
+    result = codec.dumpb([merged, conflicts], sort_keys=True)
+    return elapsed, hashlib.sha1(result).hexdigest()
+
+
+def _cpu_time():
+    times = os.times()
+    return (times.user + times.system + times.children_user +
+            times.children_system)
+
+
+def run_replay(lines, workers=1, chunksize=1):
+    """Merge all the lines of a log with ``workers`` processes.
+
+    With one worker the merges run in the current process.
+
+    Returns:
+        tuple: the stats of the run and the digests of the results, in the
+        order of the lines.
+    """
+    start_cpu = _cpu_time()
+    start = time.perf_counter()
+    if workers == 1:
+        results = [merge_line(line) for line in lines]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(merge_line, lines,
+                                        chunksize=chunksize))
+    wall_time = time.perf_counter() - start
+    # Children are only accounted once they are waited for, which the
+    # executor does when shutting down.
+    cpu_time = _cpu_time() - start_cpu
+
+    latencies = [elapsed for elapsed, _ in results]
+    stats = {
+        'workers': workers,
+        'cpus': os.cpu_count(),
+        'merges': len(lines),
+        'wall_time': wall_time,
+        'throughput': len(lines) / wall_time if wall_time else 0.0,
+        'cpu_time': cpu_time,
+        'cpu_utilization': cpu_time / (wall_time * workers)
+        if wall_time else 0.0,
+    }
+    if latencies:
+        stats['latency'] = {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies),
+        }
+    return stats, [digest for _, digest in results]
+
+
+def run_isolated(log, workers=1, chunksize=1, hash_seed=0):
+    """Run :func:`run_replay` on a log in a new interpreter.
+
+    Args:
+        hash_seed (int): the ``PYTHONHASHSEED`` of the interpreter and of
+            its worker processes.
+
+    Returns:
+        tuple: the stats of the run and the digests of the results, in the
+        order of the lines.
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in (package_dir, env.get('PYTHONPATH')) if path)
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'inspire_json_merger.replay', log,
+         '--workers', str(workers), '--chunksize', str(chunksize),
+         '--isolated-run'], env=env)
+    result = json.loads(output.decode('utf-8'))
+    return result['stats'], result['digests']
+
+
+def find_differences(reference, digests):
+    """Indices of the lines whose results differ."""
+    return [idx for idx, (expected, digest)
+            in enumerate(zip(reference, digests)) if expected != digest]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m inspire_json_merger.replay',
+        description='Replay a log of merges to measure the throughput.')
+    parser.add_argument('log', help='JSONL file of root, head and update '
+                                    'triples')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='worker counts to run the log with')
+    parser.add_argument('--chunksize', type=int, default=1,
+                        help='lines sent to a worker at once')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='runs per worker count')
+    parser.add_argument('--check-determinism', action='store_true',
+                        help='fail if the results differ between runs or '
+                             'worker counts (at least 2 runs are done)')
+    parser.add_argument('--output', help='write the stats to this file')
+    # Used by run_isolated: one run, stats and digests written to stdout.
+    parser.add_argument('--isolated-run', action='store_true',
+                        help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if args.isolated_run:
+        stats, digests = run_replay(read_log(args.log), args.workers[0],
+                                    args.chunksize)
+        json.dump({'stats': stats, 'digests': digests}, sys.stdout)
+        return
+
+    lines = read_log(args.log)
+    runs = max(args.runs, 2) if args.check_determinism else args.runs
+
+    all_stats = []
+    reference = None
+    differences = 0
+    hash_seed = 0
+    for workers in args.workers:
+        for run in range(runs):
+            if args.check_determinism:
+                hash_seed += 1
+                stats, digests = run_isolated(args.log, workers,
+                                              args.chunksize, hash_seed)
+                stats['hash_seed'] = hash_seed
+            else:
+                stats, digests = run_replay(lines, workers, args.chunksize)
+            stats['run'] = run + 1
+            all_stats.append(stats)
+            print('%d workers, run %d: %.1f merges/s, p99 %.3fs, '
+                  'cpu %.0f%%' % (workers, run + 1, stats['throughput'],
+                                  stats.get('latency', {}).get('p99', 0.0),
+                                  100 * stats['cpu_utilization']),
+                  file=sys.stderr)
+            if not args.check_determinism:
+                continue
+            if reference is None:
+                reference = digests
+                continue
+            for idx in find_differences(reference, digests):
+                differences += 1
+                print('line %d: result differs with %d workers, run %d '
+                      '(PYTHONHASHSEED=%d)' % (idx + 1, workers, run + 1,
+                                               hash_seed), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(all_stats, f, indent=2, sort_keys=True)
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
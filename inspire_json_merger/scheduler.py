@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Size-aware scheduling of batches of merges.
+
+The cost of a merge grows with the square of the size of its lists, so
+batches mixing small papers with big collaboration papers are badly
+balanced by splitting them in equal chunks. The scheduler estimates the
+cost of each triple, starts with the biggest ones and lets idle workers
+steal work from the busiest ones. Compare it with naive chunking with::
+
+    python -m inspire_json_merger.scheduler --triples 200 --workers 4
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import collections
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from json_merger.contrib.inspirehep.comparators import (
+    DistanceFunctionComparator
+)
+
+from .api import merge
+from .merger_config_arxiv2arxiv import COMPARATORS
+from .synthetic import generate_triple
+
+#: Estimated costs in microseconds of a merge, of each element of a list
+#: with a comparator in each version, and of each pair of elements of
+#: these lists by kind of comparator. Author lists are mostly matched by
+#: normalized identifiers and names, so most of their pairs are never
+#: compared.
+BASE_COST = 10000
+ELEMENT_COST = 150
+DISTANCE_PAIR_COST = 0.25
+PRIMARY_KEY_PAIR_COST = 2.5
+
+
+def _iter_list_sizes(obj, path=()):
+    """Yield the dotted path and length of every list in ``obj``."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            for item in _iter_list_sizes(value, path + (key,)):
+                yield item
+    elif isinstance(obj, list):
+        yield '.'.join(path), len(obj)
+        for element in obj:
+            for item in _iter_list_sizes(element, path):
+                yield item
+
+
+def estimate_cost(triple, comparators=COMPARATORS):
+    """Estimate the cost of merging a (root, head, update) triple.
+
+    Every list with a comparator costs a linear part (normalizing, copying
+    and merging its elements) and a part quadratic in its length (looking
+    up the matches of its elements), see :data:`ELEMENT_COST` and the pair
+    costs. The estimate is in microseconds on a typical machine, but only
+    its relative value matters.
+    """
+    cost = BASE_COST
+    for version in triple:
+        for path, size in _iter_list_sizes(version):
+            comparator_cls = comparators.get(path)
+            if comparator_cls is None:
+                continue
+            if issubclass(comparator_cls, DistanceFunctionComparator):
+                pair_cost = DISTANCE_PAIR_COST
+            else:
+                pair_cost = PRIMARY_KEY_PAIR_COST
+            cost += ELEMENT_COST * size + pair_cost * size * size
+    return cost
+
+
+def merge_triple(triple):
+    return merge(*triple)
+
+
+class WorkStealingScheduler(object):
+    """Runs a function on a batch of items, the most expensive first.
+
+    Items are assigned to the worker slots largest first, each going to the
+    slot with the least estimated work. Every slot is a thread handing its
+    items one at a time to the ``executor``, and a slot running out of
+    items steals the cheapest pending item of the slot with the most
+    estimated work left.
+
+    Args:
+        workers (int): number of slots, by default the number of CPUs.
+
+        executor (:class:`concurrent.futures.Executor`): where to run the
+            items (with at least ``workers`` workers), by default a new
+            pool of processes.
+
+        cost_function: callable estimating the cost of an item.
+    """
+
+    def __init__(self, workers=None, executor=None,
+                 cost_function=estimate_cost):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.cost_function = cost_function
+        self.steals = 0
+
+    def _assign(self, costs):
+        queues = [collections.deque() for _ in range(self.workers)]
+        loads = [0] * self.workers
+        for idx in sorted(range(len(costs)), key=lambda idx: -costs[idx]):
+            slot = loads.index(min(loads))
+            queues[slot].append(idx)
+            loads[slot] += costs[idx]
+        return queues, loads
+
+    def map(self, fn, items):
+        """Return the list of ``fn(item)``, in the order of ``items``."""
+        items = list(items)
+        costs = [self.cost_function(item) for item in items]
+        queues, loads = self._assign(costs)
+        results = [None] * len(items)
+        errors = []
+        lock = threading.Lock()
+        executor = self.executor or ProcessPoolExecutor(self.workers)
+
+        def next_item(slot):
+            with lock:
+                if errors:
+                    return None
+                if queues[slot]:
+                    idx = queues[slot].popleft()
+                    loads[slot] -= costs[idx]
+                    return idx
+                victim = max(range(self.workers), key=lambda s: loads[s])
+                if not queues[victim]:
+                    return None
+                idx = queues[victim].pop()
+                loads[victim] -= costs[idx]
+                self.steals += 1
+                return idx
+
+        def run_slot(slot):
+            while True:
+                idx = next_item(slot)
+                if idx is None:
+                    return
+                try:
+                    results[idx] = executor.submit(fn, items[idx]).result()
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+                    return
+
+        threads = [threading.Thread(target=run_slot, args=(slot,))
+                   for slot in range(self.workers)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if self.executor is None:
+                executor.shutdown()
+        if errors:
+            raise errors[0]
+        return results
+
+
+def merge_batch(triples, workers=None, executor=None):
+    """Merge a batch of triples with a :class:`WorkStealingScheduler`.
+
+    Returns:
+        list: the merged records and conflicts, in the order of the
+        triples.
+    """
+    scheduler = WorkStealingScheduler(workers, executor)
+    return scheduler.map(merge_triple, triples)
+
+
+def merge_batch_chunked(triples, workers=None, executor=None):
+    """Merge a batch of triples split in ``workers`` equal chunks."""
+    triples = list(triples)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(int(math.ceil(len(triples) / workers)), 1)
+    own_executor = executor is None
+    executor = executor or ProcessPoolExecutor(workers)
+    try:
+        return list(executor.map(merge_triple, triples, chunksize=chunksize))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def simulate_makespan(costs, workers, strategy='largest_first'):
+    """Estimated makespan of a batch, in cost units.
+
+    Args:
+        strategy (str): ``chunked`` for equal chunks in the order of the
+            batch, or ``largest_first`` for the most expensive items first
+            on the first idle worker.
+    """
+    if strategy == 'chunked':
+        chunksize = max(int(math.ceil(len(costs) / workers)), 1)
+        return max(sum(costs[start:start + chunksize])
+                   for start in range(0, len(costs), chunksize))
+    finish_times = [0] * workers
+    for cost in sorted(costs, reverse=True):
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + cost)
+    return max(finish_times)
+
+
+def mixed_workload(num_triples=100, big_fraction=0.05, big_authors=1000,
+                   seed=0):
+    """Synthetic batch of small papers with a few big collaboration ones."""
+    rng = random.Random(seed)
+    triples = []
+    for idx in range(num_triples):
+        if rng.random() < big_fraction:
+            num_authors = rng.randint(big_authors // 2, big_authors)
+        else:
+            num_authors = rng.randint(1, 10)
+        triples.append(generate_triple(
+            num_authors=num_authors, num_references=rng.randint(0, 30),
+            recid=idx, seed=idx))
+    return triples
+
+
+def compare_makespan(triples, workers=None):
+    """Measure the makespan of a batch with both schedulings.
+
+    Returns:
+        dict: the measured (``seconds``) and estimated (``cost``) makespans
+        of naive chunking (``chunked``) and of the scheduler
+        (``largest_first``).
+    """
+    workers = workers or os.cpu_count() or 1
+    costs = [estimate_cost(triple) for triple in triples]
+    report = {'workers': workers, 'triples': len(triples)}
+    for strategy, merge_fn in (('chunked', merge_batch_chunked),
+                               ('largest_first', merge_batch)):
+        start = time.perf_counter()
+        merge_fn(triples, workers)
+        report[strategy] = {
+            'seconds': time.perf_counter() - start,
+            'cost': simulate_makespan(costs, workers, strategy),
+        }
+    return report
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m inspire_json_merger.scheduler',
+        description='Compare the makespan of a mixed batch with naive '
+                    'chunking and with the size-aware scheduler.')
+    parser.add_argument('--triples', type=int, default=100)
+    parser.add_argument('--big-fraction', type=float, default=0.05)
+    parser.add_argument('--big-authors', type=int, default=1000)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    triples = mixed_workload(args.triples, args.big_fraction,
+                             args.big_authors, args.seed)
+    json.dump(compare_makespan(triples, args.workers), sys.stdout, indent=2,
+              sort_keys=True)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Stores of the roots of the merges.
+
+The root of a merge is the last version of the record received from the
+same source, so it has to be kept somewhere between merges, keyed by the
+control number of the record and the source. See
+:func:`~inspire_json_merger.api.merge_from_store`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import sqlite3
+import threading
+import zlib
+
+from . import codec
+
+
+class RootStore(object):
+    """Interface of the stores of roots."""
+
+    def get(self, control_number, source):
+        """The root of a record for a source, or ``None`` if there is none."""
+        raise NotImplementedError('You have to implement me!')
+
+    def put(self, control_number, source, root):
+        """Store the root of a record for a source."""
+        raise NotImplementedError('You have to implement me!')
+
+
+class SQLiteRootStore(RootStore):
+    """Roots kept in a SQLite database as compressed JSON.
+
+    The database is in WAL mode, so that other processes can read it while
+    it is written.
+
+    Args:
+        path (str): the database, created if it doesn't exist.
+
+        compression_level (int): the :mod:`zlib` compression level.
+    """
+
+    def __init__(self, path, compression_level=6):
+        self.path = path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS roots ('
+                'control_number INTEGER NOT NULL, '
+                'source TEXT NOT NULL, '
+                'root BLOB NOT NULL, '
+                'PRIMARY KEY (control_number, source)) WITHOUT ROWID')
+
+    def get(self, control_number, source):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT root FROM roots WHERE control_number = ? AND '
+                'source = ?', (control_number, source)).fetchone()
+        if row is None:
+            return None
+        return codec.loads(zlib.decompress(row[0]))
+
+    def put(self, control_number, source, root):
+        data = zlib.compress(codec.dumpb(root), self.compression_level)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO roots (control_number, source, root) '
+                'VALUES (?, ?, ?)', (control_number, source, data))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM roots').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LRURootStore(RootStore):
+    """Keeps the most recently used roots of another store in memory.
+
+    Roots are written through to the other store, and a copy of them is
+    kept, so that the records stored can be modified afterwards. The records
+    returned are shared with the cache, so they must not be modified (the
+    merge doesn't modify its inputs). The cache assumes nothing else writes
+    the roots it holds, which is the case when the records are split between
+    processes by control number.
+
+    Args:
+        store (:class:`RootStore`): the store holding all the roots.
+
+        size (int): the maximum number of roots kept in memory.
+    """
+
+    def __init__(self, store, size=1024):
+        self.store = store
+        self.size = size
+        self._roots = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, control_number, source):
+        key = (control_number, source)
+        with self._lock:
+            if key in self._roots:
+                self._roots.move_to_end(key)
+                self.hits += 1
+                return self._roots[key]
+            self.misses += 1
+        root = self.store.get(control_number, source)
+        if root is not None:
+            self._cache(key, root)
+        return root
+
+    def put(self, control_number, source, root):
+        self.store.put(control_number, source, root)
+        # Cheaper than a deep copy, and the same as reading it back.
+        self._cache((control_number, source), codec.loads(codec.dumpb(root)))
+
+    def _cache(self, key, root):
+        with self._lock:
+            self._roots[key] = root
+            self._roots.move_to_end(key)
+            while len(self._roots) > self.size:
+                self._roots.popitem(last=False)
+
+    @property
+    def stats(self):
+        """Dict with the number of roots found in memory (``hits``) or not
+        (``misses``)."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._roots),
+        }
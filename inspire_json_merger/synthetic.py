@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Seeded generator of synthetic (root, head, update) record triples.
+
+The records are shaped like HEP literature records and fill in every field
+configured in ``COMPARATORS`` and ``LIST_MERGE_OPS``. ``head`` is ``root``
+after some curator edits, ``update`` is a new arXiv version of ``root``
+with reordered and renamed authors, more references, changed DOIs, etc.
+The same arguments always generate the same triple.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import random
+import string
+
+SOURCES = ('arXiv', 'Elsevier', 'Springer', 'INSPIRE')
+AFFILIATIONS = ('CERN', 'DESY', 'Fermilab', 'SLAC', 'KEK', 'IHEP')
+CATEGORIES = ('hep-ph', 'hep-th', 'hep-ex', 'astro-ph.CO', 'gr-qc')
+
+
+def _letters(number, length=6):
+    """Spell ``number`` with ``length`` lowercase letters."""
+    letters = []
+    for _ in range(length):
+        number, rest = divmod(number, 26)
+        letters.append(string.ascii_lowercase[rest])
+    return ''.join(reversed(letters))
+
+
+def _ref(collection, recid):
+    return {'$ref': 'http://localhost:5000/api/{}/{}'.format(collection,
+                                                             recid)}
+
+
+def make_author(idx):
+    """Author with an alphabetic name (tokenizers drop digits)."""
+    last_name = _letters(idx).capitalize()
+    first_name = _letters(idx * 7 + 3, 5).capitalize()
+    affiliation = AFFILIATIONS[idx % len(AFFILIATIONS)]
+    author = {
+        'full_name': '{}, {}'.format(last_name, first_name),
+        'ids': [{
+            'schema': 'INSPIRE BAI',
+            'value': '{}.{}.{}'.format(first_name[0], last_name, idx % 9 + 1),
+        }],
+        'affiliations': [{
+            'value': affiliation,
+            'record': _ref('institutions', 900000 + AFFILIATIONS.index(
+                affiliation)),
+        }],
+        'raw_affiliations': [{
+            'value': '{}, Geneva, Switzerland'.format(affiliation),
+            'source': 'arXiv',
+        }],
+        'emails': ['{}@example.org'.format(last_name.lower())],
+        'inspire_roles': ['author'],
+        'signature_block': last_name.upper()[:4],
+        'uuid': '00000000-0000-4000-8000-{:012d}'.format(idx),
+    }
+    if idx % 3 == 0:
+        author['ids'].append({
+            'schema': 'ORCID',
+            'value': '0000-0002-{:04d}-{:04d}'.format(idx // 10000,
+                                                      idx % 10000),
+        })
+    if idx % 5 == 0:
+        author['alternative_names'] = [
+            '{} {}'.format(first_name, last_name)]
+        author['credit_roles'] = ['Writing - original draft']
+        author['record'] = _ref('authors', 1000000 + idx)
+        author['curated_relation'] = False
+    return author
+
+
+def make_reference(idx):
+    arxiv_eprint = '1{:03d}.{:05d}'.format(idx % 1000, idx)
+    author = make_author(idx)['full_name']
+    return {
+        'reference': {
+            'arxiv_eprint': arxiv_eprint,
+            'authors': [{'full_name': author}],
+            'collaboration': ['{} Collaboration'.format(
+                _letters(idx % 20, 3).upper())] if idx % 4 == 0 else [],
+            'dois': ['10.1000/ref.{}'.format(idx)] if idx % 2 else [],
+            'misc': ['Proceedings note {}'.format(idx)] if idx % 7 == 0
+            else [],
+            'persistent_identifiers': [],
+            'publication_info': {
+                'journal_title': 'Phys.Rev.D',
+                'journal_volume': str(idx % 99 + 1),
+                'page_start': str(idx + 1),
+            },
+            'title': {'title': 'On the {} problem'.format(_letters(idx))},
+            'urls': [{'value': 'http://example.org/ref/{}'.format(idx)}],
+        },
+        'raw_refs': [{
+            'schema': 'text',
+            'source': 'arXiv',
+            'value': '[{}] {} et al., arXiv:{}'.format(idx + 1, author,
+                                                       arxiv_eprint),
+        }],
+    }
+
+
+def make_record(num_authors=10, num_references=10, recid=1, seed=0):
+    """Generate a single record shaped like a HEP literature record."""
+    rng = random.Random(seed)
+    arxiv_id = '17{:02d}.{:05d}'.format(rng.randrange(1, 13), recid % 100000)
+    record = {
+        '$schema': 'http://localhost:5000/schemas/records/hep.json',
+        '_collections': ['Literature'],
+        '_desy_bookkeeping': [{'date': '2017-05-0{}'.format(i + 1),
+                               'expert': 'B', 'status': 'abs'}
+                              for i in range(2)],
+        '_export_to': {'CDS': False, 'HAL': False},
+        '_fft': [{
+            'creation_datetime': '2017-05-08T12:00:0{}'.format(i),
+            'path': '/tmp/fft/{}.pdf'.format(i),
+            'type': 'Main',
+            'version': 1,
+        } for i in range(2)],
+        '_files': [{
+            'bucket': '81e83c90-8f6d-4db4-9571-{:012d}'.format(recid),
+            'key': '{}.{}'.format(arxiv_id, ext),
+            'size': rng.randrange(10000, 5000000),
+            'version_id': '72f78ea9-84d8-4908-{:04d}-{:012d}'.format(
+                i, recid),
+        } for i, ext in enumerate(('pdf', 'tar.gz'))],
+        '_private_notes': [{'source': 'INSPIRE',
+                            'value': 'Checked by curator'}],
+        'abstracts': [{
+            'source': 'arXiv',
+            'value': 'We study the {} of {} in {} collisions.'.format(
+                _letters(recid), _letters(recid + 1), _letters(recid + 2)),
+        }],
+        'accelerator_experiments': [{
+            'legacy_name': 'CERN-LHC-ATLAS',
+            'record': _ref('experiments', 1108541),
+        }],
+        'acquisition_source': {
+            'datetime': '2017-05-08T12:00:00',
+            'method': 'hepcrawl',
+            'source': 'arXiv',
+            'submission_number': str(recid),
+        },
+        'arxiv_eprints': [{'categories': [rng.choice(CATEGORIES)],
+                           'value': arxiv_id}],
+        'authors': [make_author(idx) for idx in range(num_authors)],
+        'book_series': [{'title': 'Lecture Notes in Physics',
+                         'volume': str(recid % 900)}],
+        'citeable': True,
+        'collaborations': [{'record': _ref('experiments', 1108541),
+                            'value': 'ATLAS'}],
+        'control_number': recid,
+        'copyright': [{'holder': 'CERN', 'material': 'preprint',
+                       'statement': 'Copyright CERN', 'year': 2017}],
+        'core': True,
+        'corporate_author': ['CERN'],
+        'deleted': False,
+        'deleted_records': [_ref('literature', recid + 100000)],
+        'document_type': ['article'],
+        'dois': [{'source': 'APS',
+                  'value': '10.1103/PhysRevD.{}.{:06d}'.format(
+                      recid % 100, recid)}],
+        'editions': ['1st'],
+        'energy_ranges': ['10-100 GeV'],
+        'external_system_identifiers': [{'schema': 'CDS',
+                                         'value': str(2000000 + recid)}],
+        'funding_info': [{'agency': 'ERC',
+                          'project_number': str(600000 + recid)}],
+        'imprints': [{'date': '2017', 'publisher': 'Springer'}],
+        'inspire_categories': [{'source': 'arxiv',
+                                'term': 'Phenomenology-HEP'}],
+        'isbns': [{'medium': 'print',
+                   'value': '978-3-16-{:06d}-0'.format(recid % 1000000)}],
+        'keywords': [{'schema': 'INSPIRE', 'value': _letters(recid + i, 8)}
+                     for i in range(5)],
+        'languages': ['en'],
+        'legacy_creation_date': '2017-05-08',
+        'license': [{'imposing': 'arXiv',
+                     'license': 'CC-BY-4.0',
+                     'url': 'https://creativecommons.org/licenses/by/4.0/'}],
+        'new_record': _ref('literature', recid + 200000),
+        'number_of_pages': rng.randrange(5, 300),
+        'persistent_identifiers': [{'schema': 'HDL',
+                                    'value': '1234/{}'.format(recid)}],
+        'preprint_date': '2017-05-08',
+        'public_notes': [{'source': 'arXiv', 'value': '12 pages, 3 figures'}],
+        'publication_info': [{'artid': str(recid), 'journal_title': 'JHEP',
+                              'journal_volume': '1705', 'year': 2017}],
+        'publication_type': ['introductory'],
+        'refereed': False,
+        'references': [make_reference(idx) for idx in range(num_references)],
+        'report_numbers': [{
+            'source': 'arXiv',
+            'value': 'CERN-TH-2017-{:03d}'.format(recid % 1000),
+        }],
+        'self': _ref('literature', recid),
+        'special_collections': ['HEP-HIDDEN'],
+        'succeeding_entry': {'record': _ref('literature', recid + 300000)},
+        'texkeys': ['{}:2017{}'.format(_letters(recid).capitalize(),
+                                        _letters(recid, 3))],
+        'thesis_info': {'institutions': [{
+            'name': 'CERN', 'record': _ref('institutions', 902725)}]},
+        'title_translations': [{'language': 'fr',
+                                'title': 'Un document synthetique'}],
+        'titles': [{'source': 'arXiv', 'title': 'Synthetic record {}'.format(
+            _letters(recid))}],
+        'urls': [{'description': 'Article',
+                  'value': 'http://example.org/{}'.format(recid)}],
+        'withdrawn': False,
+    }
+    return record
+
+
+def _rename(full_name):
+    """Abbreviate the first name, like different sources often do."""
+    last_name, first_name = full_name.split(', ', 1)
+    return '{}, {}.'.format(last_name, first_name[0])
+
+
+def _edit_head(record, rng, edit_rate):
+    """Apply curator edits."""
+    for author in record['authors']:
+        if rng.random() < edit_rate:
+            author['affiliations'].append({'value': rng.choice(AFFILIATIONS)})
+        if rng.random() < edit_rate / 2:
+            author['curated_relation'] = True
+    for reference in record['references']:
+        if rng.random() < edit_rate:
+            reference['record'] = _ref('literature', rng.randrange(1, 10 ** 6))
+    record['_collections'].append('Citeable')
+    record['keywords'].append({'schema': 'INSPIRE', 'value': 'curated'})
+    record['inspire_categories'].append({'source': 'curator',
+                                         'term': 'Theory-HEP'})
+    record['public_notes'].append({'source': 'INSPIRE',
+                                   'value': 'Conference paper'})
+    record['titles'][0]['title'] += ' (curated)'
+    return record
+
+
+def _edit_update(record, rng, edit_rate, num_new_authors,
+                 num_new_references):
+    """Apply the changes of a new arXiv version."""
+    authors = record['authors']
+    for idx, author in enumerate(authors):
+        if rng.random() < edit_rate / 2:
+            author['full_name'] = _rename(author['full_name'])
+        if rng.random() < edit_rate:
+            other = rng.randrange(len(authors))
+            authors[idx], authors[other] = authors[other], authors[idx]
+    authors.extend(make_author(len(authors) + idx)
+                   for idx in range(num_new_authors))
+
+    references = record['references']
+    references.extend(make_reference(len(references) + idx)
+                      for idx in range(num_new_references))
+
+    for doi in record['dois']:
+        doi['value'] += '-v2'
+    for reference in references:
+        if reference['reference']['dois'] and rng.random() < edit_rate:
+            reference['reference']['dois'] = [
+                doi + '-v2' for doi in reference['reference']['dois']]
+
+    record['_files'] = [dict(f, version_id=f['version_id'][:-4] + 'beef')
+                        for f in record['_files']]
+    record['abstracts'][0]['value'] += ' Version 2.'
+    record['arxiv_eprints'][0]['categories'].append(rng.choice(CATEGORIES))
+    record['report_numbers'].append({'source': 'arXiv',
+                                     'value': 'DESY-17-{:03d}'.format(
+                                         rng.randrange(1000))})
+    record['number_of_pages'] += 1
+    return record
+
+
+def generate_triple(num_authors=10, num_references=10, edit_rate=0.1,
+                    recid=1, seed=0):
+    """Generate a (root, head, update) triple.
+
+    Args:
+        num_authors: number of authors of ``root``.
+        num_references: number of references of ``root``.
+        edit_rate: fraction of the list elements edited in ``head`` and
+            ``update``, and of authors and references added in ``update``.
+        recid: control number of the record.
+        seed: seed of the random choices.
+    """
+    rng = random.Random(seed)
+    root = make_record(num_authors, num_references, recid, seed)
+    head = _edit_head(copy.deepcopy(root), rng, edit_rate)
+    update = _edit_update(copy.deepcopy(root), rng, edit_rate,
+                          int(num_authors * edit_rate / 2),
+                          int(num_references * edit_rate))
+    return root, head, update
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Interned author name tokens."""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+
+
+class TokenTable(object):
+    """Per-merge table of interned name tokens.
+
+    Tokenizing the same name again (the same author is usually present in
+    root, head and update, and gets compared many times) returns the tokens
+    computed the first time, and equal tokens coming from different names
+    share a single ``NameToken`` instance. This keeps the number of small
+    objects proportional to the number of distinct tokens of a merge instead
+    of the number of name comparisons.
+
+    The tokenized names are returned as dicts of tuples that are shared
+    between callers, so they must not be modified.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._names = {}
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, token):
+        """Return the canonical instance of a ``NameToken``."""
+        key = (token.__class__, token.token)
+        return self._tokens.setdefault(key, token)
+
+    def tokenize(self, tokenize_function, name):
+        """Return the interned tokens of ``tokenize_function(name)``."""
+        key = (tokenize_function, name)
+        tokens = self._names.get(key)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+
+        self.misses += 1
+        tokens = dict(
+            (kind, tuple(self.intern(token) for token in kind_tokens))
+            for kind, kind_tokens in tokenize_function(name).items()
+        )
+        self._names[key] = tokens
+        return tokens
+
+    @property
+    def stats(self):
+        """Dict with the reused (``hits``) and tokenized (``misses``) names
+        and the number of distinct ``tokens``."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'tokens': len(self._tokens),
+        }
+
+    def clear(self):
+        self._tokens.clear()
+        self._names.clear()
+
+
+class InterningTokenizer(object):
+    """Tokenize function that goes through a :class:`TokenTable`."""
+
+    def __init__(self, tokenize_function, table):
+        self.tokenize_function = tokenize_function
+        self.table = table
+
+    def __call__(self, name):
+        return self.table.tokenize(self.tokenize_function, name)
+
+
+def with_interned_tokens(fn, table):
+    """Copy of a name normalizer or distance calculator interning its tokens.
+
+    Callables without a ``tokenize_function`` (e.g. ``NewIDNormalizer``) are
+    returned unchanged.
+    """
+    if getattr(fn, 'tokenize_function', None) is None:
+        return fn
+    interning_fn = copy.copy(fn)
+    interning_fn.tokenize_function = InterningTokenizer(fn.tokenize_function,
+                                                        table)
+    return interning_fn
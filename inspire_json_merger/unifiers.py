@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Fast paths for list unification."""
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.config import UnifierOps
+from json_merger.nothing import NOTHING
+from json_merger.stats import ListMatchStats
+
+#: Operations keeping the entities of a single source, and that source.
+ONE_SIDED_OPS = {
+    UnifierOps.KEEP_ONLY_HEAD_ENTITIES: 'head',
+    UnifierOps.KEEP_ONLY_UPDATE_ENTITIES: 'update',
+}
+
+
+def needs_matching(root, head, update, operation):
+    """Whether unifying the lists with ``operation`` needs any matching.
+
+    One-sided operations can only raise conflicts when an element of the
+    kept list matches several elements of the others, and their output
+    doesn't depend on matching when the kept list is empty or when it has
+    nothing to be matched with.
+    """
+    source = ONE_SIDED_OPS.get(operation)
+    if source is None:
+        return True
+    kept, other = (head, update) if source == 'head' else (update, head)
+    return bool(kept and (root or other))
+
+
+class TrivialListUnifier(object):
+    """``ListUnifier`` replacement for lists that need no matching.
+
+    Produces the same ``unified`` list as
+    :class:`json_merger.list_unify.ListUnifier` without building any
+    comparator. The stats are the same too, except that the root matches of
+    the discarded list are not computed when the kept list is empty.
+    """
+
+    def __init__(self, root, head, update, operation):
+        self.root = root
+        self.head = head
+        self.update = update
+        self.source = ONE_SIDED_OPS[operation]
+
+        self.head_stats = None
+        self.update_stats = None
+        self.unified = []
+
+    def unify(self):
+        self.head_stats = ListMatchStats(self.head, self.root)
+        self.update_stats = ListMatchStats(self.update, self.root)
+        if self.source == 'head':
+            kept_stats = self.head_stats
+            self.unified = [(NOTHING, obj, NOTHING) for obj in self.head]
+        else:
+            kept_stats = self.update_stats
+            self.unified = [(NOTHING, NOTHING, obj) for obj in self.update]
+
+        for idx in range(len(self.unified)):
+            kept_stats.move_to_result(idx)
@@ -27,11 +27,12 @@
 
 from __future__ import absolute_import, print_function
 
-import json
 import os
 
 import pytest
 
+from inspire_json_merger import codec
+
 
 class AbstractFixtureLoader(object):
     def __init__(self, basedir):
@@ -42,7 +43,7 @@ class AbstractFixtureLoader(object):
             return f.read()
 
     def load_single(self, test_dir, file_name):
-        return json.loads(self._read_file(test_dir, file_name))
+        return codec.loads(self._read_file(test_dir, file_name))
 
     def load_test(self, test_dir):
         raise NotImplementedError('You have to implement me!')
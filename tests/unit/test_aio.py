@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inspire_json_merger import aio
+from inspire_json_merger.api import MergeCancelled, merge
+from inspire_json_merger.synthetic import generate_triple
+
+
+def _triples(num):
+    return [generate_triple(num_authors=3, num_references=2, recid=idx,
+                            seed=idx) for idx in range(num)]
+
+
+def test_merge_async():
+    triple = generate_triple(num_authors=5, num_references=3)
+
+    assert asyncio.run(aio.merge_async(*triple)) == merge(*triple)
+
+
+def test_merge_batch_keeps_the_order():
+    triples = _triples(5)
+
+    results = asyncio.run(aio.merge_batch_async(iter(triples),
+                                                max_in_flight=2))
+
+    assert results == [merge(*triple) for triple in triples]
+
+
+class CountingExecutor(ThreadPoolExecutor):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    def submit(self, *args, **kwargs):
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        future = super(CountingExecutor, self).submit(*args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+
+def test_merge_batch_bounds_the_merges_in_flight():
+    executor = CountingExecutor(4)
+
+    asyncio.run(aio.merge_batch_async(_triples(6), executor,
+                                      max_in_flight=2))
+
+    assert executor.max_pending == 2
+
+
+def test_merge_batch_stops_reading_after_a_failure():
+    consumed = []
+
+    def triples():
+        # The inputs of the first merge cannot be copied.
+        for root in [{'lock': threading.Lock()}] + [{}] * 9:
+            consumed.append(root)
+            yield root, {}, {}
+
+    with pytest.raises(TypeError):
+        asyncio.run(aio.merge_batch_async(triples(), max_in_flight=1))
+
+    assert len(consumed) == 1
+
+
+def test_merge_batch_returns_the_exceptions():
+    triples = [({'lock': threading.Lock()}, {}, {})] + _triples(2)
+
+    results = asyncio.run(aio.merge_batch_async(triples, max_in_flight=1,
+                                                return_exceptions=True))
+
+    assert isinstance(results[0], TypeError)
+    assert results[1:] == [merge(*triple) for triple in triples[1:]]
+
+
+def test_merge_cancelled_mid_merge():
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with pytest.raises(MergeCancelled):
+        merge(*generate_triple(num_authors=2, num_references=1),
+              cancelled=cancelled)
+
+
+def test_cancelling_merge_async_cancels_the_merge():
+    release = threading.Event()
+    executor = CountingExecutor(1)
+
+    async def main():
+        # Keep the only worker busy, so the merge stays queued.
+        blocker = asyncio.get_running_loop().run_in_executor(
+            executor, release.wait)
+        task = asyncio.ensure_future(aio.merge_async(
+            *generate_triple(num_authors=2, num_references=1),
+            executor=executor))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        release.set()
+        await blocker
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    executor.shutdown()
+    assert executor.pending == 0
+
+
+def test_merge_batch_waits_for_the_cancelled_merges():
+    # The first merge fails while the second one is still running.
+    triples = [({'lock': threading.Lock()}, {}, {}),
+               generate_triple(num_authors=200, num_references=50)]
+
+    async def merge_batch():
+        with pytest.raises(TypeError):
+            await aio.merge_batch_async(triples, ThreadPoolExecutor(2),
+                                        max_in_flight=2)
+        return asyncio.all_tasks() - set([asyncio.current_task()])
+
+    assert asyncio.run(merge_batch()) == set()
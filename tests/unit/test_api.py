@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+from json_merger.merger import Merger
+from json_merger.config import DictMergerOps, UnifierOps
+from json_merger.errors import MergeError
+
+from inspire_json_merger.api import ArxivToArxivMerger, merge
+from inspire_json_merger.bloom import BloomPrefilter
+from inspire_json_merger.budget import AuthorMatchBudget
+from inspire_json_merger.counters import ComparatorCounters
+from inspire_json_merger.merger_config_arxiv2arxiv import (
+    COMPARATORS,
+    LIST_MERGE_OPS,
+    FIELD_MERGE_OPS
+)
+
+
+def json_merger_arxiv_to_arxiv(root, head, update):
+    merger = Merger(
+        root, head, update,
+        DictMergerOps.FALLBACK_KEEP_UPDATE,  # Most common operation
+        UnifierOps.KEEP_ONLY_UPDATE_ENTITIES,
+        comparators=COMPARATORS,
+        list_merge_ops=LIST_MERGE_OPS,
+        list_dict_ops=FIELD_MERGE_OPS
+    )
+    conflicts = None
+    try:
+        merger.merge()
+    except MergeError as e:
+        conflicts = [json.loads(c.to_json()) for c in e.content]
+    merged = merger.merged_root
+
+    return merged, conflicts
+
+
+def test_merge_is_the_same_as_the_plain_merger(update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+
+    assert merge(root, head, update) == \
+        json_merger_arxiv_to_arxiv(root, head, update)
+
+
+def test_merge_shares_normalizations_between_alignments(
+        update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+    merger = ArxivToArxivMerger(root, head, update)
+
+    try:
+        merger.merge()
+    except MergeError:
+        pass
+
+    assert merger.normalization_stats['hits'] > 0
+    assert merger.normalization_cache.stats['size'] == 0
+
+
+def test_merge_falls_back_when_the_author_budget_is_exhausted(
+        update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+    budget = AuthorMatchBudget(max_comparisons=0)
+    merger = ArxivToArxivMerger(root, head, update, author_budget=budget)
+
+    try:
+        merger.merge()
+    except MergeError:
+        pass
+
+    assert merger.author_budget_exhausted
+    assert len(merger.merged_root['authors']) == len(update['authors'])
+    assert budget.stats['hit_rate'] == 1.0
+
+
+def test_merge_returns_the_field_report_if_instrumented(
+        update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+
+    merged, conflicts, report = merge(root, head, update, instrument=True)
+
+    assert (merged, conflicts) == merge(root, head, update)
+    assert report['total_time'] > 0
+    assert 'authors' in report['fields']
+    assert report['paths']['authors']['unify_calls'] == 1
+
+
+def test_merge_with_a_bloom_prefilter(update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+    prefilter = BloomPrefilter()
+
+    assert merge(root, head, update, bloom_prefilter=prefilter) == \
+        merge(root, head, update)
+    assert prefilter.stats['comparisons'] + prefilter.stats['skipped'] > 0
+
+
+def test_merge_tells_whether_the_author_budget_was_exhausted(
+        update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+
+    merged, conflicts, exhausted = merge(
+        root, head, update, author_budget=AuthorMatchBudget())
+    assert (merged, conflicts) == merge(root, head, update)
+    assert not exhausted
+
+    _, _, report, exhausted = merge(
+        root, head, update, instrument=True,
+        author_budget=AuthorMatchBudget(max_comparisons=0))
+    assert 'authors' in report['fields']
+    assert exhausted
+
+
+def test_merge_counts_the_comparator_calls(update_fixture_loader):
+    root, head, update = update_fixture_loader.load_test('arxiv2arxiv')
+    counters = ComparatorCounters()
+
+    assert merge(root, head, update, comparator_counters=counters) == \
+        merge(root, head, update)
+    assert counters.stats['authors']['distance_evaluations'] > 0
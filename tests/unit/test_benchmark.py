@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from inspire_json_merger.benchmark import (
+    calibrate,
+    compare_results,
+    main,
+    measure,
+    percentile,
+    settings_mismatches
+)
+
+
+def _results(calibration, **scenarios):
+    return {
+        'meta': {'calibration': calibration},
+        'scenarios': dict(
+            (name, {'latency': {'p50': p50}, 'peak_memory': memory})
+            for name, (p50, memory) in scenarios.items()
+        ),
+    }
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 50) == 3
+    assert percentile(values, 99) == 5
+    assert percentile([7], 90) == 7
+
+
+def test_percentile_of_an_even_number_of_values():
+    assert percentile([2, 1], 50) == 1
+    assert percentile([6, 1, 5, 2, 4, 3], 50) == 3
+    assert percentile([6, 1, 5, 2, 4, 3], 90) == 6
+    assert percentile([4, 3, 2, 1], 25) == 1
+    assert percentile([4, 3, 2, 1], 0) == 1
+    assert percentile(list(range(1, 101)), 7) == 7
+
+
+def test_measure_reports_latency_throughput_and_memory():
+    def merge_fn(root, head, update):
+        return [dict(root) for _ in range(100)], None
+
+    result = measure(merge_fn, ({'a': 1}, {}, {}), repeat=4)
+
+    assert result['runs'] == 4
+    assert result['throughput'] > 0
+    assert result['latency']['p50'] <= result['latency']['max']
+    assert result['peak_memory'] > 0
+
+
+def test_calibrate():
+    assert calibrate(rounds=1) > 0
+
+
+def test_compare_results_normalizes_for_machine_speed():
+    baseline = _results(1.0, fast=(0.1, 1000))
+    # Twice as slow on a twice as slow machine.
+    results = _results(2.0, fast=(0.2, 1000))
+
+    assert compare_results(baseline, results) == []
+
+
+def test_compare_results_reports_regressions():
+    baseline = _results(1.0, slow=(0.1, 1000), fat=(0.1, 1000),
+                        removed=(0.1, 1000))
+    results = _results(1.0, slow=(0.15, 1000), fat=(0.1, 1500),
+                       added=(0.1, 1000))
+
+    regressions = compare_results(baseline, results, tolerance=0.2,
+                                  memory_tolerance=0.1)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith('fat: peak memory')
+    assert regressions[1].startswith('slow: normalized median latency')
+
+
+def test_settings_mismatches():
+    baseline = {'meta': {'engine': 'arxiv2arxiv', 'repeat': 5,
+                         'time_limit': 30.0}}
+
+    assert settings_mismatches(baseline, {
+        'engine': 'arxiv2arxiv', 'repeat': 5, 'time_limit': 30.0}) == []
+    assert settings_mismatches(baseline, {
+        'engine': 'json-merger', 'repeat': 3, 'time_limit': 30.0}) == [
+        "engine: 'arxiv2arxiv' in the baseline, 'json-merger' in this run",
+        'repeat: 5 in the baseline, 3 in this run',
+    ]
+
+
+def test_compare_with_a_missing_baseline(tmpdir, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(['--compare', str(tmpdir.join('missing.json')),
+              '--output', str(tmpdir.join('results.json'))])
+
+    assert excinfo.value.code == 2
+    assert 'cannot read the baseline' in capsys.readouterr().err
+
+
+def test_compare_with_a_baseline_of_other_settings(tmpdir, capsys):
+    baseline = tmpdir.join('baseline.json')
+    baseline.write(json.dumps({'meta': {'engine': 'json-merger',
+                                        'repeat': 5, 'time_limit': 30.0}}))
+
+    with pytest.raises(SystemExit) as excinfo:
+        main(['--compare', str(baseline),
+              '--output', str(tmpdir.join('results.json'))])
+
+    assert excinfo.value.code == 2
+    assert 'engine' in capsys.readouterr().err
+    assert not tmpdir.join('results.json').check()
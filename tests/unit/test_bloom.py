@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from inspire_json_merger.bloom import BloomFilter, BloomPrefilter, freeze
+from inspire_json_merger.cache import NormalizationCache
+from inspire_json_merger.comparators import bind_comparator
+from inspire_json_merger.merger_config_arxiv2arxiv import ValueComparator
+from inspire_json_merger.tokens import TokenTable
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = ['key-%d' % i for i in range(1000)]
+
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+
+
+def test_bloom_filter_false_positive_rate_is_bounded():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add('in-%d' % i)
+
+    false_positives = sum('out-%d' % i in bloom for i in range(10000))
+
+    assert false_positives < 300
+
+
+def test_bloom_filter_rejects_bad_error_rate():
+    with pytest.raises(ValueError):
+        BloomFilter(10, 1.5)
+
+
+def test_freeze_is_consistent_with_equality():
+    assert freeze({'a': [1, {'b': 2}]}) == freeze({'a': [1.0, {'b': 2}]})
+    assert hash(freeze({'a': [1, {'b': 2}]})) == \
+        hash(freeze({'a': [1.0, {'b': 2}]}))
+
+
+def test_prefilter_keeps_matches_and_skips_comparisons():
+    l1 = [{'value': 'kw%d' % i} for i in range(50)] + [{'other': 1}]
+    l2 = [{'value': 'kw%d' % i} for i in range(25, 75)] + [{'other': 1}]
+    prefilter = BloomPrefilter(error_rate=0.001)
+    cache = NormalizationCache()
+    plain = ValueComparator(l1, l2)
+
+    filtered = bind_comparator(ValueComparator, cache, TokenTable(),
+                               prefilter)(l1, l2)
+
+    assert filtered.matches == plain.matches
+    assert prefilter.stats['skipped_fraction'] > 0.4
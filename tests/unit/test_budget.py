@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from inspire_json_merger.budget import (
+    AuthorMatchBudget,
+    BudgetExhausted,
+    BudgetedDistance,
+    budgeted_distance_function_match,
+    match_by_normalizers
+)
+
+
+def test_budget_tracker_raises_when_comparisons_are_exhausted():
+    budget = AuthorMatchBudget(max_comparisons=2)
+    tracker = budget.new_tracker()
+
+    tracker.spend()
+    tracker.spend()
+    with pytest.raises(BudgetExhausted):
+        tracker.spend()
+
+    assert tracker.exhausted
+    assert budget.stats == {'merges': 1, 'exhausted': 1, 'hit_rate': 1.0}
+
+
+def test_budget_hit_rate_counts_merges():
+    budget = AuthorMatchBudget(max_comparisons=1)
+
+    budget.new_tracker().spend()
+    tracker = budget.new_tracker()
+    tracker.spend()
+    with pytest.raises(BudgetExhausted):
+        tracker.spend()
+
+    assert budget.stats['hit_rate'] == 0.5
+
+
+def test_budget_tracker_raises_when_time_is_exhausted():
+    tracker = AuthorMatchBudget(max_seconds=-1).new_tracker()
+
+    with pytest.raises(BudgetExhausted):
+        tracker.spend()
+
+
+def test_match_by_normalizers_matches_unique_values_only():
+    l1 = [{'id': 'a', 'name': 'x'}, {'name': 'y'}, {'name': 'y'},
+          {'name': 'z'}]
+    l2 = [{'name': 'z'}, {'name': 'y'}, {'id': 'a', 'name': 'w'}]
+
+    matches = match_by_normalizers(l1, l2, [lambda obj: obj.get('id'),
+                                            lambda obj: obj['name']])
+
+    assert sorted(matches) == [(0, 2), (3, 0)]
+
+
+def _distance(obj1, obj2):
+    return 0.0 if obj1 == obj2 else 1.0
+
+
+def _initial(obj):
+    return obj[0]
+
+
+def test_budgeted_match_keeps_the_matches_found_before_exhaustion():
+    l1 = ['alice', 'bob', 'xavier', 'xena']
+    l2 = ['xena', 'xavier', 'bob', 'alice']
+    tracker = AuthorMatchBudget(max_comparisons=2).new_tracker()
+
+    matches = budgeted_distance_function_match(
+        l1, l2, 0.0, BudgetedDistance(_distance, tracker), [_initial],
+        [lambda obj: obj[:3]], tracker)
+
+    # alice and bob were matched before the distance matrix exhausted the
+    # budget, the x names by the fallback.
+    assert tracker.exhausted
+    assert sorted(matches) == [(0, 3), (1, 2), (2, 1), (3, 0)]
+
+
+def test_budgeted_match_checks_the_time_before_any_distance():
+    calls = []
+
+    def distance(obj1, obj2):
+        calls.append((obj1, obj2))
+        return _distance(obj1, obj2)
+
+    tracker = AuthorMatchBudget(max_seconds=-1).new_tracker()
+
+    matches = budgeted_distance_function_match(
+        ['alice', 'bob'], ['bob', 'alice'], 0.0, distance, [_initial],
+        [_initial], tracker)
+
+    assert calls == []
+    assert sorted(matches) == [(0, 1), (1, 0)]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from inspire_json_merger.cache import CachedNormalizer, NormalizationCache
+
+
+class CountingNormalizer(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, obj):
+        self.calls += 1
+        return obj['value'].lower()
+
+
+def test_normalization_cache_normalizes_each_element_once():
+    normalizer = CountingNormalizer()
+    cache = NormalizationCache()
+    cached = CachedNormalizer(normalizer, cache)
+    first = {'value': 'FOO'}
+    second = {'value': 'Bar'}
+
+    assert [cached(first), cached(second), cached(first)] == \
+        ['foo', 'bar', 'foo']
+    assert normalizer.calls == 2
+    assert cache.stats == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_normalization_cache_keys_by_identity_not_equality():
+    normalizer = CountingNormalizer()
+    cache = NormalizationCache()
+
+    cache.normalize(normalizer, {'value': 'FOO'})
+    cache.normalize(normalizer, {'value': 'FOO'})
+
+    assert normalizer.calls == 2
+
+
+def test_normalization_cache_clear_releases_elements():
+    cache = NormalizationCache()
+    cache.normalize(CountingNormalizer(), {'value': 'FOO'})
+
+    cache.clear()
+
+    assert cache.stats['size'] == 0
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+
+import pytest
+
+from inspire_json_merger.cache import NormalizationCache
+from inspire_json_merger.cancellation import (
+    CancellableDistance,
+    MergeCancelled,
+)
+from inspire_json_merger.comparators import bind_comparator
+from inspire_json_merger.merger_config_arxiv2arxiv import COMPARATORS
+from inspire_json_merger.synthetic import generate_triple
+from inspire_json_merger.tokens import TokenTable
+
+
+def _bind(path, cancelled):
+    return bind_comparator(COMPARATORS[path], NormalizationCache(),
+                           TokenTable(), cancelled=cancelled)
+
+
+def test_cancellable_distance():
+    cancelled = threading.Event()
+    distance = CancellableDistance(lambda obj1, obj2: 0.5, cancelled)
+
+    assert distance('a', 'b') == 0.5
+    cancelled.set()
+    with pytest.raises(MergeCancelled):
+        distance('a', 'b')
+
+
+def test_cancelled_author_matching():
+    cancelled = threading.Event()
+    comparator_cls = _bind('authors', cancelled)
+    # Authors of different records, which are compared by distance.
+    l1 = generate_triple(num_authors=5, seed=1)[0]['authors']
+    l2 = generate_triple(num_authors=5, seed=2)[0]['authors']
+    matches = comparator_cls(l1, l2).matches
+
+    cancelled.set()
+    with pytest.raises(MergeCancelled):
+        comparator_cls(l1, l2)
+    cancelled.clear()
+    assert comparator_cls(l1, l2).matches == matches
+
+
+def test_cancelled_primary_key_matching():
+    cancelled = threading.Event()
+    comparator_cls = _bind('dois', cancelled)
+    dois = [{'value': '10.1000/%d' % idx} for idx in range(3)]
+
+    assert len(comparator_cls(dois, dois).matches) == 3
+    cancelled.set()
+    with pytest.raises(MergeCancelled):
+        comparator_cls(dois, dois)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from inspire_json_merger.api import merge
+from inspire_json_merger.capture import (
+    SlowMergeCapture,
+    get_config_version,
+    load_capture,
+)
+from inspire_json_merger.cli import main
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_slow_merges_are_captured(tmpdir):
+    capture = SlowMergeCapture(str(tmpdir), threshold=0.0)
+    root, head, update = generate_triple(num_authors=5, num_references=3)
+
+    merged, conflicts = merge(root, head, update, capture=capture)
+
+    assert capture.captured == 1
+    captured = load_capture(str(tmpdir.listdir()[0]))
+    assert captured['root'] == root
+    assert captured['head'] == head
+    assert captured['update'] == update
+    assert captured['config_version'] == get_config_version()
+    assert captured['conflicts'] == len(conflicts or [])
+    assert 'authors' in captured['timings']['fields']
+
+
+def test_fast_merges_are_not_captured(tmpdir):
+    capture = SlowMergeCapture(str(tmpdir), threshold=60.0)
+    merge(*generate_triple(num_authors=2, num_references=1), capture=capture)
+
+    assert capture.captured == 0
+    assert capture.dropped == 0
+    assert tmpdir.listdir() == []
+
+
+def test_captures_are_rate_limited(tmpdir):
+    capture = SlowMergeCapture(str(tmpdir), threshold=0.0, max_captures=1)
+    triple = generate_triple(num_authors=2, num_references=1)
+    merge(*triple, capture=capture)
+    merge(*triple, capture=capture)
+
+    assert capture.captured == 1
+    assert capture.dropped == 1
+    assert len(tmpdir.listdir()) == 1
+
+
+def test_captures_are_size_capped(tmpdir):
+    capture = SlowMergeCapture(str(tmpdir), threshold=0.0, max_bytes=1000)
+    merge(*generate_triple(num_authors=5, num_references=3), capture=capture)
+
+    assert capture.captured == 0
+    assert capture.dropped == 1
+    assert tmpdir.listdir() == []
+
+
+def test_replay_command(tmpdir, capsys):
+    capture = SlowMergeCapture(str(tmpdir), threshold=0.0)
+    merge(*generate_triple(num_authors=5, num_references=3), capture=capture)
+
+    main(['replay', str(tmpdir.listdir()[0]), '--repeat', '2',
+          '--limit', '5'])
+
+    out = capsys.readouterr()[0]
+    assert 'run 2:' in out
+    assert 'function calls' in out
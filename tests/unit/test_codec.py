@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+from json_merger.errors import MergeError
+
+from inspire_json_merger import codec
+from inspire_json_merger.api import ArxivToArxivMerger, get_conflicts
+from inspire_json_merger.codec import CODECS
+
+RECORD = {
+    'titles': [{'title': u'Étude des quarks   \u0001 "charmés"'}],
+    'control_number': 1234567,
+    'citeable': True,
+    'page_end': None,
+    'version': 1.5,
+    'authors': [{'full_name': u'Smith, J.', 'uuid': u'160b8b6f'}],
+}
+
+
+@pytest.fixture(params=sorted(CODECS))
+def json_codec(request):
+    return CODECS[request.param]()
+
+
+def test_dumps_is_compact_and_keeps_unicode(json_codec):
+    expected = json.dumps(RECORD, ensure_ascii=False, separators=(',', ':'))
+
+    assert json_codec.dumps(RECORD) == expected
+    assert json_codec.dumpb(RECORD) == expected.encode('utf-8')
+
+
+def test_dumps_sorts_keys(json_codec):
+    expected = json.dumps(RECORD, ensure_ascii=False, separators=(',', ':'),
+                          sort_keys=True)
+
+    assert json_codec.dumps(RECORD, sort_keys=True) == expected
+
+
+def test_loads(json_codec):
+    data = json.dumps(RECORD)
+
+    assert json_codec.loads(data) == RECORD
+    assert json_codec.loads(data.encode('utf-8')) == RECORD
+
+
+def test_falls_back_to_json(json_codec):
+    assert json_codec.dumps({1: 2 ** 70}) == '{"1":%d}' % 2 ** 70
+    assert json_codec.loads('[NaN]')[0] != json_codec.loads('[NaN]')[0]
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads('{')
+
+
+@pytest.mark.skipif('orjson' not in CODECS, reason='orjson is not installed')
+def test_orjson_writes_small_floats_without_exponent():
+    record = {'value': 2.5e-05, 'big': 1e16, 'infinite': float('inf')}
+
+    assert CODECS['json']().dumps(record) == \
+        '{"value":2.5e-05,"big":1e+16,"infinite":Infinity}'
+    assert CODECS['orjson']().dumps(record) == \
+        '{"value":0.000025,"big":1e+16,"infinite":null}'
+    assert CODECS['orjson']().loads(b'{"value":0.000025}') == \
+        {'value': 2.5e-05}
+
+
+def test_set_codec():
+    default = codec.get_codec()
+    try:
+        codec.set_codec('json')
+        assert codec.get_codec().name == 'json'
+        assert codec.loads(codec.dumpb(RECORD)) == RECORD
+    finally:
+        codec._codec = default
+
+
+def test_get_conflicts_matches_the_conflicts_json(update_fixture_loader):
+    merger = ArxivToArxivMerger(*update_fixture_loader.load_test(
+        'arxiv2arxiv'))
+    with pytest.raises(MergeError):
+        merger.merge()
+
+    assert get_conflicts(merger) == [json.loads(c.to_json())
+                                     for c in merger.conflicts]
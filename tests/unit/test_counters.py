@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.errors import MergeError
+
+from inspire_json_merger.api import ArxivToArxivMerger
+from inspire_json_merger.counters import ComparatorCounters, PathCounters
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_distance_histogram_is_relative_to_the_threshold():
+    counters = PathCounters(distance_threshold=0.2)
+    for distance in (0.0, 0.04, 0.2, 0.3, 1.0):
+        counters.add_distance(distance)
+
+    stats = counters.stats
+    assert stats['distance_evaluations'] == 5
+    assert stats['distance_histogram']['<=0'] == 1
+    assert stats['distance_histogram']['<=0.25'] == 1
+    assert stats['distance_histogram']['<=1'] == 1
+    assert stats['distance_histogram']['<=1.5'] == 1
+    assert stats['distance_histogram']['>4'] == 1
+
+
+def test_counters_without_threshold_have_no_histogram():
+    assert 'distance_histogram' not in PathCounters().stats
+
+
+def test_merge_counts_comparator_calls_by_path():
+    counters = ComparatorCounters()
+    triple = generate_triple(num_authors=10, num_references=5)
+    merger = ArxivToArxivMerger(*triple, comparator_counters=counters)
+    try:
+        merger.merge()
+    except MergeError:
+        pass
+
+    stats = counters.stats
+    authors = stats['authors']
+    assert authors['distance_evaluations'] > 0
+    assert authors['distance_threshold'] == 0.12
+    assert sum(authors['distance_histogram'].values()) == \
+        authors['distance_evaluations']
+    assert stats['references']['equal_calls'] > 0
+    assert stats['references']['cache_hits'] > 0
+    total = sum(path['normalizations'] for path in stats.values())
+    assert total == merger.normalization_stats['misses']
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import socket
+import threading
+import stat
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from inspire_json_merger import daemon
+from inspire_json_merger.api import merge
+from inspire_json_merger.synthetic import generate_triple
+
+
+@pytest.fixture()
+def server(tmpdir):
+    server = daemon.MergeDaemon(str(tmpdir.join('merger.sock')), workers=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+@pytest.fixture()
+def socket_path(server):
+    return server.server_address
+
+
+def test_daemon_merges_like_the_api(socket_path):
+    triple = generate_triple(num_authors=5, num_references=3)
+
+    assert daemon.merge(*triple, socket_path=socket_path) == merge(*triple)
+    # The connection is reused.
+    assert daemon.merge(*triple, socket_path=socket_path) == merge(*triple)
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    return sock
+
+
+def test_daemon_reports_failed_merges(socket_path):
+    sock = _connect(socket_path)
+    daemon.send_message(sock, {'root': {}})
+
+    assert daemon.recv_message(sock) == {'error': "KeyError: 'head'"}
+    sock.close()
+
+
+def test_daemon_rejects_invalid_messages(socket_path):
+    sock = _connect(socket_path)
+    sock.sendall(b'\x00\x00\x00\x03abc')
+
+    assert 'error' in daemon.recv_message(sock)
+    sock.close()
+
+
+def test_daemon_replaces_a_broken_pool(server, socket_path):
+    triple = generate_triple(num_authors=5, num_references=3)
+    broken = server.executor
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    assert daemon.merge(*triple, socket_path=socket_path) == merge(*triple)
+    assert server.executor is not broken
+    assert server.restarts == 1
+
+
+def test_daemon_socket_is_private(socket_path):
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+
+def test_daemon_refuses_the_socket_of_a_running_daemon(socket_path):
+    with pytest.raises(daemon.DaemonError):
+        daemon.MergeDaemon(socket_path, workers=1)
+
+    assert daemon.merge({}, {}, {}, socket_path=socket_path) == ({}, None)
+
+
+def test_daemon_replaces_a_stale_socket(tmpdir):
+    path = str(tmpdir.join('merger.sock'))
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    server = daemon.MergeDaemon(path, workers=1)
+    server.server_close()
+
+
+def test_daemon_refuses_to_remove_other_files(tmpdir):
+    path = tmpdir.join('merger.sock')
+    path.write('')
+
+    with pytest.raises(daemon.DaemonError):
+        daemon.MergeDaemon(str(path), workers=1)
+    assert path.check()
+
+
+def test_daemon_reports_too_big_responses(server, socket_path, monkeypatch):
+    monkeypatch.setattr(daemon, 'MAX_MESSAGE_SIZE', 100)
+    monkeypatch.setattr(server, 'merge',
+                        lambda request: {'merged': 'x' * 100})
+    sock = _connect(socket_path)
+    daemon.send_message(sock, {'root': {}})
+
+    assert 'too big' in daemon.recv_message(sock)['error']
+    sock.close()
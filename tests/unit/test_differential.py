@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+from inspire_json_merger.differential import (
+    find_mismatches,
+    iter_cases,
+    reference_merge,
+    run_differential,
+    shrink,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'fixtures')
+
+CASES = list(iter_cases(FIXTURES_DIR, num_synthetic=20))
+
+
+def _drops_dois(root, head, update):
+    """A broken engine losing the DOIs of the update."""
+    update = dict((k, v) for k, v in update.items() if k != 'dois')
+    return reference_merge(root, head, update)
+
+
+def test_engines_agree_with_the_reference(update_fixture_loader):
+    triple = update_fixture_loader.load_test('arxiv2arxiv')
+
+    assert find_mismatches(triple) == []
+
+
+@pytest.mark.parametrize('triple', [triple for _, triple in CASES],
+                         ids=[name for name, _ in CASES])
+def test_every_engine_agrees_with_the_reference(triple):
+    assert find_mismatches(triple) == []
+
+
+def test_synthetic_cases_are_deterministic():
+    cases = list(iter_cases(num_synthetic=3, seed=1))
+
+    assert [name for name, _ in cases] == \
+        ['synthetic:0', 'synthetic:1', 'synthetic:2']
+    assert cases == list(iter_cases(num_synthetic=3, seed=1))
+
+
+def test_shrink():
+    triple = ({'a': [1, 2, 3], 'b': 1}, {'a': [1, 2, 3, 4]}, {'c': {'d': 1}})
+
+    def fails(triple):
+        return 4 in triple[1].get('a', [])
+
+    assert shrink(triple, fails) == ({}, {'a': [4]}, {})
+
+
+def test_mismatching_triples_are_shrunk():
+    triple = generate_triple(num_authors=3, num_references=2)
+
+    failures = run_differential([('broken', triple)],
+                                engines={'broken': _drops_dois})
+
+    assert len(failures) == 1
+    assert failures[0]['engines'] == ['broken']
+    assert failures[0]['reproducer'] == {
+        'root': {},
+        'head': {},
+        'update': {'dois': []},
+    }
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+
+import pytest
+
+from inspire_json_merger.dump import DumpReader, build_index
+
+TRIPLES = [{'root': {}, 'head': {'control_number': idx},
+            'update': {'titles': [{'title': u'Títle %d' % idx * idx}]}}
+           for idx in range(8)]
+
+
+@pytest.fixture
+def dump_path(tmpdir):
+    path = tmpdir.join('dump.jsonl')
+    lines = [json.dumps(triple) for triple in TRIPLES]
+    lines.insert(3, '')
+    path.write_text(u'\n'.join(lines), 'utf-8')
+    return str(path)
+
+
+def test_random_access(dump_path):
+    with DumpReader(dump_path) as reader:
+        assert len(reader) == 9
+        assert reader[8] == TRIPLES[7]
+        assert reader[3] is None
+        assert reader[0] == TRIPLES[0]
+        with pytest.raises(IndexError):
+            reader.line(9)
+
+    assert os.path.exists(dump_path + '.idx')
+
+
+def test_iter_lines_skips_blank_lines(dump_path):
+    with DumpReader(dump_path) as reader:
+        assert [index for index, _ in reader.iter_lines(2, 6)] == [2, 4, 5]
+        assert [json.loads(line) for _, line in reader.iter_lines()] == \
+            TRIPLES
+
+
+def test_shards_cover_the_dump(dump_path):
+    with DumpReader(dump_path) as reader:
+        shards = reader.shards(3)
+        merged = [reader.line(index) for start, stop in shards
+                  for index in range(start, stop)]
+        sizes = [reader.offset(stop) - reader.offset(start)
+                 for start, stop in shards]
+
+    assert shards[0][0] == 0
+    assert shards[-1][1] == 9
+    assert all(previous[1] == shard[0]
+               for previous, shard in zip(shards, shards[1:]))
+    assert b''.join(merged) == open(dump_path, 'rb').read()
+    assert max(sizes) - min(sizes) <= max(len(json.dumps(triple))
+                                          for triple in TRIPLES)
+
+
+def test_index_is_rebuilt_when_the_dump_changes(dump_path):
+    build_index(dump_path)
+    with open(dump_path, 'a') as f:
+        f.write('\n' + json.dumps(TRIPLES[0]))
+    stat = os.stat(dump_path)
+    os.utime(dump_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    with DumpReader(dump_path) as reader:
+        assert len(reader) == 10
+        assert reader[9] == TRIPLES[0]
+
+
+def test_empty_dump(tmpdir):
+    path = tmpdir.join('dump.jsonl')
+    path.write('')
+
+    with DumpReader(str(path)) as reader:
+        assert len(reader) == 0
+        assert reader.shards(2) == [(0, 0), (0, 0)]
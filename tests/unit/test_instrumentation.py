@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.errors import MergeError
+
+from inspire_json_merger.api import ArxivToArxivMerger
+from inspire_json_merger.counters import ComparatorCounters
+from inspire_json_merger.synthetic import generate_triple
+
+
+def _merge(triple, **kwargs):
+    merger = ArxivToArxivMerger(*triple, **kwargs)
+    try:
+        merger.merge()
+    except MergeError:
+        pass
+    return merger
+
+
+def test_instrumented_merge_reports_fields_and_paths():
+    merger = _merge(generate_triple(num_authors=5, num_references=3),
+                    instrument=True)
+    report = merger.field_report
+
+    assert report['total_time'] > 0
+    assert 'authors' in report['fields']
+    assert 'references' in report['fields']
+
+    authors = report['paths']['authors']
+    assert authors['unify_calls'] == 1
+    assert authors['comparators_built'] == 3
+    assert authors['list_sizes']['root'] == {'total': 5, 'max': 5}
+    assert authors['merge_calls'] >= 5
+
+    nested = report['paths']['references.reference.authors']
+    assert nested['unify_calls'] == 3
+
+
+def test_field_report_counts_the_comparator_calls():
+    triple = generate_triple(num_authors=10, num_references=5)
+    counters = ComparatorCounters()
+    merger = _merge(triple, instrument=True, comparator_counters=counters)
+    paths = merger.field_report['paths']
+
+    authors = paths['authors']['comparator_calls']
+    assert authors['distance_evaluations'] > 0
+    assert paths['references']['comparator_calls']['equal_calls'] > 0
+    # Lists without a configured comparator.
+    assert paths['arxiv_eprints.categories']['comparator_calls'] is None
+    # The counts of the merge are also added to the counters passed.
+    assert counters.stats['authors'] == authors
+    _merge(triple, instrument=True, comparator_counters=counters)
+    assert counters.stats['authors']['distance_evaluations'] == \
+        2 * authors['distance_evaluations']
+
+
+def test_instrumentation_doesnt_change_the_result():
+    triple = generate_triple(num_authors=5, num_references=3)
+    plain = _merge(triple)
+    instrumented = _merge(triple, instrument=True)
+
+    assert plain.field_report is None
+    assert plain.merged_root == instrumented.merged_root
+    assert plain.conflicts == instrumented.conflicts
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+import tracemalloc
+
+import pytest
+
+from inspire_json_merger.api import merge
+from inspire_json_merger.memory import PHASES, MemoryProfiler
+from inspire_json_merger.metrics import MergeMetrics
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_memory_report_by_phase():
+    profiler = MemoryProfiler(top=3)
+    triple = generate_triple(num_authors=20, num_references=5)
+
+    result = merge(*triple, memory_profiler=profiler)
+
+    assert result == merge(*triple)
+    assert not tracemalloc.is_tracing()
+    report = profiler.report
+    assert sorted(report['phases']) == sorted(PHASES)
+    assert report['peak'] == max(
+        phase['peak'] for phase in report['phases'].values())
+    for phase in ('input_copy', 'normalization', 'matching',
+                  'output_assembly'):
+        assert report['phases'][phase]['peak'] > 0
+        sites = report['phases'][phase]['top_sites']
+        assert 0 < len(sites) <= 3
+        assert sites[0]['size'] >= sites[-1]['size']
+
+
+def test_memory_report_goes_to_the_metrics():
+    metrics = MergeMetrics()
+    profiler = MemoryProfiler()
+
+    merge(*generate_triple(num_authors=5, num_references=3),
+          metrics=metrics, memory_profiler=profiler)
+
+    assert metrics.stats['memory_peaks']['matching'] == \
+        profiler.report['phases']['matching']['peak']
+    assert 'inspire_json_merger_memory_peak_bytes{phase="matching"}' in \
+        metrics.to_prometheus()
+
+
+def test_tracing_stops_if_the_merger_cannot_be_built():
+    profiler = MemoryProfiler()
+
+    with pytest.raises(TypeError):
+        # The inputs cannot be copied.
+        merge({'lock': threading.Lock()}, {}, {}, memory_profiler=profiler)
+
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import stat
+
+from inspire_json_merger.api import merge
+from inspire_json_merger.metrics import MergeMetrics, PrometheusFileExporter
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_merge_is_observed_by_the_metrics():
+    exported = []
+    metrics = MergeMetrics(exporters=[exported.append])
+    triple = generate_triple(num_authors=5, num_references=3)
+
+    merged, conflicts = merge(*triple, metrics=metrics)
+
+    assert (merged, conflicts) == merge(*triple)
+    assert exported == [metrics]
+    stats = metrics.stats
+    assert stats['merges'] == 1
+    assert sum(stats['latency']['buckets'].values()) == 1
+    assert stats['merges_with_conflicts'] == (1 if conflicts else 0)
+    assert sum(stats['conflicts'].values()) == len(conflicts or [])
+    assert stats['normalization_cache']['miss'] > 0
+    assert stats['merges_per_second'] > 0
+
+
+def test_prometheus_text_format():
+    metrics = MergeMetrics()
+    merge(*generate_triple(num_authors=5, num_references=3), metrics=metrics)
+
+    text = metrics.to_prometheus()
+
+    assert '# TYPE inspire_json_merger_merge_duration_seconds histogram' \
+        in text
+    assert 'inspire_json_merger_merge_duration_seconds_bucket{le="+Inf"} 1' \
+        in text
+    assert 'inspire_json_merger_merges_total 1\n' in text
+    assert 'inspire_json_merger_normalization_cache_total{result="miss"}' \
+        in text
+
+
+def test_prometheus_file_exporter_throttles_writes(tmpdir):
+    path = tmpdir.join('merger.prom')
+    metrics = MergeMetrics(exporters=[PrometheusFileExporter(str(path),
+                                                             interval=60)])
+    triple = generate_triple(num_authors=2, num_references=1)
+
+    merge(*triple, metrics=metrics)
+    assert 'inspire_json_merger_merges_total 1\n' in path.read()
+
+    merge(*triple, metrics=metrics)
+    assert 'inspire_json_merger_merges_total 1\n' in path.read()
+    assert tmpdir.listdir() == [path]
+
+
+def test_prometheus_file_is_readable_by_everyone(tmpdir):
+    path = tmpdir.join('merger.prom')
+
+    MergeMetrics().write_prometheus(str(path))
+
+    assert stat.S_IMODE(os.stat(str(path)).st_mode) == 0o644
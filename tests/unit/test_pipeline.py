@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import gzip
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inspire_json_merger.api import merge
+from inspire_json_merger.checkpoint import Checkpoint
+from inspire_json_merger.pipeline import _END, MergePipeline, zstandard
+from inspire_json_merger.synthetic import generate_triple
+
+
+class CrashingExecutor(ThreadPoolExecutor):
+    """Executor failing after a number of submissions, like a crash."""
+
+    def __init__(self, submissions):
+        ThreadPoolExecutor.__init__(self, 1)
+        self.submissions = submissions
+
+    def submit(self, fn, *args, **kwargs):
+        if not self.submissions:
+            raise RuntimeError('crash')
+        self.submissions -= 1
+        return ThreadPoolExecutor.submit(self, fn, *args, **kwargs)
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """Executor keeping the triples in the order they were submitted."""
+
+    def __init__(self):
+        ThreadPoolExecutor.__init__(self, 1)
+        self.submitted = []
+
+    def submit(self, fn, triple):
+        self.submitted.append(triple)
+        return ThreadPoolExecutor.submit(self, fn, triple)
+
+
+def _triples(num):
+    return [generate_triple(num_authors=3, num_references=2, recid=idx,
+                            seed=idx) for idx in range(num)]
+
+
+def _write_input(f, triples):
+    for root, head, update in triples:
+        f.write(json.dumps({'root': root, 'head': head,
+                            'update': update}) + '\n')
+
+
+def _read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def _expected(triples):
+    results = []
+    for index, triple in enumerate(triples):
+        merged, conflicts = merge(*triple)
+        results.append({'index': index, 'merged': merged,
+                        'conflicts': conflicts})
+    return results
+
+
+def test_ordered_pipeline(tmpdir):
+    triples = _triples(6)
+    input_path = tmpdir.join('input.jsonl.gz')
+    with gzip.open(str(input_path), 'wt') as f:
+        _write_input(f, triples)
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    stats = MergePipeline(str(input_path), output_path, workers=2,
+                          queue_size=2).run()
+
+    assert _read_output(output_path) == _expected(triples)
+    assert stats['reader']['items'] == 6
+    assert stats['merge']['items'] == 6
+    assert stats['writer']['items'] == 6
+    assert stats['queues']['parsed']['max_depth'] <= 2
+
+
+def test_unordered_pipeline(tmpdir):
+    triples = _triples(6)
+    input_path = tmpdir.join('input.jsonl')
+    with input_path.open('w') as f:
+        _write_input(f, triples)
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    MergePipeline(str(input_path), output_path, workers=3, ordered=False,
+                  executor=ThreadPoolExecutor(3)).run()
+
+    results = sorted(_read_output(output_path), key=lambda r: r['index'])
+    assert results == _expected(triples)
+
+
+def test_shared_memory_pipeline(tmpdir):
+    triples = _triples(4)
+    input_path = tmpdir.join('input.jsonl')
+    with input_path.open('w') as f:
+        _write_input(f, triples)
+        f.write('{"root": {}}\n')
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    pipeline = MergePipeline(str(input_path), output_path, workers=2,
+                             shared_memory=True)
+    stats = pipeline.run()
+
+    assert _read_output(output_path) == _expected(triples) + [
+        {'index': 4, 'error': "KeyError: 'head'"}]
+    assert stats['merge_errors'] == 1
+    assert pipeline._segments == {}
+
+
+def test_sharded_pipeline(tmpdir):
+    triples = _triples(6)
+    input_path = tmpdir.join('input.jsonl')
+    with input_path.open('w') as f:
+        _write_input(f, triples)
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    MergePipeline(str(input_path), output_path, workers=1,
+                  executor=ThreadPoolExecutor(1), shard=(2, 5)).run()
+
+    assert _read_output(output_path) == _expected(triples)[2:5]
+
+
+def test_pipeline_resumes_from_checkpoint(tmpdir):
+    triples = _triples(7)
+    input_path = tmpdir.join('input.jsonl.gz')
+    with gzip.open(str(input_path), 'wt') as f:
+        _write_input(f, triples[:3])
+        f.write('\n')
+        _write_input(f, triples[3:])
+    output_path = str(tmpdir.join('output.jsonl'))
+    checkpoint = Checkpoint(str(tmpdir.join('checkpoint.json')), interval=2)
+
+    with pytest.raises(RuntimeError):
+        MergePipeline(str(input_path), output_path, workers=1,
+                      max_in_flight=1, executor=CrashingExecutor(5),
+                      checkpoint=checkpoint).run()
+    # Lines 0, 1, 2 and 4 were written when the last checkpoint was saved.
+    assert checkpoint.load()['line'] == 5
+    with open(output_path, 'a') as f:
+        f.write('{"index":6,"mer')
+
+    stats = MergePipeline(str(input_path), output_path, workers=1,
+                          executor=ThreadPoolExecutor(1),
+                          checkpoint=Checkpoint(checkpoint.path)).run()
+
+    expected = _expected(triples)
+    for result in expected[3:]:
+        result['index'] += 1
+    assert _read_output(output_path) == expected
+    assert stats['resumed_from'] == 5
+    assert stats['merge']['items'] == 3
+    assert checkpoint.load()['line'] == 8
+
+
+def test_sharded_pipeline_resumes_from_checkpoint(tmpdir):
+    triples = _triples(6)
+    input_path = tmpdir.join('input.jsonl')
+    with input_path.open('w') as f:
+        _write_input(f, triples)
+    output_path = str(tmpdir.join('output.jsonl'))
+    checkpoint = Checkpoint(str(tmpdir.join('checkpoint.json')), interval=1)
+
+    with pytest.raises(RuntimeError):
+        MergePipeline(str(input_path), output_path, workers=1,
+                      max_in_flight=1, executor=CrashingExecutor(2),
+                      shard=(1, 5), checkpoint=checkpoint).run()
+    MergePipeline(str(input_path), output_path, workers=1,
+                  executor=ThreadPoolExecutor(1), shard=(1, 5),
+                  checkpoint=checkpoint).run()
+
+    assert _read_output(output_path) == _expected(triples)[1:5]
+
+
+def test_checkpoint_of_another_run(tmpdir):
+    input_path = tmpdir.join('input.jsonl')
+    input_path.write('')
+    checkpoint = Checkpoint(str(tmpdir.join('checkpoint.json')))
+    checkpoint.save({'input_path': 'other.jsonl', 'output_path': 'out',
+                     'shard': None})
+
+    with pytest.raises(ValueError):
+        MergePipeline(str(input_path), str(tmpdir.join('output.jsonl')),
+                      workers=1, executor=ThreadPoolExecutor(1),
+                      checkpoint=checkpoint).run()
+    with pytest.raises(ValueError):
+        MergePipeline(str(input_path), str(tmpdir.join('output.jsonl.gz')),
+                      workers=1, executor=ThreadPoolExecutor(1),
+                      checkpoint=checkpoint)
+
+
+def test_pipeline_merges_the_most_expensive_first(tmpdir):
+    triples = [generate_triple(num_authors=num_authors, num_references=2,
+                               recid=idx, seed=idx)
+               for idx, num_authors in enumerate([1, 8, 3, 5, 2, 9])]
+    executor = RecordingExecutor()
+    pipeline = MergePipeline('input.jsonl', 'output.jsonl', workers=1,
+                             max_in_flight=6, window=3, executor=executor)
+    for index, triple in enumerate(triples):
+        pipeline.parsed.put((index, None, triple))
+    pipeline.parsed.put(_END)
+
+    pipeline._dispatch()
+
+    assert [len(root['authors']) for root, _, _ in executor.submitted] == \
+        [8, 3, 1, 9, 5, 2]
+    assert [index for index, _, _ in pipeline.merged.queue] == \
+        [0, 1, 2, 3, 4, 5, _END]
+    executor.shutdown()
+
+
+def test_window_bigger_than_max_in_flight():
+    with pytest.raises(ValueError):
+        MergePipeline('input.jsonl', 'output.jsonl', workers=1,
+                      max_in_flight=2, window=3,
+                      executor=ThreadPoolExecutor(1))
+
+
+def test_pipeline_reports_failed_merges(tmpdir):
+    input_path = tmpdir.join('input.jsonl')
+    input_path.write('{"root": {}}\n')
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    stats = MergePipeline(str(input_path), output_path, workers=1,
+                          executor=ThreadPoolExecutor(1)).run()
+
+    assert stats['merge_errors'] == 1
+    assert _read_output(output_path) == [
+        {'index': 0, 'error': "KeyError: 'head'"}]
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_pipeline_reports_lines_that_can_not_be_parsed(tmpdir, ordered):
+    triples = _triples(4)
+    input_path = tmpdir.join('input.jsonl')
+    with input_path.open('w') as f:
+        _write_input(f, triples[:2])
+        f.write('{"root": {}, "head"\n')
+        _write_input(f, triples[2:])
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    stats = MergePipeline(str(input_path), output_path, workers=2,
+                          ordered=ordered, max_in_flight=2,
+                          executor=ThreadPoolExecutor(2)).run()
+
+    results = sorted(_read_output(output_path), key=lambda r: r['index'])
+    assert results[2]['index'] == 2
+    assert results[2]['error'].startswith('JSONDecodeError: ')
+    expected = _expected(triples)
+    for result in expected[2:]:
+        result['index'] += 1
+    assert results[:2] + results[3:] == expected
+    assert stats['merge_errors'] == 1
+    assert stats['merge']['items'] == 4
+
+
+@pytest.mark.skipif(zstandard is None, reason='zstandard is not installed')
+def test_zstd_pipeline(tmpdir):
+    triples = _triples(2)
+    input_path = str(tmpdir.join('input.jsonl.zst'))
+    with open(input_path, 'wb') as raw:
+        with zstandard.ZstdCompressor().stream_writer(raw) as f:
+            for root, head, update in triples:
+                f.write((json.dumps({'root': root, 'head': head,
+                                     'update': update}) + '\n').encode())
+    output_path = str(tmpdir.join('output.jsonl'))
+
+    MergePipeline(input_path, output_path, workers=1,
+                  executor=ThreadPoolExecutor(1)).run()
+
+    assert _read_output(output_path) == _expected(triples)
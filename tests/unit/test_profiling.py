@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+from json_merger.comparator import PrimaryKeyComparator
+
+from inspire_json_merger.cli import load_triple, main
+from inspire_json_merger.merger_config_arxiv2arxiv import (
+    NewIDNormalizer,
+    author_tokenize,
+)
+from inspire_json_merger.profiling import (
+    PK_COMPARATORS_GROUP,
+    FunctionGrouper,
+    group_stats,
+    profile_merge,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+def _func_key(fn):
+    code = fn.__code__
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def test_function_grouper():
+    grouper = FunctionGrouper()
+
+    assert grouper(_func_key(author_tokenize)) == 'author_tokenize'
+    assert grouper(_func_key(NewIDNormalizer.__call__)) == 'NewIDNormalizer'
+    assert grouper(_func_key(PrimaryKeyComparator.equal)) == \
+        PK_COMPARATORS_GROUP
+    assert grouper(('~', 0, '<built-in method builtins.len>')) == \
+        '<builtins>'
+    assert grouper(('/x/utils.py', 1, 'scan_author_string_for_phrases')) == \
+        'scan_author_string_for_phrases'
+
+
+def test_profile_merge_groups_the_config_callables():
+    triple = generate_triple(num_authors=10, num_references=3)
+    stats, sampler = profile_merge(triple, repeat=1)
+
+    groups = dict((row['group'], row) for row in group_stats(stats))
+    assert groups['author_tokenize']['calls'] > 0
+    assert groups[PK_COMPARATORS_GROUP]['calls'] > 0
+    assert groups['json_merger.merger']['inclusive_time'] > 0
+    for line in sampler.collapsed():
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+
+
+def test_profile_command(tmpdir, capsys):
+    collapsed = tmpdir.join('profile.folded')
+
+    main(['profile', 'arxiv2arxiv', '--repeat', '1',
+          '--collapsed', str(collapsed)])
+
+    out = capsys.readouterr()[0]
+    assert 'json_merger.merger' in out
+    assert collapsed.check()
+
+
+def test_load_triple_from_a_directory(tmpdir):
+    triple = generate_triple(num_authors=2, num_references=1)
+    for name, version in zip(('root', 'head', 'update'), triple):
+        tmpdir.join(name + '.json').write(json.dumps(version))
+
+    assert load_triple(str(tmpdir)) == triple
+    assert load_triple(str(tmpdir) + '/') == triple
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+from inspire_json_merger.replay import (
+    find_differences,
+    main,
+    read_log,
+    run_isolated,
+    run_replay,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+def _write_log(tmpdir, num_merges=4):
+    log = tmpdir.join('merges.jsonl')
+    with log.open('w') as f:
+        for idx in range(num_merges):
+            root, head, update = generate_triple(
+                num_authors=3, num_references=2, recid=idx, seed=idx)
+            f.write(json.dumps({'root': root, 'head': head,
+                                'update': update}) + '\n')
+        f.write('\n')
+    return str(log)
+
+
+def test_run_replay(tmpdir):
+    lines = read_log(_write_log(tmpdir))
+
+    stats, digests = run_replay(lines, workers=1)
+
+    assert stats['merges'] == 4
+    assert stats['throughput'] > 0
+    assert stats['latency']['p50'] <= stats['latency']['max']
+    assert len(digests) == 4
+
+
+def test_results_dont_depend_on_the_workers(tmpdir):
+    lines = read_log(_write_log(tmpdir))
+
+    _, in_process = run_replay(lines, workers=1)
+    stats, parallel = run_replay(lines, workers=2)
+
+    assert stats['cpu_time'] > 0
+    assert find_differences(in_process, parallel) == []
+
+
+def test_results_dont_depend_on_the_hash_seed(tmpdir):
+    log = _write_log(tmpdir, 2)
+    _, reference = run_replay(read_log(log))
+
+    for hash_seed in (1, 2):
+        stats, digests = run_isolated(log, hash_seed=hash_seed)
+
+        assert stats['merges'] == 2
+        assert digests == reference
+
+
+def test_find_differences():
+    assert find_differences(['a', 'b', 'c'], ['a', 'x', 'c']) == [1]
+
+
+def test_check_determinism(tmpdir):
+    output = tmpdir.join('stats.json')
+
+    main([_write_log(tmpdir, 2), '--check-determinism',
+          '--output', str(output)])
+
+    stats = json.loads(output.read())
+    assert len(stats) == 2
+    assert stats[0]['hash_seed'] != stats[1]['hash_seed']
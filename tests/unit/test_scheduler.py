@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from inspire_json_merger.api import merge
+from inspire_json_merger.scheduler import (
+    WorkStealingScheduler,
+    estimate_cost,
+    merge_batch,
+    mixed_workload,
+    simulate_makespan,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_estimate_cost_grows_with_the_lists():
+    small = generate_triple(num_authors=3, num_references=3)
+    many_authors = generate_triple(num_authors=300, num_references=3)
+    many_references = generate_triple(num_authors=3, num_references=300)
+
+    assert estimate_cost(small) < estimate_cost(many_authors)
+    assert estimate_cost(small) < estimate_cost(many_references)
+    assert estimate_cost(({}, {}, {})) > 0
+
+
+def test_simulate_makespan():
+    costs = [10, 10, 1, 1, 1, 1]
+
+    assert simulate_makespan(costs, 2, 'chunked') == 21
+    assert simulate_makespan(costs, 2, 'largest_first') == 12
+
+
+def test_scheduler_runs_the_biggest_items_first():
+    started = []
+    lock = threading.Lock()
+
+    def record(item):
+        with lock:
+            started.append(item)
+        return item * 2
+
+    scheduler = WorkStealingScheduler(workers=1,
+                                      executor=ThreadPoolExecutor(1),
+                                      cost_function=lambda item: item)
+
+    assert scheduler.map(record, [1, 5, 3, 4]) == [2, 10, 6, 8]
+    assert started == [5, 4, 3, 1]
+
+
+def test_idle_workers_steal_work():
+    release = threading.Event()
+
+    def run(item):
+        if item == 100:
+            # The biggest item keeps its worker busy until the others ran.
+            release.wait(5)
+        elif item == 1:
+            release.set()
+        return item
+
+    # The first slot gets 100 and 1, the second one 60, 30 and 20: 1 only
+    # runs (and lets 100 finish) if the second slot steals it.
+    scheduler = WorkStealingScheduler(workers=2,
+                                      executor=ThreadPoolExecutor(2),
+                                      cost_function=lambda item: item)
+
+    assert scheduler.map(run, [100, 60, 30, 20, 1]) == [100, 60, 30, 20, 1]
+    assert scheduler.steals == 1
+
+
+def test_merge_batch_keeps_the_order():
+    triples = mixed_workload(num_triples=6, big_fraction=0.3,
+                             big_authors=20)
+
+    results = merge_batch(triples, workers=2, executor=ThreadPoolExecutor(2))
+
+    assert results == [merge(*triple) for triple in triples]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+
+from __future__ import absolute_import, division, print_function
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from inspire_json_merger.pipeline import merge_triple
+from inspire_json_merger.shm import (
+    call_shared,
+    free,
+    get,
+    measure_ipc_overhead,
+    put,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+def test_put_and_get():
+    obj = {'titles': [{'title': u'Étude'}], 'control_number': 1,
+           'refereed': True, 'page_end': None}
+    segment, handle = put(obj)
+    try:
+        assert get(handle) == obj
+        assert get(handle) == obj
+    finally:
+        segment.close()
+        free(segment)
+
+
+def test_get_frees_the_segment_if_asked():
+    segment, handle = put([])
+    segment.close()
+
+    assert get(handle, unlink=True) == []
+    with pytest.raises(FileNotFoundError):
+        get(handle)
+
+
+def test_call_shared_in_a_worker_process():
+    root, head, update = generate_triple(num_authors=5, num_references=3)
+    triple = {'root': root, 'head': head, 'update': update}
+    segment, handle = put(triple)
+    try:
+        with ProcessPoolExecutor(1) as executor:
+            result_handle = executor.submit(
+                call_shared, merge_triple, handle).result()
+    finally:
+        segment.close()
+        free(segment)
+
+    _, merged, conflicts = get(result_handle, unlink=True)
+    assert (merged, conflicts) == merge_triple(triple)[1:]
+
+
+def test_measure_ipc_overhead():
+    triple = generate_triple(num_authors=5, num_references=3)
+
+    result = measure_ipc_overhead(triple, repeat=2)
+
+    assert set(result) == {'pickle_bytes', 'marshal_bytes', 'pickle_seconds',
+                           'shared_memory_seconds'}
+    assert result['shared_memory_seconds'] > 0
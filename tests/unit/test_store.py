@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from inspire_json_merger.api import merge, merge_from_store
+from inspire_json_merger.store import (
+    LRURootStore,
+    RootStore,
+    SQLiteRootStore,
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+class CountingStore(RootStore):
+    def __init__(self):
+        self.roots = {}
+        self.gets = 0
+
+    def get(self, control_number, source):
+        self.gets += 1
+        return self.roots.get((control_number, source))
+
+    def put(self, control_number, source, root):
+        self.roots[(control_number, source)] = root
+
+
+def test_sqlite_store(tmpdir):
+    path = str(tmpdir.join('roots.db'))
+    root = generate_triple(num_authors=3, num_references=2)[0]
+
+    with SQLiteRootStore(path) as store:
+        assert store.get(1, 'arXiv') is None
+        store.put(1, 'arXiv', root)
+        store.put(1, 'arXiv', root)
+        store.put(1, 'publisher', {})
+
+    with SQLiteRootStore(path) as store:
+        assert len(store) == 2
+        assert store.get(1, 'arXiv') == root
+        assert store.get(1, 'publisher') == {}
+        assert store.get(2, 'arXiv') is None
+
+
+def test_lru_store_evicts_the_least_recently_used():
+    backend = CountingStore()
+    store = LRURootStore(backend, size=2)
+    for control_number in (1, 2, 3):
+        backend.put(control_number, 'arXiv', {'control_number':
+                                              control_number})
+
+    store.get(1, 'arXiv')
+    store.get(2, 'arXiv')
+    store.get(1, 'arXiv')
+    store.get(3, 'arXiv')
+    store.get(1, 'arXiv')
+    store.get(2, 'arXiv')
+
+    assert backend.gets == 4
+    assert store.stats == {'hits': 2, 'misses': 4, 'size': 2}
+
+
+def test_lru_store_writes_through():
+    backend = CountingStore()
+    store = LRURootStore(backend)
+
+    store.put(1, 'arXiv', {'control_number': 1})
+
+    assert backend.roots == {(1, 'arXiv'): {'control_number': 1}}
+    assert store.get(1, 'arXiv') == {'control_number': 1}
+    assert backend.gets == 0
+
+
+def test_merge_from_store():
+    first, head, second = generate_triple(num_authors=3, num_references=2)
+    first['acquisition_source'] = second['acquisition_source'] = {
+        'source': 'arXiv'}
+    store = CountingStore()
+
+    assert merge_from_store(1, head, first, store) == merge({}, head, first)
+    assert store.roots == {(1, 'arXiv'): first}
+
+    assert merge_from_store(1, head, second, store) == \
+        merge(first, head, second)
+    assert store.roots == {(1, 'arXiv'): second}
+
+
+def test_lru_store_keeps_the_root_stored(tmpdir):
+    first, head, second = generate_triple(num_authors=3, num_references=2)
+    first['acquisition_source'] = second['acquisition_source'] = {
+        'source': 'arXiv'}
+    expected = merge(first, head, second)
+
+    with SQLiteRootStore(str(tmpdir.join('roots.db'))) as backend:
+        store = LRURootStore(backend)
+        merge_from_store(1, head, first, store)
+        stored = generate_triple(num_authors=3, num_references=2)[0]
+        stored['acquisition_source'] = {'source': 'arXiv'}
+        # The caller goes on using the update it handed over.
+        first['authors'].pop()
+        first['titles'] = [{'title': 'Modified after the merge'}]
+
+        assert store.get(1, 'arXiv') == backend.get(1, 'arXiv') == stored
+        assert merge_from_store(1, head, second, store) == expected
+        assert store.stats['hits'] == 2
+
+
+def test_merge_from_store_needs_a_source():
+    with pytest.raises(ValueError):
+        merge_from_store(1, {}, {}, CountingStore())
+
+    store = CountingStore()
+    merge_from_store(1, {}, {}, store, source='publisher')
+    assert store.roots == {(1, 'publisher'): {}}
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.nothing import NOTHING
+
+from inspire_json_merger.merger_config_arxiv2arxiv import (
+    COMPARATORS,
+    LIST_MERGE_OPS
+)
+from inspire_json_merger.synthetic import generate_triple
+
+
+def _get_path(obj, path):
+    """All the values at a dotted config path, going through lists."""
+    values = [obj]
+    for key in path.split('.'):
+        found = []
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, dict) and key in item:
+                    found.append(item[key])
+        values = found
+    return values or NOTHING
+
+
+def test_generate_triple_is_deterministic():
+    assert generate_triple(20, 20, seed=3) == generate_triple(20, 20, seed=3)
+    assert generate_triple(20, 20, seed=3) != generate_triple(20, 20, seed=4)
+
+
+def test_generate_triple_covers_every_configured_field():
+    root, head, update = generate_triple(20, 20)
+
+    for path in set(COMPARATORS) | set(LIST_MERGE_OPS):
+        assert _get_path(root, path) != NOTHING, path
+
+
+def test_generate_triple_scales():
+    root, head, update = generate_triple(num_authors=100, num_references=50,
+                                         edit_rate=0.2)
+
+    assert len(root['authors']) == 100
+    assert len(root['references']) == 50
+    assert len(update['authors']) == 110
+    assert len(update['references']) == 60
+    assert head['authors'] != root['authors']
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+from json_merger.contrib.inspirehep.author_util import (
+    AuthorNameDistanceCalculator,
+    AuthorNameNormalizer,
+    simple_tokenize
+)
+
+from inspire_json_merger.tokens import TokenTable, with_interned_tokens
+
+
+def test_token_table_tokenizes_each_name_once():
+    table = TokenTable()
+
+    first = table.tokenize(simple_tokenize, 'Smith, John')
+    second = table.tokenize(simple_tokenize, 'Smith, John')
+
+    assert first is second
+    assert table.stats == {'hits': 1, 'misses': 1, 'tokens': 2}
+
+
+def test_token_table_shares_equal_tokens_between_names():
+    table = TokenTable()
+
+    john = table.tokenize(simple_tokenize, 'Smith, John')
+    jane = table.tokenize(simple_tokenize, 'Smith, Jane')
+
+    assert john['lastnames'][0] is jane['lastnames'][0]
+
+
+def test_with_interned_tokens_keeps_results():
+    table = TokenTable()
+    author1 = {'full_name': 'Smith, J.'}
+    author2 = {'full_name': 'Smith, John'}
+    distance = AuthorNameDistanceCalculator(simple_tokenize)
+    normalizer = AuthorNameNormalizer(simple_tokenize, 1, True)
+
+    interned_distance = with_interned_tokens(distance, table)
+    interned_normalizer = with_interned_tokens(normalizer, table)
+
+    assert interned_distance(author1, author2) == distance(author1, author2)
+    assert interned_normalizer(author1) == normalizer(author1)
+    assert distance.tokenize_function is simple_tokenize
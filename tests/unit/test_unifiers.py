@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from json_merger.comparator import DefaultComparator
+from json_merger.config import UnifierOps
+from json_merger.list_unify import ListUnifier
+
+from inspire_json_merger.comparators import EqualityComparator
+from inspire_json_merger.unifiers import TrivialListUnifier, needs_matching
+
+
+@pytest.mark.parametrize('operation,root,head,update', [
+    (UnifierOps.KEEP_ONLY_HEAD_ENTITIES, [], ['a', 'b', 'a'], []),
+    (UnifierOps.KEEP_ONLY_HEAD_ENTITIES, ['a'], [], ['a', 'b']),
+    (UnifierOps.KEEP_ONLY_UPDATE_ENTITIES, [], [], [{'a': 1}, 'b']),
+    (UnifierOps.KEEP_ONLY_UPDATE_ENTITIES, ['a'], ['a', 'b'], []),
+])
+def test_trivial_list_unifier_is_the_same_as_list_unifier(
+        operation, root, head, update):
+    assert not needs_matching(root, head, update, operation)
+    expected = ListUnifier(root, head, update, operation)
+    expected.unify()
+
+    unifier = TrivialListUnifier(root, head, update, operation)
+    unifier.unify()
+
+    assert unifier.unified == expected.unified
+    assert unifier.head_stats.in_result == expected.head_stats.in_result
+    assert unifier.update_stats.in_result == expected.update_stats.in_result
+
+
+@pytest.mark.parametrize('operation,root,head,update', [
+    (UnifierOps.KEEP_ONLY_HEAD_ENTITIES, ['a'], ['a'], []),
+    (UnifierOps.KEEP_ONLY_UPDATE_ENTITIES, [], ['a'], ['a']),
+    (UnifierOps.KEEP_UPDATE_AND_HEAD_ENTITIES_HEAD_FIRST, [], [], []),
+])
+def test_needs_matching(operation, root, head, update):
+    assert needs_matching(root, head, update, operation)
+
+
+def test_equality_comparator_is_the_same_as_default_comparator():
+    l1 = ['a', 'b', {'c': [1]}, 1, 'a', [2]]
+    l2 = ['b', 'a', 1.0, {'c': [1]}, 'd', [2]]
+
+    assert EqualityComparator(l1, l2).matches == \
+        DefaultComparator(l1, l2).matches